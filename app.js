@@ -58,6 +58,7 @@ class TikTokLiveAI {
 
         document.getElementById('gestureIntensity').addEventListener('input', (e) => {
             document.querySelector('#gestureIntensity + .value-display').textContent = e.target.value + '%';
+            this.sendFrameParams();
         });
 
         // Chat Queue
@@ -179,9 +180,13 @@ class TikTokLiveAI {
         ctx.font = '20px Arial';
         ctx.fillText('Using real photos for authentic look', canvas.width/2, canvas.height/2 + 40);
         
-        // Start fetching avatar frames
+        // Prefer frames pushed by the avatar server's render loop
+        this.subscribeAvatarFrames(ctx);
+        
+        // Poll for frames only while push delivery is not available
         let frameCount = 0;
         this.avatarFrameInterval = setInterval(() => {
+            if (this.avatarPushActive) return;
             this.fetchAvatarFrame(ctx);
             frameCount++;
             if (frameCount === 3) {
@@ -199,6 +204,63 @@ class TikTokLiveAI {
         if (this.avatarFrameInterval) {
             clearInterval(this.avatarFrameInterval);
         }
+        if (this.avatarSocket) {
+            this.avatarSocket.emit('unsubscribe_frames', { stream_id: 'avatar_stream' });
+            this.avatarSocket.off('avatar_frame');
+        }
+        this.avatarPushActive = false;
+    }
+    
+    getFrameParams() {
+        return {
+            stream_id: 'avatar_stream',
+            gesture: document.getElementById('gestureIntensity').value,
+            speaking: this.isSpeaking || false,
+            text: this.currentSpeakingText || ''
+        };
+    }
+    
+    sendFrameParams() {
+        if (this.avatarSocket && this.avatarPushActive) {
+            this.avatarSocket.emit('frame_params', this.getFrameParams());
+        }
+    }
+    
+    subscribeAvatarFrames(ctx) {
+        if (!this.avatarSocket) {
+            this.avatarSocket = io('http://localhost:5000');
+            this.avatarSocket.on('disconnect', () => {
+                this.avatarPushActive = false;
+            });
+        }
+        
+        const subscribe = () => {
+            this.avatarSocket.emit('subscribe_frames', this.getFrameParams(), (response) => {
+                this.avatarPushActive = !!(response && response.success);
+            });
+        };
+        
+        this.avatarSocket.off('connect');
+        this.avatarSocket.on('connect', subscribe);
+        if (this.avatarSocket.connected) {
+            subscribe();
+        }
+        
+        this.avatarSocket.off('avatar_frame');
+        this.avatarSocket.on('avatar_frame', async (data) => {
+            // Drop frames that arrive while the previous one is still decoding
+            if (this.avatarFrameDecoding) return;
+            this.avatarFrameDecoding = true;
+            try {
+                const img = await createImageBitmap(new Blob([data.image], { type: 'image/jpeg' }));
+                ctx.drawImage(img, 0, 0, ctx.canvas.width, ctx.canvas.height);
+                document.getElementById('statusOverlay').style.display = 'none';
+            } catch (error) {
+                console.log('Skipping pushed avatar frame');
+            } finally {
+                this.avatarFrameDecoding = false;
+            }
+        });
     }
     
     async fetchAvatarFrame(ctx) {
@@ -207,7 +269,8 @@ class TikTokLiveAI {
             const isSpeaking = this.isSpeaking || false;
             const currentText = this.currentSpeakingText || '';
             
-            const response = await fetch(`http://localhost:5000/api/frame/avatar_stream?gesture=${gestureIntensity}&speaking=${isSpeaking}&text=${encodeURIComponent(currentText)}&t=${Date.now()}`);
+            // Revalidate with the server's ETag instead of cache-busting every request
+            const response = await fetch(`http://localhost:5000/api/frame/avatar_stream?gesture=${gestureIntensity}&speaking=${isSpeaking}&text=${encodeURIComponent(currentText)}`, { cache: 'no-cache' });
             
             if (response.ok) {
                 const blob = await response.blob();
@@ -366,6 +429,7 @@ class TikTokLiveAI {
         // Send to AI Avatar for speech
         this.socket.emit('speak', {
             text: item.text,
+            priority: item.priority || 'chat',
             avatar: this.selectedAvatar,
             voice: document.getElementById('voiceType').value,
             speed: document.getElementById('speechSpeed').value,
@@ -566,7 +630,7 @@ class TikTokLiveAI {
         
         // Auto thank
         if (document.getElementById('autoThankGift').checked) {
-            this.autoReply(`Terima kasih @${data.username} untuk ${data.gift_name}! 💖`);
+            this.autoReply(`Terima kasih @${data.username} untuk ${data.gift_name}! 💖`, 'gift');
         }
     }
 
@@ -583,12 +647,19 @@ class TikTokLiveAI {
         this.showNotification('Chat terkirim', 'success');
     }
 
-    autoReply(message) {
+    autoReply(message, priority = 'chat') {
         setTimeout(() => {
-            this.chatQueue.push({
+            const item = {
                 id: Date.now(),
-                text: message
-            });
+                text: message,
+                priority
+            };
+            // Gift thanks jump the queue; the server also lets them interrupt chat replies
+            if (priority === 'gift') {
+                this.chatQueue.unshift(item);
+            } else {
+                this.chatQueue.push(item);
+            }
             this.updateQueueDisplay();
             this.processQueue();
         }, 1000);
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Avatar Asset Helpers
+Pre-scaled face assets shared by the realistic and interactive renderers,
+with an on-disk cache so avatars load without the network
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+import requests
+
+from avatar_config import BASE_HEIGHT, portrait_sizes
+
+# Face size in the full 1080x1920 portrait
+BASE_FACE_SIZE = 600
+
+# Size faces are stored at after download
+SOURCE_FACE_SIZE = 400
+
+# Asset cache options, overridable from the environment
+ASSET_CACHE_DIR = os.getenv('AVATAR_CACHE_DIR', os.path.join('avatars', 'cache'))
+ASSET_REFRESH = os.getenv('AVATAR_ASSET_REFRESH', 'true').lower() == 'true'
+ASSET_OFFLINE = os.getenv('AVATAR_OFFLINE', 'false').lower() == 'true'
+FETCH_TIMEOUT = float(os.getenv('AVATAR_FETCH_TIMEOUT', '10'))
+
+
+def face_size_for_height(frame_height):
+    """Get face size that keeps the face proportional to the frame height"""
+    return int(round(BASE_FACE_SIZE * frame_height / BASE_HEIGHT))
+
+
+class FacePyramid:
+    """Face image pre-scaled once to every size the renderers use"""
+
+    def __init__(self, face_image, sizes=None, levels=None):
+        self.source = face_image
+        self.levels = dict(levels or {})
+        if sizes is None:
+            sizes = [face_size_for_height(height) for _, height in portrait_sizes()]
+        for size in sizes:
+            if size not in self.levels:
+                self.add_level(size)
+
+    def add_level(self, size):
+        """Resample source face to size x size"""
+        src_size = self.source.shape[0]
+        interpolation = cv2.INTER_CUBIC if size > src_size else cv2.INTER_AREA
+        level = cv2.resize(self.source, (size, size), interpolation=interpolation)
+        # Levels are shared across frames, never draw on them directly
+        level.flags.writeable = False
+        self.levels[size] = level
+        return level
+
+    def get(self, size=BASE_FACE_SIZE):
+        """Get pre-scaled face, building the level on first use if missing"""
+        level = self.levels.get(size)
+        if level is None:
+            level = self.add_level(size)
+        return level
+
+
+def array_digest(array):
+    """Get content hash of an image array (shape included)"""
+    digest = hashlib.sha256(repr(array.shape).encode('ascii'))
+    digest.update(np.ascontiguousarray(array).data)
+    return digest.hexdigest()
+
+
+def fetch_face(url, size=SOURCE_FACE_SIZE, timeout=None):
+    """Download and decode a face photo; returns None when unavailable"""
+    response = requests.get(url, timeout=timeout or FETCH_TIMEOUT)
+    if response.status_code != 200:
+        return None
+    face = cv2.imdecode(np.frombuffer(response.content, np.uint8), cv2.IMREAD_COLOR)
+    if face is None:
+        return None
+    return cv2.resize(face, (size, size))
+
+
+class FaceAssetCache:
+    """Content-addressed store of decoded, pre-scaled faces
+
+    Every array is saved as <sha256>.npy and memory-mapped on load;
+    index.json maps an asset key (avatar type and URL) to the hashes of
+    its source face and pyramid levels. Files are checked against their
+    hash once per process, and a mismatch is treated as a miss.
+    """
+
+    def __init__(self, root=ASSET_CACHE_DIR, refresh=ASSET_REFRESH, offline=ASSET_OFFLINE):
+        self.root = root
+        self.refresh_enabled = refresh and not offline
+        self.offline = offline
+        self.index_path = os.path.join(root, 'index.json')
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.verified = set()
+        self.refreshed = set()
+        self.failed = set()
+
+    def asset_key(self, avatar_type, url):
+        """Get index key for an avatar photo"""
+        return f"{avatar_type}@{url}"
+
+    def read_index(self):
+        """Read the asset index, empty if missing or corrupt"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def write_index(self, index):
+        """Replace the asset index atomically"""
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def array_path(self, digest):
+        return os.path.join(self.root, f"{digest}.npy")
+
+    def load_array(self, digest):
+        """Memory-map a stored array, validating it against its hash"""
+        array = np.load(self.array_path(digest), mmap_mode='r', allow_pickle=False)
+        if digest not in self.verified:
+            if array_digest(array) != digest:
+                raise ValueError(f"hash mismatch for {digest[:12]}")
+            self.verified.add(digest)
+        return array
+
+    def save_array(self, array):
+        """Store an array under its content hash; returns the hash"""
+        digest = array_digest(array)
+        path = self.array_path(digest)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+            np.save(tmp_path, np.ascontiguousarray(array), allow_pickle=False)
+            os.replace(tmp_path, path)
+        self.verified.add(digest)
+        return digest
+
+    def get(self, avatar_type, url):
+        """Get (face_image, FacePyramid) from disk, or None if not cached"""
+        entry = self.read_index().get(self.asset_key(avatar_type, url))
+        if not entry:
+            return None
+        try:
+            source = self.load_array(entry['source'])
+            levels = {int(size): self.load_array(digest) for size, digest in entry['levels'].items()}
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Ignoring cached {avatar_type} avatar: {e}")
+            return None
+        return source, FacePyramid(source, levels=levels)
+
+    def put(self, avatar_type, url, face_image):
+        """Store a face and its pyramid; returns (face_image, FacePyramid)"""
+        pyramid = FacePyramid(face_image)
+        os.makedirs(self.root, exist_ok=True)
+        entry = {
+            'url': url,
+            'source': self.save_array(face_image),
+            'levels': {str(size): self.save_array(level) for size, level in pyramid.levels.items()},
+            'updated': time.time()
+        }
+        with self.lock:
+            index = self.read_index()
+            index[self.asset_key(avatar_type, url)] = entry
+            self.write_index(index)
+        return face_image, pyramid
+
+    def get_landmarks(self, digest):
+        """Get cached landmark analysis for a face hash, or None"""
+        try:
+            with open(os.path.join(self.root, f"{digest}.landmarks.json"), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put_landmarks(self, digest, data):
+        """Store landmark analysis next to the face it was computed from"""
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, f"{digest}.landmarks.json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def key_lock(self, key):
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def load(self, avatar_type, url):
+        """Get (face_image, FacePyramid) for an avatar photo
+
+        Cached assets load from disk and are refreshed from the network in
+        the background. On a cold cache the photo is downloaded once; if
+        that fails, None is returned and later calls retry only in the
+        background, so callers never wait on the network twice.
+        """
+        key = self.asset_key(avatar_type, url)
+        with self.key_lock(key):
+            asset = self.get(avatar_type, url)
+            if asset is not None:
+                self.schedule_refresh(avatar_type, url)
+                return asset
+
+            if self.offline:
+                return None
+            if key in self.failed:
+                self.schedule_refresh(avatar_type, url)
+                return None
+
+            try:
+                face = fetch_face(url)
+            except Exception as e:
+                print(f"❌ Error downloading {avatar_type} avatar: {e}")
+                face = None
+            if face is None:
+                self.failed.add(key)
+                return None
+            print(f"✅ Downloaded {avatar_type} avatar from {url}")
+            return self.put(avatar_type, url, face)
+
+    def schedule_refresh(self, avatar_type, url):
+        """Re-download an asset once per process in a background thread"""
+        key = self.asset_key(avatar_type, url)
+        if not self.refresh_enabled or key in self.refreshed:
+            return
+        self.refreshed.add(key)
+        threading.Thread(target=self.refresh, args=(avatar_type, url), daemon=True).start()
+
+    def refresh(self, avatar_type, url):
+        """Download an asset and store it if its pixels changed"""
+        try:
+            face = fetch_face(url)
+        except Exception as e:
+            print(f"⚠️ Background refresh of {avatar_type} avatar failed: {e}")
+            return
+        if face is None:
+            return
+
+        key = self.asset_key(avatar_type, url)
+        entry = self.read_index().get(key)
+        if entry and entry.get('source') == array_digest(face):
+            return
+        self.put(avatar_type, url, face)
+        self.failed.discard(key)
+        print(f"🔄 Refreshed cached {avatar_type} avatar from {url}")
+
+
+# Shared on-disk face cache
+face_assets = FaceAssetCache()
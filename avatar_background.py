@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Animated Gradient Background Engine
+Shared background renderer for all portrait avatar servers
+"""
+
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+# Gradient animation speed (rows per second), same as the original per-row loop
+PHASE_SPEED = 20
+
+# |sin(x / 200)| repeats every 200*pi rows, so ~628 phases cover a full cycle
+PHASE_PERIOD = int(round(200 * math.pi))
+
+# Base color and amplitude per channel (BGR order)
+GRADIENT_BASE = np.array([80, 50, 40], dtype=np.float32)
+GRADIENT_AMPLITUDE = np.array([80, 70, 60], dtype=np.float32)
+GRADIENT_OFFSET = np.array([240, 120, 0], dtype=np.float32)
+
+# AVATAR_BACKGROUND=flat swaps the animated gradient for a still color, so
+# frames only change where the avatar moves
+BACKGROUND_STYLE = os.getenv('AVATAR_BACKGROUND', 'gradient').lower()
+
+# Still color (BGR), the middle of the gradient's range
+FLAT_COLOR = (GRADIENT_BASE + GRADIENT_AMPLITUDE / 2).astype(np.uint8)
+
+
+class GradientBackground:
+    """Precomputed animated gradient for one frame size"""
+
+    def __init__(self, width=1080, height=1920, period=PHASE_PERIOD):
+        self.width = width
+        self.height = height
+        self.period = period
+
+        # One vectorized column covers every phase: phase p is rows [p, p + height)
+        rows = np.arange(height + period, dtype=np.float32)[:, np.newaxis]
+        values = GRADIENT_BASE + np.abs(np.sin((rows + GRADIENT_OFFSET) / 200)) * GRADIENT_AMPLITUDE
+        self.ring_column = values.astype(np.uint8)
+
+        # Broadcast once into a tall buffer so every phase frame is a contiguous view
+        self.ring = np.ascontiguousarray(
+            np.broadcast_to(self.ring_column[:, np.newaxis, :], (height + period, width, 3))
+        )
+        self.ring.flags.writeable = False
+
+    def phase(self, t=None):
+        """Get ring index for a timestamp"""
+        if t is None:
+            t = time.time()
+        return int(t * PHASE_SPEED) % self.period
+
+    def column(self, t=None):
+        """Get gradient column (height x 3) for a timestamp, as a view"""
+        p = self.phase(t)
+        return self.ring_column[p:p + self.height]
+
+    def frame_view(self, t=None):
+        """Get read-only precomputed phase frame for a timestamp"""
+        p = self.phase(t)
+        return self.ring[p:p + self.height]
+
+    def render(self, t=None, out=None):
+        """Render full background frame with a single buffer copy"""
+        p = self.phase(t)
+        if out is None:
+            return self.ring[p:p + self.height].copy()
+        np.copyto(out, self.ring[p:p + self.height])
+        return out
+
+
+class FlatBackground:
+    """Single-color background with the same interface as GradientBackground"""
+
+    period = 1
+
+    def __init__(self, width=1080, height=1920, color=FLAT_COLOR):
+        self.width = width
+        self.height = height
+        self.frame = np.empty((height, width, 3), dtype=np.uint8)
+        self.frame[:] = color
+        self.frame.flags.writeable = False
+
+    def phase(self, t=None):
+        return 0
+
+    def frame_view(self, t=None):
+        return self.frame
+
+    def render(self, t=None, out=None):
+        if out is None:
+            return self.frame.copy()
+        np.copyto(out, self.frame)
+        return out
+
+
+_backgrounds = {}
+_backgrounds_lock = threading.Lock()
+
+
+def get_background(width=1080, height=1920):
+    """Get shared background engine for a frame size"""
+    key = (width, height)
+    background = _backgrounds.get(key)
+    if background is None:
+        with _backgrounds_lock:
+            background = _backgrounds.get(key)
+            if background is None:
+                if BACKGROUND_STYLE == 'flat':
+                    background = FlatBackground(width, height)
+                else:
+                    background = GradientBackground(width, height)
+                _backgrounds[key] = background
+    return background
+
+
+def animation_time(t=None, fps=None):
+    """Get the timestamp the background shows, stepped to fps when given"""
+    if fps:
+        t = math.floor((time.time() if t is None else t) * fps) / fps
+    return t
+
+
+def render_background(t=None, width=1080, height=1920, fps=None):
+    """Render animated gradient background frame, animating at fps when given"""
+    return get_background(width, height).render(animation_time(t, fps))
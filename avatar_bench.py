@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Avatar Frame Benchmark
+Per-stage frame cost of every avatar server, offline, with baseline comparison
+
+Frames are rendered on a simulated clock at the stream cadence, with delta
+rendering on and off, so reused buffers see the changes a live stream does.
+
+Usage: python avatar_bench.py [--frames 60] [--fps 30] [--out temp/bench/frames.json] [--baseline old.json]
+"""
+
+import argparse
+import contextlib
+import importlib
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+# Avatars load from a throwaway asset cache, never the network or avatars/cache
+os.environ['AVATAR_CACHE_DIR'] = tempfile.mkdtemp(prefix='avatar-bench-')
+os.environ['AVATAR_ASSET_REFRESH'] = 'false'
+os.environ.setdefault('RENDER_WORKERS', '0')
+
+import avatar_assets
+import avatar_delta
+import avatar_sprites
+from avatar_config import QUALITIES, DEFAULT_FPS
+from avatar_encoder import encoder_report
+from avatar_streaming import encode_jpeg
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Local stand-ins for the Pravatar photos; the human shot is a full portrait frame
+MALE_PHOTO = os.path.join(ROOT, 'test_realistic_avatar.jpg')
+HUMAN_PHOTO = os.path.join(ROOT, 'test_realistic_human.jpg')
+HUMAN_FACE_BOX = (240, 300, 600, 600)
+
+# Server module -> (avatar class, avatar type, face stage patched on the avatar)
+SERVERS = {
+    'avatar_server': ('AIAvatar', 'default', None),
+    'realistic_avatar_server': ('RealisticAvatar', 'female', 'apply_gesture_to_face'),
+    'interactive_avatar_server': ('InteractiveAvatar', 'female', 'apply_facial_animations'),
+    'simple_interactive_avatar': ('SimpleInteractiveAvatar', 'female', 'apply_facial_animations')
+}
+
+STAGES = ('background', 'face', 'overlays', 'render', 'encode', 'total')
+GESTURES = (0, 50, 100)
+BENCH_TEXT = "Halo semuanya, selamat datang di live shopping hari ini!"
+# Delta rendering on (reused buffers) and off (every frame drawn from scratch)
+DELTA_MODES = (('delta', True), ('full', False))
+
+DEFAULT_OUT = os.path.join('temp', 'bench', 'frames.json')
+DEFAULT_TOLERANCE = 0.15
+
+
+def local_face(url, size=avatar_assets.SOURCE_FACE_SIZE, timeout=None):
+    """Load a face photo from the repo instead of downloading it"""
+    if 'img=12' in url:
+        face = cv2.imread(MALE_PHOTO)
+    else:
+        x, y, w, h = HUMAN_FACE_BOX
+        face = cv2.imread(HUMAN_PHOTO)[y:y + h, x:x + w]
+    return cv2.resize(face, (size, size)) if face is not None else None
+
+
+avatar_assets.fetch_face = local_face
+
+
+class StageTimer:
+    """Seconds spent in each wrapped stage during the current frame"""
+
+    def __init__(self):
+        self.current = {}
+
+    def reset(self):
+        self.current = {}
+
+    def wrap(self, stage, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.current[stage] = self.current.get(stage, 0.0) + time.perf_counter() - start
+        return timed
+
+
+class StreamClock:
+    """Stand-in for time.time that moves one frame interval per tick"""
+
+    def __init__(self, fps):
+        self.interval = 1.0 / fps
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+    def tick(self):
+        self.now += self.interval
+
+
+class Patch:
+    """Swap an attribute for the lifetime of a with block"""
+
+    def __init__(self, owner, name, value):
+        self.owner, self.name, self.value = owner, name, value
+
+    def __enter__(self):
+        self.had_own = self.name in vars(self.owner)
+        self.original = getattr(self.owner, self.name)
+        setattr(self.owner, self.name, self.value)
+        return self
+
+    def __exit__(self, *exc):
+        if self.had_own:
+            setattr(self.owner, self.name, self.original)
+        else:
+            delattr(self.owner, self.name)
+
+
+def percentiles(samples):
+    """Get p50/p95/p99/mean in milliseconds"""
+    values = np.asarray(samples) * 1000.0
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': round(float(p50), 3), 'p95': round(float(p95), 3), 'p99': round(float(p99), 3),
+            'mean': round(float(values.mean()), 3)}
+
+
+def bench_server(module_name, resolutions, frames, warmup, fps=DEFAULT_FPS):
+    """Benchmark one server across gesture, speaking, resolution and delta combinations"""
+    class_name, avatar_type, face_method = SERVERS[module_name]
+    module = importlib.import_module(module_name)
+    socket_id = f"bench-{module_name}"
+    module.stream_manager.create_stream(socket_id, {'avatar': avatar_type})
+    avatar = module.stream_manager.get_stream(socket_id)['avatar']
+    assert type(avatar).__name__ == class_name
+    jpeg_quality = module.frame_hub.jpeg_quality
+
+    timer = StageTimer()
+    # Animation, background phase and speech all follow the stream's clock
+    clock = StreamClock(fps)
+    patches = [Patch(time, 'time', clock)]
+    # Background includes reusing the previous frame buffer
+    patches.append(Patch(avatar_delta.DeltaCanvas, 'begin', timer.wrap('background', avatar_delta.DeltaCanvas.begin)))
+    if face_method is None:
+        # The character sprite (warped with the head) is the face
+        for name in ('composite', 'composite_region'):
+            method = getattr(avatar_sprites.SpriteLayer, name)
+            patches.append(Patch(avatar_sprites.SpriteLayer, name, timer.wrap('face', method)))
+    else:
+        patches.append(Patch(avatar, face_method, timer.wrap('face', getattr(avatar, face_method))))
+
+    results = {}
+    with contextlib.ExitStack() as stack:
+        for patch in patches:
+            stack.enter_context(patch)
+        for (mode, delta), resolution, gesture, speaking in itertools.product(
+                DELTA_MODES, resolutions, GESTURES, (False, True)):
+            avatar.canvas.enabled = delta
+            avatar.speech.cancel(clear=True)
+            if speaking:
+                avatar.speech.say(BENCH_TEXT, duration=3600)
+            params = {'gesture_intensity': gesture, 'is_speaking': speaking,
+                      'text': BENCH_TEXT if speaking else '', 'resolution': resolution}
+
+            samples = {stage: [] for stage in STAGES}
+            cpu_time = wall_time = 0.0
+            for index in range(warmup + frames):
+                clock.tick()
+                timer.reset()
+                cpu_start, start = time.process_time(), time.perf_counter()
+                frame = module.render_stream_frame(socket_id, params)
+                rendered = time.perf_counter()
+                encode_jpeg(frame, jpeg_quality)
+                end = time.perf_counter()
+                if index < warmup:
+                    continue
+                cpu_time += time.process_time() - cpu_start
+                wall_time += end - start
+
+                stages = dict(timer.current, render=rendered - start, encode=end - rendered,
+                              total=end - start)
+                stages.setdefault('background', 0.0)
+                stages.setdefault('face', 0.0)
+                # Everything else drawn into the frame: body, UI, mouth, product card
+                stages['overlays'] = max(0.0, stages['render'] - stages['background'] - stages['face'])
+                for stage in STAGES:
+                    samples[stage].append(stages[stage])
+
+            key = f"{resolution}/g{gesture}/{'speaking' if speaking else 'idle'}/{mode}"
+            results[key] = {
+                'stages': {stage: percentiles(values) for stage, values in samples.items()},
+                'fps': round(frames / wall_time, 1),
+                'fps_per_core': round(frames / max(cpu_time, 1e-9), 1)
+            }
+            total = results[key]['stages']['total']
+            print(f"⏱️ {module_name} {key}: p50 {total['p50']:.1f} ms, p99 {total['p99']:.1f} ms, "
+                  f"{results[key]['fps_per_core']} fps/core")
+    avatar.canvas.enabled = avatar_delta.DELTA_ENABLED
+    avatar.speech.cancel(clear=True)
+    module.stream_manager.stop_stream(socket_id)
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE, metric='p95'):
+    """Get regressions of total frame time against a baseline run"""
+    regressions = []
+    for server, combos in results['servers'].items():
+        for key, result in combos.items():
+            before = baseline.get('servers', {}).get(server, {}).get(key)
+            if before is None:
+                continue
+            old = before['stages']['total'][metric]
+            new = result['stages']['total'][metric]
+            if old > 0 and new > old * (1 + tolerance):
+                regressions.append({'server': server, 'combo': key, 'metric': metric,
+                                    'baseline_ms': old, 'current_ms': new,
+                                    'change': round(new / old - 1, 3)})
+    return regressions
+
+
+def run(servers=None, resolutions=None, frames=60, warmup=5, fps=DEFAULT_FPS):
+    """Benchmark servers and get the results as a JSON-friendly dict"""
+    servers = servers or list(SERVERS)
+    resolutions = resolutions or list(QUALITIES) or [None]
+    results = {
+        'meta': {
+            'created': time.time(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'opencv_threads': cv2.getNumThreads(),
+            'frames': frames,
+            'warmup': warmup,
+            'fps': fps
+        },
+        'servers': {}
+    }
+    for server in servers:
+        results['servers'][server] = bench_server(server, resolutions, frames, warmup, fps)
+    results['meta']['jpeg_encoder'] = encoder_report()['selected']
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark avatar frame rendering')
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), help='servers to benchmark (default: all)')
+    parser.add_argument('--resolutions', nargs='+', help='quality tiers (default: all in config.json)')
+    parser.add_argument('--frames', type=int, default=60, help='measured frames per combination')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--fps', type=float, default=DEFAULT_FPS, help='simulated stream frame rate')
+    parser.add_argument('--out', default=DEFAULT_OUT, help='results JSON')
+    parser.add_argument('--baseline', help='earlier results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed p95 slowdown before a combination counts as a regression')
+    args = parser.parse_args()
+
+    results = run(args.servers, args.resolutions, args.frames, args.warmup, args.fps)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        results['regressions'] = compare(results, baseline, args.tolerance)
+
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {args.out}")
+
+    if args.baseline:
+        for item in results['regressions']:
+            print(f"❌ {item['server']} {item['combo']}: {item['baseline_ms']:.1f} -> "
+                  f"{item['current_ms']:.1f} ms ({item['change']:+.0%})")
+        if results['regressions']:
+            sys.exit(1)
+        print(f"✅ No regressions against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Avatar Caches
+Small in-memory LRU caches with TTL used on the frame hot path
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe LRU cache with optional per-entry TTL"""
+
+    def __init__(self, max_entries=64, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Get value and mark it as recently used"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, stored_at = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                del self.entries[key]
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store value, evicting the least recently used entries"""
+        with self.lock:
+            self.entries[key] = (value, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all entries"""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Get hit/miss counters"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+
+class EncodedFrameCache(LRUCache):
+    """Cache of encoded frames keyed by their render inputs
+
+    Concurrent requests for the same key share one encode: the first
+    caller encodes while the others wait for its result.
+    """
+
+    def __init__(self, max_entries=64, ttl=2.0):
+        super().__init__(max_entries, ttl)
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+
+    def get_or_encode(self, key, encode_fn):
+        """Get encoded bytes for key, encoding them once if missing"""
+        data = self.get(key)
+        if data is not None:
+            return data
+
+        with self.pending_lock:
+            event = self.pending.get(key)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self.pending[key] = event
+
+        if not owner:
+            event.wait(timeout=1.0)
+            data = self.get(key)
+            if data is not None:
+                return data
+            return encode_fn()
+
+        try:
+            data = encode_fn()
+            if data is not None:
+                self.put(key, data)
+            return data
+        finally:
+            with self.pending_lock:
+                self.pending.pop(key, None)
+            event.set()
+
+
+def make_etag(key):
+    """Build an (unquoted) ETag value from a cache key"""
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:20]
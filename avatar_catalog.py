@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Avatar Product Catalog Packs
+Pre-synthesize product scripts and pre-render price overlays for a whole
+catalog ahead of a live show, stored in one memory-mapped pack file
+
+Usage: python avatar_catalog.py products_example.json [--voice female-1] [--workers 4]
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from avatar_config import portrait_sizes
+from avatar_layout import Layout, get_layout
+from avatar_lipsync import LipSyncTrack, FRAME_MS
+from avatar_sprites import SpriteLayer, render_layer
+from avatar_tts import ENGINES, get_tts_engine, tts_service
+from avatar_visemes import VisemeTimeline
+
+# Pack options, overridable from the environment
+CATALOG_PACK_DIR = os.getenv('CATALOG_PACK_DIR', os.path.join('temp', 'packs'))
+CATALOG_WORKERS = int(os.getenv('CATALOG_WORKERS', str(max(1, (os.cpu_count() or 2) - 1))))
+
+PACK_MAGIC = b'AVPACK1\n'
+PACK_ALIGN = 64
+
+# Product card in the 1080x1920 portrait
+CARD_BOX = (40, 1560, 1000, 240)
+
+
+def catalog_digest(products, voice, speed, pitch, engine):
+    """Get hash of everything a pack is built from"""
+    data = json.dumps([products, voice, float(speed), int(pitch), engine], sort_keys=True)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def pack_path(name, root=None):
+    return os.path.join(root or CATALOG_PACK_DIR, f"{name}.avpack")
+
+
+def format_price(price):
+    """Format rupiah like the dashboard: Rp 149.000"""
+    return f"Rp {int(price):,}".replace(',', '.')
+
+
+def product_script(product):
+    """Get the line the avatar says when a product comes up"""
+    script = product.get('script_suggestion')
+    if script:
+        return script
+    price = product.get('promoPrice') or product.get('price') or 0
+    return f"{product.get('name', 'Produk ini')}, sekarang cuma {format_price(price)}!"
+
+
+def draw_product_card(img, product, layout):
+    """Draw a product's price card onto a card-sized image"""
+    x, y, w, h = 0, 0, CARD_BOX[2], CARD_BOX[3]
+    cv2.rectangle(img, layout.pt(x, y), layout.pt(x + w, y + h), (25, 20, 30), -1)
+    cv2.rectangle(img, layout.pt(x, y), layout.pt(x + w - 2, y + h - 2), (37, 244, 238), layout.thickness(3))
+
+    name = product.get('name', '')
+    if len(name) > 38:
+        name = name[:37] + '...'
+    cv2.putText(img, name, layout.pt(25, 50), cv2.FONT_HERSHEY_SIMPLEX, layout.font(0.9),
+                (255, 255, 255), layout.thickness(2))
+
+    price = product.get('price') or 0
+    promo = product.get('promoPrice')
+    if promo and promo < price:
+        # Normal price struck through, promo price and discount badge
+        normal = format_price(price)
+        (text_w, _), _ = cv2.getTextSize(normal, cv2.FONT_HERSHEY_SIMPLEX, 0.9, 2)
+        cv2.putText(img, normal, layout.pt(25, 110), cv2.FONT_HERSHEY_SIMPLEX, layout.font(0.9),
+                    (150, 150, 150), layout.thickness(2))
+        cv2.line(img, layout.pt(25, 100), layout.pt(25 + text_w, 100), (150, 150, 150), layout.thickness(2))
+        cv2.putText(img, format_price(promo), layout.pt(25, 185), cv2.FONT_HERSHEY_DUPLEX, layout.font(1.8),
+                    (80, 60, 255), layout.thickness(3))
+        discount = int(round((1 - promo / price) * 100))
+        cv2.rectangle(img, layout.pt(820, 20), layout.pt(975, 80), (80, 60, 255), -1)
+        cv2.putText(img, f"-{discount}%", layout.pt(845, 65), cv2.FONT_HERSHEY_DUPLEX, layout.font(1.1),
+                    (255, 255, 255), layout.thickness(2))
+    else:
+        cv2.putText(img, format_price(price), layout.pt(25, 170), cv2.FONT_HERSHEY_DUPLEX, layout.font(1.8),
+                    (80, 60, 255), layout.thickness(3))
+
+    if product.get('isFlashSale'):
+        label = "FLASH SALE"
+        if product.get('saleDuration'):
+            label += f" {product['saleDuration']} MENIT"
+        cv2.rectangle(img, layout.pt(560, 150), layout.pt(975, 215), (0, 200, 255), -1)
+        cv2.putText(img, label, layout.pt(575, 195), cv2.FONT_HERSHEY_SIMPLEX, layout.font(0.85),
+                    (20, 20, 20), layout.thickness(2))
+
+    stock = product.get('stock')
+    if stock is not None:
+        cv2.putText(img, f"Stok: {stock}", layout.pt(820, 120), cv2.FONT_HERSHEY_SIMPLEX, layout.font(0.7),
+                    (200, 200, 200), layout.thickness(1))
+
+
+def render_product_card(product, width, height):
+    """Render a product card layer for one portrait size; returns (layer, (x, y))"""
+    layout = get_layout(width, height)
+    card_w, card_h = layout.size(CARD_BOX[2]), layout.size(CARD_BOX[3])
+    card_layout = Layout(card_w, card_h, CARD_BOX[2], CARD_BOX[3])
+    layer = render_layer(lambda img: draw_product_card(img, product, card_layout), card_w, card_h)
+    return layer, layout.pt(CARD_BOX[0], CARD_BOX[1])
+
+
+def prerender_product(task):
+    """Synthesize and render one product (runs in a pool process)"""
+    index, product, voice, speed, pitch, engine_name, sizes = task
+    engine = ENGINES[engine_name]
+    script = product_script(product)
+
+    # Same speak path as live: engine chunks analyzed by the lip-sync track
+    sample_rate, chunks = engine.synthesize(script, voice, speed, pitch)
+    chunks = list(chunks)
+    pcm = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int16)
+    duration = len(pcm) / sample_rate
+    # Sized for the whole script, since a live track's ring wraps after RING_FRAMES
+    hop = max(1, sample_rate * FRAME_MS // 1000)
+    track = LipSyncTrack(sample_rate, capacity=len(pcm) // hop + 1)
+    for chunk in chunks:
+        track.feed(chunk)
+    mouth_open, visemes = track.arrays()
+    timeline = VisemeTimeline(script, duration)
+
+    arrays = {
+        'pcm': pcm,
+        'mouth_open': mouth_open,
+        'visemes': visemes,
+        'timeline_starts': timeline.starts,
+        'timeline_ids': timeline.ids
+    }
+    overlays = {}
+    for width, height in sizes:
+        layer, (x, y) = render_product_card(product, width, height)
+        key = f"{width}x{height}"
+        overlays[key] = {'x': x, 'y': y, 'width': layer.width, 'height': layer.height, 'bbox': layer.bbox}
+        arrays[f"{key}_premultiplied"] = layer.premultiplied
+        arrays[f"{key}_inverse_alpha"] = layer.inverse_alpha
+
+    meta = {
+        'index': index,
+        'name': product.get('name', f"product-{index}"),
+        'script': script,
+        'sample_rate': sample_rate,
+        'duration': duration,
+        'overlays': overlays
+    }
+    return meta, arrays
+
+
+def write_pack(path, header, product_arrays):
+    """Write header JSON and every array (64-byte aligned) into one file"""
+    layout = []
+    offset = 0
+    for arrays in product_arrays:
+        entry = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            entry[name] = [offset, list(array.shape), array.dtype.str]
+            offset += -(-array.nbytes // PACK_ALIGN) * PACK_ALIGN
+        layout.append(entry)
+    for meta, entry in zip(header['products'], layout):
+        meta['arrays'] = entry
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = -(-(len(PACK_MAGIC) + 8 + len(header_bytes)) // PACK_ALIGN) * PACK_ALIGN
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(PACK_MAGIC)
+        f.write(len(header_bytes).to_bytes(8, 'little'))
+        f.write(header_bytes)
+        for arrays, entry in zip(product_arrays, layout):
+            for name, array in arrays.items():
+                f.seek(data_start + entry[name][0])
+                f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def build_pack(products, name, voice='female-1', speed=1.0, pitch=0, workers=None, root=None, engine=None):
+    """Pre-render a catalog into <root>/<name>.avpack; returns the pack path"""
+    engine = engine or get_tts_engine()
+    if engine is None:
+        raise RuntimeError("No TTS engine available; install piper or espeak-ng, or set TTS_ENGINE=tone")
+    sizes = portrait_sizes()
+    tasks = [(index, product, voice, speed, pitch, engine.name, sizes) for index, product in enumerate(products)]
+    workers = max(1, min(workers or CATALOG_WORKERS, len(tasks) or 1))
+
+    started = time.perf_counter()
+    if workers > 1:
+        # Spawned, not forked: the live server builds packs while its render,
+        # TTS and socket threads may hold locks a forked child would copy locked
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(workers, mp_context=context) as pool:
+            results = list(pool.map(prerender_product, tasks))
+    else:
+        results = [prerender_product(task) for task in tasks]
+
+    header = {
+        'catalog': name,
+        'digest': catalog_digest(products, voice, speed, pitch, engine.identity()),
+        'engine': engine.name,
+        'engine_identity': engine.identity(),
+        'voice': voice,
+        'speed': speed,
+        'pitch': pitch,
+        'sizes': [f"{w}x{h}" for w, h in sizes],
+        'created': time.time(),
+        'products': [meta for meta, _ in results]
+    }
+    path = pack_path(name, root)
+    write_pack(path, header, [arrays for _, arrays in results])
+    elapsed = time.perf_counter() - started
+    print(f"📦 Catalog pack {path}: {len(products)} products in {elapsed:.1f}s with {workers} workers")
+    return path
+
+
+def ensure_pack(products, name, voice='female-1', speed=1.0, pitch=0, workers=None, root=None):
+    """Get path of an up-to-date pack for a catalog, building it if needed"""
+    engine = get_tts_engine()
+    if engine is None:
+        raise RuntimeError("No TTS engine available; install piper or espeak-ng, or set TTS_ENGINE=tone")
+    path = pack_path(name, root)
+    digest = catalog_digest(products, voice, speed, pitch, engine.identity())
+    try:
+        if CatalogPack(path).header.get('digest') == digest:
+            return path
+    except (OSError, ValueError):
+        pass
+    return build_pack(products, name, voice, speed, pitch, workers, root, engine)
+
+
+class CatalogPack:
+    """Read-only view of a pack file; arrays are slices of one memory map"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(PACK_MAGIC)) != PACK_MAGIC:
+                raise ValueError(f"{path} is not a catalog pack")
+            header_size = int.from_bytes(f.read(8), 'little')
+            self.header = json.loads(f.read(header_size))
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+        self.data_start = -(-(len(PACK_MAGIC) + 8 + header_size) // PACK_ALIGN) * PACK_ALIGN
+        self.products = self.header['products']
+        self.overlays = {}
+
+    @property
+    def name(self):
+        return self.header['catalog']
+
+    def array(self, index, name):
+        """Get one stored array without copying"""
+        offset, shape, dtype = self.products[index]['arrays'][name]
+        return np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.data, offset=self.data_start + offset)
+
+    def find(self, product):
+        """Get a product index from an index or a product name, or None"""
+        if isinstance(product, int) or str(product).isdigit():
+            index = int(product)
+            return index if 0 <= index < len(self.products) else None
+        for meta in self.products:
+            if meta['name'] == product:
+                return meta['index']
+        return None
+
+    def overlay(self, index, width, height):
+        """Get (layer, (x, y)) of a product card for a frame size, or None"""
+        key = (index, width, height)
+        if key not in self.overlays:
+            meta = self.products[index]['overlays'].get(f"{width}x{height}")
+            if meta is None:
+                return None
+            size = f"{width}x{height}"
+            layer = SpriteLayer.from_parts(meta['width'], meta['height'], meta['bbox'],
+                                           self.array(index, f"{size}_premultiplied"),
+                                           self.array(index, f"{size}_inverse_alpha"))
+            self.overlays[key] = (layer, (meta['x'], meta['y']))
+        return self.overlays[key]
+
+    def speech_entry(self, index):
+        """Get a TTS cache entry for a product's script"""
+        meta = self.products[index]
+        return {
+            'pcm': self.array(index, 'pcm'),
+            'sample_rate': meta['sample_rate'],
+            'mouth_open': self.array(index, 'mouth_open'),
+            'visemes': self.array(index, 'visemes'),
+            'duration': meta['duration']
+        }
+
+
+class CatalogStore:
+    """Catalog packs loaded for the live show
+
+    Loading a pack pins every product script in the TTS cache, so
+    speaking a product line is a cache hit, and product cards are
+    composited straight from the memory map.
+    """
+
+    def __init__(self):
+        self.packs = {}
+        self.lock = threading.Lock()
+
+    def load(self, path):
+        """Memory-map a pack and register its scripts with the TTS cache"""
+        pack = CatalogPack(path)
+        header = pack.header
+        engine = get_tts_engine()
+        if engine is not None and header.get('engine_identity') == engine.identity():
+            for meta in pack.products:
+                key = tts_service.cache.key(engine.identity(), meta['script'], header['voice'],
+                                            header['speed'], header['pitch'])
+                tts_service.cache.pin(key, pack.speech_entry(meta['index']))
+        else:
+            print(f"⚠️ Pack {pack.name} was built with TTS engine {header.get('engine_identity', header['engine'])}, "
+                  f"scripts will be re-synthesized")
+        with self.lock:
+            self.packs[pack.name] = pack
+        print(f"📦 Loaded catalog pack {pack.name}: {len(pack.products)} products")
+        return pack
+
+    def get(self, name):
+        return self.packs.get(name)
+
+    def select(self, name, product):
+        """Get (catalog name, product index) for a product, or None"""
+        pack = self.packs.get(name)
+        if pack is None:
+            return None
+        index = pack.find(product)
+        return (name, index) if index is not None else None
+
+    def script(self, selection):
+        pack = self.packs.get(selection[0])
+        return pack.products[selection[1]]['script'] if pack else None
+
+    def card(self, frame, selection):
+        """Get (layer, (x, y)) of the selected product card for a frame, or None"""
+        if frame is None or not selection:
+            return None
+        pack = self.packs.get(selection[0])
+        if pack is None:
+            return None
+        height, width = frame.shape[:2]
+        return pack.overlay(selection[1], width, height)
+
+    def card_rect(self, frame, selection):
+        """Get the (x0, y0, x1, y1) area the selected product card covers, or None"""
+        card = self.card(frame, selection)
+        if card is None:
+            return None
+        layer, (x, y) = card
+        height, width = frame.shape[:2]
+        return (x, y, min(width, x + layer.width), min(height, y + layer.height))
+
+    def composite(self, frame, selection):
+        """Draw the selected product card onto a frame in place"""
+        card = self.card(frame, selection)
+        if card is None:
+            return frame
+        layer, (x, y) = card
+        layer.composite(frame[y:y + layer.height, x:x + layer.width])
+        return frame
+
+    def report(self):
+        return {name: {'products': len(pack.products), 'engine': pack.header['engine'], 'path': pack.path}
+                for name, pack in self.packs.items()}
+
+
+# Packs loaded in this process
+catalogs = CatalogStore()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-render a product catalog into a pack file')
+    parser.add_argument('catalog', help='catalog JSON (list of products)')
+    parser.add_argument('--name', help='pack name (default: catalog file name)')
+    parser.add_argument('--voice', default='female-1')
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--pitch', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=CATALOG_WORKERS)
+    parser.add_argument('--out', default=CATALOG_PACK_DIR, help='pack directory')
+    args = parser.parse_args()
+
+    with open(args.catalog, 'r', encoding='utf-8') as f:
+        products = json.load(f)
+    name = args.name or os.path.splitext(os.path.basename(args.catalog))[0]
+    build_pack(products, name, args.voice, args.speed, args.pitch, args.workers, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Avatar Streaming Configuration
+Read streaming qualities and frame rate from config.json
+"""
+
+import json
+import os
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')
+
+# Portrait frame everything is designed against (9:16)
+BASE_WIDTH = 1080
+BASE_HEIGHT = 1920
+
+
+def load_config(path=CONFIG_PATH):
+    """Load config.json, falling back to an empty config"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not read {path}: {e}")
+        return {}
+
+
+CONFIG = load_config()
+STREAMING = CONFIG.get('streaming', {})
+QUALITIES = STREAMING.get('qualities', {})
+DEFAULT_QUALITY = STREAMING.get('default_quality', '720p')
+DEFAULT_FPS = STREAMING.get('default_fps', 30)
+
+
+def portrait_size(quality=None):
+    """Get (width, height) of the portrait frame for a quality tier
+
+    Qualities in config.json are landscape, so width and height are swapped.
+    Unknown or missing qualities use the full 1080x1920 portrait.
+    """
+    tier = QUALITIES.get(quality) if quality else None
+    if not tier:
+        return BASE_WIDTH, BASE_HEIGHT
+    return tier['height'], tier['width']
+
+
+def step_down_quality(quality, steps):
+    """Get the quality tier steps tiers below quality, stopping at the smallest"""
+    if not steps or not QUALITIES:
+        return quality
+    tiers = sorted(QUALITIES, key=lambda name: QUALITIES[name]['height'], reverse=True)
+    # No tier (or an unknown one) is the full portrait, the same as the largest tier
+    index = tiers.index(quality) if quality in tiers else 0
+    return tiers[min(index + steps, len(tiers) - 1)]
+
+
+def portrait_sizes():
+    """Get portrait sizes for every configured quality, largest first"""
+    sizes = {(BASE_WIDTH, BASE_HEIGHT)}
+    for quality in QUALITIES:
+        sizes.add(portrait_size(quality))
+    return sorted(sizes, reverse=True)
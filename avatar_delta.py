@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Avatar Delta Rendering
+Reuse earlier frame buffers and redraw only the regions whose inputs changed
+"""
+
+import os
+import threading
+
+import numpy as np
+
+from avatar_background import get_background, animation_time
+
+# Disable with DELTA_RENDERING=false to draw every layer of every frame
+DELTA_ENABLED = os.getenv('DELTA_RENDERING', 'true').lower() == 'true'
+
+# Frame buffers per avatar, each the size of the stream's quality tier
+# (1080x1920 is about 6.2 MB). Like the render worker slots, a returned
+# frame stays untouched until DELTA_BUFFERS - 1 more frames have been rendered
+DELTA_BUFFERS = 3
+
+
+def overlaps(a, b):
+    """Check whether two (x0, y0, x1, y1) rectangles intersect"""
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class FullDraw:
+    """Region tracker for frames drawn from scratch: every region is drawn"""
+
+    def dirty(self, name, rect, key, restore=True):
+        return True
+
+
+FULL_DRAW = FullDraw()
+
+
+class DeltaFrame:
+    """One reusable frame buffer and the inputs its regions were drawn from
+
+    Renderers ask dirty() before drawing a region. Regions are drawn in a
+    fixed order; one whose content changes shouldn't overlap a region
+    drawn before it, since restoring its background would erase that one.
+    """
+
+    def __init__(self, width, height):
+        self.buffer = np.empty((height, width, 3), dtype=np.uint8)
+        self.background = None
+        self.background_key = None
+        # name -> [rect, key, valid]
+        self.regions = {}
+        self.stale = []
+        self.full = True
+
+    def start(self, background, key):
+        """Begin a frame, refilling the buffer when the background changed"""
+        self.background = background
+        if key != self.background_key:
+            np.copyto(self.buffer, background)
+            self.background_key = key
+            self.regions = {}
+            self.stale = []
+            self.full = True
+            return
+        self.full = False
+        # Areas drawn over outside the avatar (product cards) since this buffer was last used
+        for rect in self.stale:
+            self.restore(rect)
+            self.invalidate(rect)
+        self.stale = []
+
+    def restore(self, rect):
+        """Copy the background back into a rectangle"""
+        if self.full:
+            return
+        x0, y0, x1, y1 = rect
+        np.copyto(self.buffer[y0:y1, x0:x1], self.background[y0:y1, x0:x1])
+
+    def invalidate(self, rect, keep=None):
+        """Mark regions touching a rectangle for drawing again"""
+        for name, region in self.regions.items():
+            if name != keep and overlaps(region[0], rect):
+                region[2] = False
+
+    def dirty(self, name, rect, key, restore=True):
+        """Check whether a region needs drawing, and record it as drawn
+
+        Returns False when the buffer already shows the region drawn from
+        the same key. Otherwise the background is put back under it first,
+        unless restore is False, which suits overlays that cover everything
+        they drew before (filled shapes, or the same solid text).
+        """
+        region = self.regions.get(name)
+        if region is not None and region[2] and region[0] == rect and region[1] == key:
+            return False
+        if region is not None and restore:
+            # Clear what it drew before; regions drawn over that get drawn again
+            for area in ((rect,) if region[0] == rect else (region[0], rect)):
+                self.restore(area)
+                self.invalidate(area, keep=name)
+        self.regions[name] = [rect, key, True]
+        return True
+
+
+class DeltaCanvas:
+    """Rotating frame buffers for one avatar
+
+    begin() hands out the next buffer already showing the background and
+    whatever regions it held the last time; renderers only draw what
+    changed since then. With delta rendering off every frame gets a new
+    buffer filled from scratch.
+    """
+
+    def __init__(self, buffers=DELTA_BUFFERS, enabled=DELTA_ENABLED):
+        self.enabled = enabled
+        self.frames = [None] * buffers
+        self.index = 0
+        self.lock = threading.Lock()
+
+    def begin(self, width, height, t=None, fps=None):
+        """Get a DeltaFrame for the next frame at a size and background time"""
+        t = animation_time(t, fps)
+        background = get_background(width, height)
+        if not self.enabled:
+            frame = DeltaFrame(width, height)
+        else:
+            with self.lock:
+                frame = self.frames[self.index]
+                if frame is None or frame.buffer.shape[:2] != (height, width):
+                    if frame is not None:
+                        # Quality tier changed; don't keep buffers of the old size around
+                        self.frames = [None] * len(self.frames)
+                    frame = self.frames[self.index] = DeltaFrame(width, height)
+                self.index = (self.index + 1) % len(self.frames)
+        frame.start(background.frame_view(t), background.phase(t))
+        return frame
+
+    def invalidate(self, buffer, rect):
+        """Note that rect of a handed-out buffer was drawn over by someone else"""
+        if rect is None:
+            return
+        for frame in self.frames:
+            if frame is not None and frame.buffer is buffer:
+                frame.stale.append(rect)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Avatar JPEG Encoders
+Pluggable JPEG backends (OpenCV, PyTurboJPEG, Pillow) with a startup
+micro-benchmark that picks the fastest one available
+"""
+
+import os
+import threading
+import time
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_444, TJSAMP_422, TJSAMP_420, TJFLAG_PROGRESSIVE
+except ImportError:
+    TurboJPEG = None
+
+# Encoder options, overridable from the environment
+ENCODER_BACKEND = os.getenv('JPEG_ENCODER', 'auto')
+JPEG_SUBSAMPLING = os.getenv('JPEG_SUBSAMPLING', '420')
+JPEG_PROGRESSIVE = os.getenv('JPEG_PROGRESSIVE', 'false').lower() == 'true'
+JPEG_OPTIMIZE = os.getenv('JPEG_OPTIMIZE', 'false').lower() == 'true'
+
+SUBSAMPLING_MODES = ('444', '422', '420')
+
+
+class JPEGEncoder:
+    """Base JPEG encoder backend with latency bookkeeping"""
+
+    name = 'base'
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.last_time = 0.0
+        self.benchmark_ms = None
+
+    def available(self):
+        """Check whether the backend can be used in this environment"""
+        return True
+
+    def encode(self, frame, quality=90, subsampling=None, progressive=None, optimize=None):
+        """Encode a BGR frame to JPEG bytes"""
+        subsampling = subsampling or JPEG_SUBSAMPLING
+        if subsampling not in SUBSAMPLING_MODES:
+            subsampling = '420'
+        progressive = JPEG_PROGRESSIVE if progressive is None else progressive
+        optimize = JPEG_OPTIMIZE if optimize is None else optimize
+
+        started = time.perf_counter()
+        data = self._encode(frame, int(quality), subsampling, progressive, optimize)
+        self.last_time = time.perf_counter() - started
+        self.count += 1
+        self.total_time += self.last_time
+        return data
+
+    def _encode(self, frame, quality, subsampling, progressive, optimize):
+        raise NotImplementedError
+
+    def report(self):
+        """Get latency report for this backend"""
+        return {
+            'available': self.available(),
+            'encodes': self.count,
+            'avg_ms': round(self.total_time / self.count * 1000, 3) if self.count else None,
+            'last_ms': round(self.last_time * 1000, 3) if self.count else None,
+            'benchmark_ms': self.benchmark_ms
+        }
+
+
+class OpenCVEncoder(JPEGEncoder):
+    """cv2.imencode backend (always available)"""
+
+    name = 'opencv'
+
+    SAMPLING_FLAGS = {
+        '444': getattr(cv2, 'IMWRITE_JPEG_SAMPLING_FACTOR_444', None),
+        '422': getattr(cv2, 'IMWRITE_JPEG_SAMPLING_FACTOR_422', None),
+        '420': getattr(cv2, 'IMWRITE_JPEG_SAMPLING_FACTOR_420', None)
+    }
+
+    def _encode(self, frame, quality, subsampling, progressive, optimize):
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality,
+                  cv2.IMWRITE_JPEG_PROGRESSIVE, int(progressive),
+                  cv2.IMWRITE_JPEG_OPTIMIZE, int(optimize)]
+        sampling_flag = self.SAMPLING_FLAGS.get(subsampling)
+        if sampling_flag is not None and hasattr(cv2, 'IMWRITE_JPEG_SAMPLING_FACTOR'):
+            params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, sampling_flag]
+        ok, buffer = cv2.imencode('.jpg', frame, params)
+        return buffer.tobytes() if ok else None
+
+
+class TurboJPEGEncoder(JPEGEncoder):
+    """PyTurboJPEG backend (libjpeg-turbo SIMD), used when installed"""
+
+    name = 'turbojpeg'
+
+    def __init__(self):
+        super().__init__()
+        self.turbo = None
+        self.lock = threading.Lock()
+        if TurboJPEG is not None:
+            try:
+                self.turbo = TurboJPEG()
+            except Exception as e:
+                print(f"⚠️ TurboJPEG not available: {e}")
+
+    def available(self):
+        return self.turbo is not None
+
+    def _encode(self, frame, quality, subsampling, progressive, optimize):
+        # Progressive output always uses optimized Huffman tables in libjpeg-turbo
+        sampling = {'444': TJSAMP_444, '422': TJSAMP_422, '420': TJSAMP_420}[subsampling]
+        flags = TJFLAG_PROGRESSIVE if progressive else 0
+        with self.lock:
+            return self.turbo.encode(np.ascontiguousarray(frame), quality=quality, pixel_format=TJPF_BGR,
+                                     jpeg_subsample=sampling, flags=flags)
+
+
+class PillowEncoder(JPEGEncoder):
+    """Pillow backend"""
+
+    name = 'pillow'
+
+    SUBSAMPLING = {'444': 0, '422': 1, '420': 2}
+
+    def _encode(self, frame, quality, subsampling, progressive, optimize):
+        image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=quality, subsampling=self.SUBSAMPLING[subsampling],
+                   progressive=progressive, optimize=optimize)
+        return buffer.getvalue()
+
+
+ENCODERS = {
+    'opencv': OpenCVEncoder(),
+    'turbojpeg': TurboJPEGEncoder(),
+    'pillow': PillowEncoder()
+}
+
+_selected = None
+# Re-entrant: get_encoder holds it while select_encoder runs
+_selected_lock = threading.RLock()
+
+
+def benchmark_frame(width=1080, height=1920):
+    """Build a portrait-sized frame with gradient and detail for benchmarking"""
+    rows = np.linspace(40, 200, height, dtype=np.float32)[:, np.newaxis, np.newaxis]
+    frame = np.broadcast_to(rows, (height, width, 3)).astype(np.uint8)
+    noise = np.random.default_rng(0).integers(0, 40, (height // 2, width // 2, 3), dtype=np.uint8)
+    frame[height // 4:height // 4 + height // 2, width // 4:width // 4 + width // 2] += noise
+    return frame
+
+
+def benchmark_encoders(frame=None, quality=90, runs=5):
+    """Time every available backend; returns {name: ms per encode}"""
+    if frame is None:
+        frame = benchmark_frame()
+    results = {}
+    for name, encoder in ENCODERS.items():
+        if not encoder.available():
+            continue
+        try:
+            encoder.encode(frame, quality)
+            started = time.perf_counter()
+            for _ in range(runs):
+                encoder.encode(frame, quality)
+            encoder.benchmark_ms = round((time.perf_counter() - started) / runs * 1000, 3)
+            results[name] = encoder.benchmark_ms
+        except Exception as e:
+            print(f"⚠️ JPEG encoder {name} failed benchmark: {e}")
+    return results
+
+
+def select_encoder(backend=None):
+    """Pick the JPEG backend: an explicit one, or the fastest by micro-benchmark"""
+    global _selected
+    backend = backend or ENCODER_BACKEND
+    with _selected_lock:
+        encoder = ENCODERS.get(backend)
+        if encoder is not None and encoder.available():
+            _selected = encoder
+        else:
+            if backend != 'auto':
+                print(f"⚠️ JPEG encoder '{backend}' not available, benchmarking instead")
+            results = benchmark_encoders()
+            fastest = min(results, key=results.get) if results else 'opencv'
+            _selected = ENCODERS[fastest]
+            print(f"🖼️ JPEG encoder benchmark (ms/frame): {results} -> {fastest}")
+        return _selected
+
+
+def get_encoder():
+    """Get the selected JPEG backend, selecting one on first use"""
+    if _selected is None:
+        with _selected_lock:
+            # Another thread may have finished selecting while this one waited
+            if _selected is None:
+                select_encoder()
+    return _selected
+
+
+def encoder_report():
+    """Get selected backend and per-backend latency"""
+    return {
+        'selected': _selected.name if _selected is not None else None,
+        'backends': {name: encoder.report() for name, encoder in ENCODERS.items()}
+    }
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Avatar Frame Governor
+Per-stream quality levels that trade detail for a steady frame rate
+"""
+
+import os
+
+from avatar_config import DEFAULT_FPS
+from avatar_transform import DEFAULT_QUALITY
+
+# Disable with FRAME_GOVERNOR=false to always render at full quality
+GOVERNOR_ENABLED = os.getenv('FRAME_GOVERNOR', 'true').lower() == 'true'
+
+# Degradation levels, each adding one step to the previous: background
+# animation rate, warp interpolation, JPEG quality, then resolution tier
+LEVELS = (
+    {},
+    {'background_fps': 5},
+    {'background_fps': 5, 'warp_quality': 'nearest'},
+    {'background_fps': 5, 'warp_quality': 'nearest', 'jpeg_quality': 70},
+    {'background_fps': 5, 'warp_quality': 'nearest', 'jpeg_quality': 70, 'resolution_step': 1},
+    {'background_fps': 5, 'warp_quality': 'nearest', 'jpeg_quality': 70, 'resolution_step': 2}
+)
+
+# Frame cost as a share of the frame budget: above PRESSURE steps down,
+# below HEADROOM steps back up
+PRESSURE = 0.9
+HEADROOM = 0.5
+
+# Frames the cost has to stay past a threshold before changing level;
+# stepping up waits longer so a level isn't dropped again right away
+DOWN_FRAMES = 15
+UP_FRAMES = 90
+
+# Weight of the newest frame in the cost average
+COST_SMOOTHING = 0.2
+
+
+class FrameGovernor:
+    """Track a stream's frame cost against its budget and pick a quality level
+
+    record() is called with the render plus encode time of every frame;
+    hints() returns the render params for the current level.
+    """
+
+    def __init__(self, fps=DEFAULT_FPS, enabled=GOVERNOR_ENABLED):
+        self.budget = 1.0 / max(fps, 1)
+        self.enabled = enabled
+        self.level = 0
+        self.cost = None
+        self.over = 0
+        self.under = 0
+        self.changes = 0
+
+    def hints(self):
+        return LEVELS[self.level]
+
+    def record(self, seconds):
+        """Add one frame's cost; returns True when the level changed"""
+        if not self.enabled:
+            return False
+        self.cost = seconds if self.cost is None else self.cost + (seconds - self.cost) * COST_SMOOTHING
+        load = self.cost / self.budget
+
+        self.over = self.over + 1 if load > PRESSURE else 0
+        self.under = self.under + 1 if load < HEADROOM else 0
+
+        if self.over >= DOWN_FRAMES and self.level < len(LEVELS) - 1:
+            return self.set_level(self.level + 1)
+        if self.under >= UP_FRAMES and self.level > 0:
+            return self.set_level(self.level - 1)
+        return False
+
+    def set_level(self, level):
+        print(f"⏱️ Frame governor: level {self.level} -> {level} "
+              f"({self.cost * 1000:.1f} ms per frame, budget {self.budget * 1000:.1f} ms)")
+        self.level = level
+        self.over = self.under = 0
+        # Cost at the new level is measured fresh
+        self.cost = None
+        self.changes += 1
+        return True
+
+    def report(self):
+        return {
+            'level': self.level,
+            'cost_ms': round(self.cost * 1000, 2) if self.cost is not None else None,
+            'budget_ms': round(self.budget * 1000, 2),
+            'changes': self.changes,
+            'hints': self.hints()
+        }
+
+
+def apply_render_hints(avatar, params):
+    """Set an avatar's per-frame render options from governor hints"""
+    avatar.warp_quality = params.get('warp_quality') or DEFAULT_QUALITY
+    avatar.background_fps = params.get('background_fps')
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Avatar Face Landmarks
+One-time landmark analysis of the static face, cached next to the asset,
+and per-frame animation that warps only the eye, mouth and brow regions
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+from avatar_assets import array_digest, face_assets, SOURCE_FACE_SIZE
+from avatar_startup import load_backend
+
+# Regions are named by image side ('left_eye' is on the left of the image)
+REGIONS = ('left_eye', 'right_eye', 'mouth', 'left_brow', 'right_brow')
+
+# MediaPipe FaceMesh indices per region
+MEDIAPIPE_REGIONS = {
+    'left_eye': [33, 7, 163, 144, 145, 153, 154, 155, 133, 173, 157, 158, 159, 160, 161, 246],
+    'right_eye': [362, 382, 381, 380, 374, 373, 390, 249, 263, 466, 388, 387, 386, 385, 384, 398],
+    'mouth': [61, 146, 91, 181, 84, 17, 314, 405, 321, 375, 291, 409, 270, 269, 267, 0, 37, 39, 40, 185],
+    'left_brow': [70, 63, 105, 66, 107, 55, 65, 52, 53, 46],
+    'right_brow': [336, 296, 334, 293, 300, 276, 283, 282, 295, 285]
+}
+
+# dlib 68-point indices per region
+DLIB_REGIONS = {
+    'left_eye': range(36, 42),
+    'right_eye': range(42, 48),
+    'mouth': range(48, 60),
+    'left_brow': range(17, 22),
+    'right_brow': range(22, 27)
+}
+
+DLIB_PREDICTOR = os.getenv('DLIB_PREDICTOR', os.path.join('avatars', 'shape_predictor_68_face_landmarks.dat'))
+
+
+class FaceLandmarks:
+    """Feature polygons of a face in normalized (0..1) coordinates
+
+    Normalized geometry is valid for every pyramid level of the face.
+    """
+
+    def __init__(self, regions, source='default'):
+        self.regions = {name: np.asarray(points, dtype=np.float32) for name, points in regions.items()}
+        self.source = source
+
+    def points(self, name, size):
+        """Get region polygon in pixels for a size x size face"""
+        return np.round(self.regions[name] * size).astype(np.int32)
+
+    def to_dict(self):
+        return {
+            'source': self.source,
+            'regions': {name: points.round(5).tolist() for name, points in self.regions.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['regions'], data.get('source', 'cache'))
+
+
+def default_landmarks():
+    """Landmarks matching the drawn fallback face"""
+    size = float(SOURCE_FACE_SIZE)
+    regions = {
+        'left_eye': cv2.ellipse2Poly((160, 180), (25, 15), 0, 0, 360, 30),
+        'right_eye': cv2.ellipse2Poly((240, 180), (25, 15), 0, 0, 360, 30),
+        'mouth': cv2.ellipse2Poly((200, 260), (30, 15), 0, 0, 180, 20),
+        'left_brow': cv2.ellipse2Poly((160, 152), (28, 6), 0, 180, 360, 30),
+        'right_brow': cv2.ellipse2Poly((240, 152), (28, 6), 0, 180, 360, 30)
+    }
+    return FaceLandmarks({name: points / size for name, points in regions.items()}, 'default')
+
+
+def detect_mediapipe(face_image):
+    """Run MediaPipe FaceMesh once on a still face"""
+    mp = load_backend('mediapipe')
+    if mp is None:
+        return None
+    with mp.solutions.face_mesh.FaceMesh(static_image_mode=True, max_num_faces=1,
+                                         refine_landmarks=True) as face_mesh:
+        result = face_mesh.process(cv2.cvtColor(np.ascontiguousarray(face_image), cv2.COLOR_BGR2RGB))
+    if not result.multi_face_landmarks:
+        return None
+    landmarks = result.multi_face_landmarks[0].landmark
+    regions = {
+        name: [(landmarks[i].x, landmarks[i].y) for i in indices]
+        for name, indices in MEDIAPIPE_REGIONS.items()
+    }
+    return FaceLandmarks(regions, 'mediapipe')
+
+
+def detect_dlib(face_image):
+    """Run dlib's 68-point predictor once on a still face"""
+    if not os.path.exists(DLIB_PREDICTOR):
+        return None
+    dlib = load_backend('dlib')
+    if dlib is None:
+        return None
+    gray = cv2.cvtColor(np.ascontiguousarray(face_image), cv2.COLOR_BGR2GRAY)
+    faces = dlib.get_frontal_face_detector()(gray, 1)
+    if not faces:
+        return None
+    shape = dlib.shape_predictor(DLIB_PREDICTOR)(gray, faces[0])
+    h, w = gray.shape
+    regions = {
+        name: [(shape.part(i).x / w, shape.part(i).y / h) for i in indices]
+        for name, indices in DLIB_REGIONS.items()
+    }
+    return FaceLandmarks(regions, 'dlib')
+
+
+def analyze_face(face_image):
+    """Find feature landmarks with the first detector that works"""
+    for detect in (detect_mediapipe, detect_dlib):
+        try:
+            landmarks = detect(face_image)
+        except Exception as e:
+            print(f"⚠️ Landmark detection failed ({detect.__name__}): {e}")
+            landmarks = None
+        if landmarks is not None:
+            return landmarks
+    return None
+
+
+def load_landmarks(face_image, cache=face_assets, detect=True):
+    """Get landmarks for a face, analyzing it only the first time
+
+    Detected landmarks are stored next to the face in the asset cache,
+    keyed by the face's content hash. Without a detector the fallback
+    face geometry is used (and not cached, so a detector added later
+    still runs). With detect=False only cached landmarks are returned,
+    and None on a miss, so MediaPipe and dlib are never imported.
+    """
+    digest = array_digest(face_image)
+    data = cache.get_landmarks(digest)
+    if data is not None:
+        return FaceLandmarks.from_dict(data)
+    if not detect:
+        return None
+
+    landmarks = analyze_face(face_image)
+    if landmarks is None:
+        return default_landmarks()
+    cache.put_landmarks(digest, landmarks.to_dict())
+    print(f"✅ Face landmarks found with {landmarks.source}")
+    return landmarks
+
+
+class RegionGeometry:
+    """Pixel geometry of one feature at one face size"""
+
+    def __init__(self, points, size, pad, grow):
+        self.points = points
+        x, y, w, h = cv2.boundingRect(points)
+        self.width = w
+        self.height = h
+        self.center = (x + w / 2.0, y + h / 2.0)
+        margin = int(round(max(w, h) * pad)) + 2
+        self.roi = (max(0, x - margin), max(0, y - margin),
+                    min(size, x + w + margin), min(size, y + h + margin))
+
+        # Feathered mask: warped pixels fade into the untouched face
+        x0, y0, x1, y1 = self.roi
+        mask = np.zeros((y1 - y0, x1 - x0), dtype=np.float32)
+        hull = cv2.convexHull(points - np.array([x0, y0], dtype=np.int32))
+        grown = (hull - hull.mean(axis=0)) * (1.0 + grow) + hull.mean(axis=0)
+        cv2.fillConvexPoly(mask, np.round(grown).astype(np.int32), 1.0)
+        kernel = max(3, (margin // 2) * 2 + 1)
+        self.mask = cv2.GaussianBlur(mask, (kernel, kernel), 0)
+        self.inverse_mask = 1.0 - self.mask
+
+
+class RegionAnimator:
+    """Animate eyes, mouth and brows by warping only their small regions"""
+
+    # ROI margin and mask growth, relative to the feature size
+    PADDING = {'mouth': 0.6}
+    DEFAULT_PADDING = 0.5
+    # Eyes blend tightly so squashing never pulls in hair or brows
+    GROWTH = {'left_eye': 0.3, 'right_eye': 0.3}
+
+    def __init__(self, landmarks):
+        self.landmarks = landmarks
+        self.geometry_cache = {}
+
+    def geometry(self, size):
+        """Get region geometry for a face size, built once per size"""
+        geometry = self.geometry_cache.get(size)
+        if geometry is None:
+            geometry = {
+                name: RegionGeometry(self.landmarks.points(name, size), size,
+                                     self.PADDING.get(name, self.DEFAULT_PADDING),
+                                     self.GROWTH.get(name, self.PADDING.get(name, self.DEFAULT_PADDING)))
+                for name in REGIONS if name in self.landmarks.regions
+            }
+            self.geometry_cache[size] = geometry
+        return geometry
+
+    def warp_region(self, img, region, matrix, offset, draw_fn=None, fill=None, blend=True):
+        """Warp one region in place, blending through its mask
+
+        matrix maps ROI-local destination pixels to source pixels. Source
+        pixels outside the ROI repeat its border, or take fill if given.
+        With blend=False the ROI is overwritten with the warped pixels.
+        """
+        x0, y0, x1, y1 = region.roi
+        dx, dy = offset
+        x0, x1, y0, y1 = x0 + dx, x1 + dx, y0 + dy, y1 + dy
+        h, w = img.shape[:2]
+        if x0 < 0 or y0 < 0 or x1 > w or y1 > h:
+            return
+
+        patch = img[y0:y1, x0:x1]
+        if fill is None:
+            border = {'borderMode': cv2.BORDER_REPLICATE}
+        else:
+            border = {'borderMode': cv2.BORDER_CONSTANT, 'borderValue': fill}
+        warped = cv2.warpAffine(patch, matrix, (x1 - x0, y1 - y0),
+                                flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP, **border)
+        if draw_fn is not None:
+            draw_fn(warped)
+        if blend:
+            patch[:] = cv2.blendLinear(warped, patch, region.mask, region.inverse_mask)
+        else:
+            patch[:] = warped
+
+    def region_offset(self, region, transform=None):
+        """Get pixel shift of a region under the head transform"""
+        if transform is None:
+            return (0, 0)
+        x, y = transform.apply(region.center)
+        return (int(round(x - region.center[0])), int(round(y - region.center[1])))
+
+    def local_center(self, region):
+        """Get region center relative to its ROI"""
+        return (region.center[0] - region.roi[0], region.center[1] - region.roi[1])
+
+    def animate(self, face_img, state, transform=None, mouth=True):
+        """Apply blink, brow, smile and mouth animation to a rendered face
+
+        transform is the head warp already applied to face_img; regions
+        follow it so they stay on their features. mouth=False leaves the
+        mouth to a viseme atlas.
+        """
+        size = face_img.shape[0]
+        geometry = self.geometry(size)
+
+        def offset(region):
+            return self.region_offset(region, transform)
+
+        # Eyes: squash toward the lid line to blink, widen slightly when focused
+        blink = min(1.0, state.get('eye_blink', 0.0))
+        focus = state.get('eye_focus', 0.0)
+        eye_scale_y = max(0.08, 1.0 - blink * 0.92) * (1.0 + focus * 0.08)
+        if eye_scale_y != 1.0:
+            for name in ('left_eye', 'right_eye'):
+                region = geometry.get(name)
+                if region is None:
+                    continue
+                cx, cy = self.local_center(region)
+                matrix = np.float32([[1, 0, 0], [0, 1.0 / eye_scale_y, cy - cy / eye_scale_y]])
+
+                def draw_lashes(patch, region=region, cx=cx, cy=cy):
+                    if blink > 0.6:
+                        half = region.width / 2.0
+                        cv2.line(patch, (int(cx - half), int(cy)), (int(cx + half), int(cy)),
+                                 (60, 45, 35), max(1, size // 200))
+
+                # Lids take the skin tone just below the eye
+                dx, dy = offset(region)
+                skin_y = min(size - 1, max(0, int(region.center[1] + region.height * 0.9) + dy))
+                skin_x = min(size - 1, max(0, int(region.center[0]) + dx))
+                skin = tuple(int(c) for c in face_img[skin_y, skin_x])
+                self.warp_region(face_img, region, matrix, (dx, dy), draw_lashes, fill=skin)
+
+        # Brows: lift
+        raise_amount = state.get('eyebrow_raise', 0.0)
+        if raise_amount > 0:
+            lift = raise_amount * size * 0.03
+            matrix = np.float32([[1, 0, 0], [0, 1, lift]])
+            for name in ('left_brow', 'right_brow'):
+                region = geometry.get(name)
+                if region is not None:
+                    self.warp_region(face_img, region, matrix, offset(region))
+
+        # Mouth: widen for a smile, drop the lower lip to open
+        region = geometry.get('mouth')
+        mouth_open = state.get('mouth_open', 0.0)
+        smile = state.get('smile', 0.0)
+        if mouth and region is not None and (mouth_open > 0 or smile > 0):
+            self.warp_mouth(face_img, region, mouth_open, 1.0 + smile * 0.12, offset(region))
+
+    def warp_mouth(self, face_img, region, mouth_open, scale_x=1.0, offset=(0, 0), blend=True):
+        """Reshape the mouth region: scale_x widens it, mouth_open (0..1) drops the lower lip"""
+        cx, cy = self.local_center(region)
+        top = cy - region.height / 2.0
+        scale_y = 1.0 + mouth_open * 1.2
+        # Inverse map: anchored at the mouth's horizontal center and upper lip
+        matrix = np.float32([[1.0 / scale_x, 0, cx - cx / scale_x],
+                             [0, 1.0 / scale_y, top - top / scale_y]])
+
+        def draw_opening(patch):
+            if mouth_open <= 0.05:
+                return
+            axes = (max(1, int(region.width * 0.35 * scale_x)),
+                    max(1, int(region.height * 0.45 * (scale_y - 1.0))))
+            center = (int(cx), int(top + (cy - top) * scale_y))
+            cv2.ellipse(patch, center, axes, 0, 0, 360, (60, 30, 35), -1)
+            if mouth_open > 0.5:
+                teeth_axes = (max(1, int(axes[0] * 0.8)), max(1, axes[1] // 2))
+                cv2.ellipse(patch, (center[0], center[1] - axes[1] // 2), teeth_axes,
+                            0, 180, 360, (235, 235, 235), -1)
+
+        self.warp_region(face_img, region, matrix, offset, draw_opening, blend=blend)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Avatar Layout
+Resolution-independent coordinates for the portrait renderers
+"""
+
+import functools
+
+from avatar_config import BASE_WIDTH, BASE_HEIGHT, portrait_size
+from avatar_assets import BASE_FACE_SIZE
+
+
+class Layout:
+    """Map design coordinates onto an image of any size
+
+    Renderers keep describing positions in the space they were designed
+    for (the 1080x1920 portrait, or the 600x600 face). Positions are
+    normalized against that design size and projected onto the real
+    image; lengths, fonts and line widths follow the height ratio so the
+    aspect stays intact.
+    """
+
+    def __init__(self, width, height, base_width=BASE_WIDTH, base_height=BASE_HEIGHT):
+        self.width = width
+        self.height = height
+        self.base_width = base_width
+        self.base_height = base_height
+        self.scale = height / base_height
+
+    def at(self, u, v):
+        """Get pixel point from normalized (0..1) coordinates"""
+        return (int(round(u * self.width)), int(round(v * self.height)))
+
+    def x(self, x):
+        """Get pixel x for a design x"""
+        return int(round(x / self.base_width * self.width))
+
+    def y(self, y):
+        """Get pixel y for a design y"""
+        return int(round(y / self.base_height * self.height))
+
+    def pt(self, x, y):
+        """Get pixel point for a design point"""
+        return (self.x(x), self.y(y))
+
+    def size(self, length):
+        """Get pixel length for a design length (never below 1)"""
+        return max(1, int(round(length * self.scale)))
+
+    def axes(self, a, b):
+        """Get ellipse axes for design axes"""
+        return (self.size(a), self.size(b))
+
+    def font(self, font_scale):
+        """Get cv2.putText font scale"""
+        return font_scale * self.scale
+
+    def thickness(self, thickness):
+        """Get line thickness; filled shapes (-1) stay filled"""
+        if thickness < 0:
+            return thickness
+        return self.size(thickness)
+
+    def roi(self, x0, y0, x1, y1):
+        """Get pixel rectangle for a design rectangle"""
+        return (self.x(x0), self.y(y0), self.x(x1), self.y(y1))
+
+    def is_base(self):
+        """Check whether this is the design size itself"""
+        return self.width == self.base_width and self.height == self.base_height
+
+
+@functools.lru_cache(maxsize=16)
+def get_layout(width=BASE_WIDTH, height=BASE_HEIGHT):
+    """Get shared portrait layout for a frame size"""
+    return Layout(width, height)
+
+
+@functools.lru_cache(maxsize=16)
+def get_face_layout(size=BASE_FACE_SIZE):
+    """Get shared layout for a square face image"""
+    return Layout(size, size, BASE_FACE_SIZE, BASE_FACE_SIZE)
+
+
+def frame_layout(frame):
+    """Get portrait layout matching a frame's shape"""
+    height, width = frame.shape[:2]
+    return get_layout(width, height)
+
+
+def face_layout(face_img):
+    """Get face layout matching a face image's shape"""
+    return get_face_layout(face_img.shape[1])
+
+
+def quality_layout(quality=None):
+    """Get portrait layout for a streaming quality tier"""
+    return get_layout(*portrait_size(quality))
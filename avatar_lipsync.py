@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Avatar Lip Sync
+Mouth opening and visemes from TTS audio, analyzed in 10 ms frames
+"""
+
+import threading
+
+import numpy as np
+
+from avatar_visemes import VISEME_IDS, REST
+
+# Analysis frame length
+FRAME_MS = 10
+
+# Loudness mapped to mouth opening 0..1
+SILENCE_DB = -45.0
+LOUD_DB = -12.0
+
+# Formant band used for the spectral centroid
+BAND_HZ = (300.0, 4000.0)
+
+# Frames kept per utterance (60 s); older frames read back as silence
+RING_FRAMES = 6000
+
+# Vowel frames: centroid upper bounds, from rounded to spread mouth shapes
+VOICED_SHAPES = (
+    (560.0, VISEME_IDS['oo']),
+    (700.0, VISEME_IDS['oh']),
+    (900.0, VISEME_IDS['aa']),
+    (float('inf'), VISEME_IDS['ee'])
+)
+
+# Spectral flatness above which a frame is noise (s, f, h) or a voiced consonant
+NOISY_FLATNESS = 0.3
+CONSONANT_FLATNESS = 0.08
+
+
+def analyze_frames(frames, sample_rate):
+    """Get (mouth_open, viseme ids) for a (n, samples) block of int16 frames"""
+    frames = frames.astype(np.float32) * (1.0 / 32768.0)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    db = 20.0 * np.log10(rms + 1e-9)
+    mouth_open = np.clip((db - SILENCE_DB) / (LOUD_DB - SILENCE_DB), 0.0, 1.0)
+
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(frames.shape[1]).astype(np.float32), axis=1))
+    freqs = np.fft.rfftfreq(frames.shape[1], 1.0 / sample_rate)
+    band = (freqs >= BAND_HZ[0]) & (freqs <= BAND_HZ[1])
+    magnitude = spectrum[:, band]
+    centroid = (magnitude @ freqs[band]) / (magnitude.sum(axis=1) + 1e-9)
+    power = spectrum * spectrum + 1e-12
+    flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+
+    # Vowels pick a shape by formant centroid; consonants stay narrower
+    visemes = np.full(len(frames), VOICED_SHAPES[-1][1], dtype=np.int8)
+    for limit, viseme in reversed(VOICED_SHAPES[:-1]):
+        visemes[centroid < limit] = viseme
+    consonant = flatness >= CONSONANT_FLATNESS
+    visemes[consonant] = VISEME_IDS['consonant']
+    mouth_open[consonant] *= 0.7
+    noisy = flatness >= NOISY_FLATNESS
+    visemes[noisy] = VISEME_IDS['fv']
+    mouth_open[noisy] *= 0.6
+    visemes[mouth_open < 0.1] = REST
+    return mouth_open.astype(np.float32), visemes
+
+
+class LipSyncTrack:
+    """Ring buffer of per-frame mouth values for one utterance
+
+    feed() is called with PCM chunks as they are synthesized; the frames
+    are analyzed in blocks with vectorized NumPy. sample() looks up a
+    timestamp in O(1), so any number of streams can read the same track.
+    """
+
+    def __init__(self, sample_rate, capacity=RING_FRAMES):
+        self.sample_rate = sample_rate
+        self.hop = max(1, sample_rate * FRAME_MS // 1000)
+        self.capacity = capacity
+        self.mouth_open = np.zeros(capacity, dtype=np.float32)
+        self.visemes = np.full(capacity, REST, dtype=np.int8)
+        self.frames = 0
+        self.pending = np.zeros(0, dtype=np.int16)
+        self.previous = 0.0
+        self.lock = threading.Lock()
+
+    def feed(self, chunk):
+        """Analyze every complete frame in the audio received so far"""
+        pending = np.concatenate([self.pending, chunk]) if len(self.pending) else chunk
+        count = len(pending) // self.hop
+        self.pending = pending[count * self.hop:]
+        if not count:
+            return
+        mouth_open, visemes = analyze_frames(pending[:count * self.hop].reshape(count, self.hop), self.sample_rate)
+
+        # Two-frame average keeps the jaw from jittering at 100 Hz
+        smoothed = np.empty_like(mouth_open)
+        smoothed[0] = (mouth_open[0] + self.previous) * 0.5
+        smoothed[1:] = (mouth_open[1:] + mouth_open[:-1]) * 0.5
+        self.previous = float(mouth_open[-1])
+
+        with self.lock:
+            index = (self.frames + np.arange(count)) % self.capacity
+            self.mouth_open[index] = smoothed
+            self.visemes[index] = visemes
+            self.frames += count
+
+    @classmethod
+    def from_arrays(cls, sample_rate, mouth_open, visemes):
+        """Rebuild a finished track from saved frames"""
+        track = cls(sample_rate, capacity=max(RING_FRAMES, len(mouth_open)))
+        track.mouth_open[:len(mouth_open)] = mouth_open
+        track.visemes[:len(visemes)] = visemes
+        track.frames = len(mouth_open)
+        return track
+
+    def arrays(self):
+        """Get (mouth_open, visemes) of every frame, or None once the ring has wrapped"""
+        with self.lock:
+            if self.frames > self.capacity:
+                return None
+            return self.mouth_open[:self.frames].copy(), self.visemes[:self.frames].copy()
+
+    def sample(self, elapsed):
+        """Get (mouth_open, viseme id) at seconds into the audio, or None if not analyzed yet"""
+        frame = int(elapsed * 1000 // FRAME_MS)
+        if frame < 0:
+            return 0.0, REST
+        with self.lock:
+            if frame >= self.frames:
+                return None
+            if frame < self.frames - self.capacity:
+                return 0.0, REST
+            index = frame % self.capacity
+            return float(self.mouth_open[index]), int(self.visemes[index])
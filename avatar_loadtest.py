@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Avatar HTTP Load Test
+Simulate streams, polling viewers and chat traffic against a server, offline
+
+Streams are started through /api/stream/start and viewers poll /api/frame
+at a target fps while speak and event calls are interleaved. Requests go
+through Flask's test client, so the server runs in this process; CPU and
+RSS are reported for it and for every render worker.
+
+Usage: python avatar_loadtest.py interactive_avatar_server --streams 2 --viewers 5 [--sweep]
+"""
+
+import argparse
+import importlib
+import itertools
+import json
+import os
+import random
+import threading
+import time
+
+import numpy as np
+
+# Speak calls synthesize with the tone engine unless another is configured,
+# since 'auto' never falls back to it
+os.environ.setdefault('TTS_ENGINE', 'tone')
+
+# Importing the benchmark points asset loading at the local test photos
+from avatar_bench import SERVERS, percentiles
+from avatar_config import DEFAULT_FPS
+
+# get_frame latency one 30 fps frame allows
+FRAME_BUDGET_MS = 1000.0 / 30
+
+# get_frame serves the latest frame, so render loops falling behind show up
+# as dropped frames rather than latency; a level only passes below this rate
+MAX_DROPPED_RATE = 0.1
+
+DEFAULT_OUT = os.path.join('temp', 'bench', 'load.json')
+
+SPEAK_LINES = (
+    ("Terima kasih sudah join live hari ini!", 'greeting'),
+    ("Makasih banyak buat giftnya kak!", 'gift'),
+    ("Stoknya masih ada ya, langsung checkout aja!", 'chat'),
+    ("Ada yang mau tanya soal produknya?", 'chat')
+)
+EVENTS = (
+    {'event': 'toggle_avatar', 'data': {}},
+    {'event': 'comment', 'data': {'user': 'viewer', 'comment': 'harganya berapa kak?'}}
+)
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def process_usage(pid):
+    """Get (cpu seconds, rss MB) of a process from /proc, or None off Linux"""
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f"/proc/{pid}/status", 'r') as f:
+            rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+    except (OSError, StopIteration, IndexError, ValueError):
+        return None
+    # utime and stime are fields 14 and 15 of stat
+    cpu = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    return cpu, rss_kb / 1024.0
+
+
+def server_processes(module):
+    """Get {name: pid} of the server and its render workers"""
+    processes = {'server': os.getpid()}
+    for worker in module.render_pool.workers:
+        if worker.process is not None:
+            processes[f"render-{worker.index}"] = worker.process.pid
+    return processes
+
+
+class Recorder:
+    """Latency samples and counters shared by the load threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {'frame': [], 'speak': [], 'event': []}
+        self.errors = {'frame': 0, 'speak': 0, 'event': 0}
+        self.polls = 0
+        self.stale = 0
+        self.missed_ticks = 0
+        self.frame_ids = {}
+
+    def add(self, kind, seconds, ok=True):
+        with self.lock:
+            self.latency[kind].append(seconds)
+            if not ok:
+                self.errors[kind] += 1
+
+    def frame(self, stream_id, frame_id, stale, now):
+        """Record the frame a viewer got, for stale and dropped-frame rates"""
+        with self.lock:
+            self.polls += 1
+            if stale:
+                self.stale += 1
+            first, last = self.frame_ids.get(stream_id, ((now, frame_id), (now, frame_id)))
+            self.frame_ids[stream_id] = (min(first, (now, frame_id)), max(last, (now, frame_id)))
+
+    def dropped_rate(self, fps):
+        """Get the share of render ticks the streams' render loops missed"""
+        expected = rendered = 0.0
+        for (start, first_id), (end, last_id) in self.frame_ids.values():
+            expected += (end - start) * fps
+            rendered += last_id - first_id
+        if expected <= 0:
+            return 0.0
+        return max(0.0, 1.0 - rendered / expected)
+
+
+def viewer(app, stream_id, fps, deadline, recorder, stop):
+    """Poll a stream's latest frame at fps until the deadline"""
+    client = app.test_client()
+    interval = 1.0 / fps
+    next_tick = time.perf_counter() + random.random() * interval
+    last_id = None
+    while not stop.is_set() and time.perf_counter() < deadline:
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        elif -delay > interval:
+            # Too slow to poll on time: count the skipped ticks as missed
+            skipped = int(-delay / interval)
+            with recorder.lock:
+                recorder.missed_ticks += skipped
+            next_tick += skipped * interval
+        next_tick += interval
+
+        start = time.perf_counter()
+        response = client.get(f"/api/frame/{stream_id}?gesture=50")
+        recorder.add('frame', time.perf_counter() - start, response.status_code == 200)
+        frame_id = response.headers.get('X-Frame-Id')
+        if frame_id is not None:
+            frame_id = int(frame_id)
+            recorder.frame(stream_id, frame_id, frame_id == last_id, time.perf_counter())
+            last_id = frame_id
+
+
+def chatter(app, avatar_type, speak_every, event_every, deadline, recorder, stop):
+    """Interleave speak and event calls like a live chat"""
+    client = app.test_client()
+    lines = itertools.cycle(SPEAK_LINES)
+    events = itertools.cycle(EVENTS)
+    now = time.perf_counter()
+    # A disabled activity (0) is never due
+    next_speak = now + speak_every if speak_every else float('inf')
+    next_event = now + event_every if event_every else float('inf')
+    while not stop.is_set() and time.perf_counter() < deadline:
+        stop.wait(max(0.0, min(next_speak, next_event, deadline) - time.perf_counter()))
+        now = time.perf_counter()
+        if now >= next_speak:
+            text, priority = next(lines)
+            response = client.post('/api/avatar/speak', json={'text': text, 'avatar': avatar_type,
+                                                              'priority': priority})
+            recorder.add('speak', time.perf_counter() - now, response.status_code == 200)
+            next_speak += speak_every
+        if now >= next_event:
+            response = client.post('/api/event', json=next(events))
+            recorder.add('event', time.perf_counter() - now, response.status_code == 200)
+            next_event += event_every
+
+
+def run_level(module, streams, viewers, fps, duration, speak_every, event_every, quality=None):
+    """Run K streams with M viewers each for duration seconds; returns a report dict"""
+    avatar_type = SERVERS[module.__name__][1]
+    client = module.app.test_client()
+    stream_ids = [f"load-{index}" for index in range(streams)]
+    for stream_id in stream_ids:
+        settings = {'avatar': avatar_type}
+        if quality:
+            settings['quality'] = quality
+        client.post('/api/stream/start', json={'socketId': stream_id, 'settings': settings})
+        # First frame starts the render loop before measuring
+        client.get(f"/api/frame/{stream_id}")
+
+    recorder = Recorder()
+    stop = threading.Event()
+    processes = server_processes(module)
+    usage_before = {name: process_usage(pid) for name, pid in processes.items()}
+    started = time.perf_counter()
+    deadline = started + duration
+
+    threads = [threading.Thread(target=viewer, args=(module.app, stream_id, fps, deadline, recorder, stop),
+                                daemon=True)
+               for stream_id in stream_ids for _ in range(viewers)]
+    threads.append(threading.Thread(target=chatter, args=(module.app, avatar_type, speak_every, event_every,
+                                                          deadline, recorder, stop), daemon=True))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(duration + 30)
+    stop.set()
+    elapsed = time.perf_counter() - started
+
+    usage = {}
+    for name, pid in processes.items():
+        before, after = usage_before[name], process_usage(pid)
+        if before is None or after is None:
+            continue
+        usage[name] = {'cpu_percent': round((after[0] - before[0]) / elapsed * 100, 1),
+                       'rss_mb': round(after[1], 1)}
+
+    for stream_id in stream_ids:
+        client.post('/api/stream/stop', json={'socketId': stream_id})
+        module.frame_hub.stop(stream_id)
+
+    frames = recorder.latency['frame']
+    ticks = recorder.polls + recorder.missed_ticks
+    report = {
+        'streams': streams,
+        'viewers_per_stream': viewers,
+        'fps': fps,
+        'duration': round(elapsed, 2),
+        'throughput_fps': round(len(frames) / elapsed, 1),
+        'latency_ms': {kind: percentiles(samples) for kind, samples in recorder.latency.items() if samples},
+        'errors': recorder.errors,
+        'stale_rate': round(recorder.stale / max(recorder.polls, 1), 3),
+        'missed_poll_rate': round(recorder.missed_ticks / max(ticks, 1), 3),
+        'dropped_frame_rate': round(recorder.dropped_rate(module.frame_hub.fps), 3),
+        'processes': usage
+    }
+    if frames:
+        report['over_budget_rate'] = round(float(np.mean(np.asarray(frames) * 1000 > FRAME_BUDGET_MS)), 3)
+    return report
+
+
+def print_level(report):
+    frame = report.get('latency_ms', {}).get('frame', {})
+    cpu = ', '.join(f"{name} {usage['cpu_percent']}% {usage['rss_mb']} MB"
+                    for name, usage in report['processes'].items())
+    print(f"⏱️ {report['streams']} streams x {report['viewers_per_stream']} viewers: "
+          f"{report['throughput_fps']} frames/s, p50 {frame.get('p50', 0):.1f} ms, "
+          f"p95 {frame.get('p95', 0):.1f} ms, p99 {frame.get('p99', 0):.1f} ms, "
+          f"dropped {report['dropped_frame_rate']:.1%} | {cpu}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test an avatar server over its HTTP API')
+    parser.add_argument('server', choices=list(SERVERS))
+    parser.add_argument('--streams', type=int, default=1, help='concurrent streams (K)')
+    parser.add_argument('--viewers', type=int, default=3, help='polling viewers per stream (M)')
+    parser.add_argument('--fps', type=float, default=DEFAULT_FPS, help='viewer poll rate')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per load level')
+    parser.add_argument('--speak-every', type=float, default=2.0, help='seconds between speak calls (0 = off)')
+    parser.add_argument('--event-every', type=float, default=3.0, help='seconds between events (0 = off)')
+    parser.add_argument('--quality', help='stream quality tier, e.g. 720p')
+    parser.add_argument('--workers', type=int, help='render worker processes (default: RENDER_WORKERS)')
+    parser.add_argument('--sweep', action='store_true',
+                        help='double streams until a level goes over the latency or dropped-frame budget')
+    parser.add_argument('--max-streams', type=int, default=64)
+    parser.add_argument('--budget-ms', type=float, default=FRAME_BUDGET_MS)
+    parser.add_argument('--max-dropped', type=float, default=MAX_DROPPED_RATE)
+    parser.add_argument('--out', default=DEFAULT_OUT, help='results JSON')
+    args = parser.parse_args()
+
+    module = importlib.import_module(args.server)
+    if args.workers is not None:
+        module.render_pool.worker_count = max(0, args.workers)
+    module.render_pool.start()
+
+    results = {'server': args.server, 'budget_ms': args.budget_ms, 'max_dropped': args.max_dropped, 'levels': []}
+    streams = args.streams
+    capacity = None
+    try:
+        while True:
+            report = run_level(module, streams, args.viewers, args.fps, args.duration,
+                               args.speak_every, args.event_every, args.quality)
+            results['levels'].append(report)
+            print_level(report)
+            p95 = report.get('latency_ms', {}).get('frame', {}).get('p95', float('inf'))
+            within = p95 <= args.budget_ms and report['dropped_frame_rate'] <= args.max_dropped
+            if within:
+                capacity = {'streams': streams, 'viewers': streams * args.viewers}
+            if not args.sweep or not within or streams * 2 > args.max_streams:
+                break
+            streams *= 2
+    finally:
+        module.render_pool.stop()
+
+    results['capacity'] = capacity
+    if capacity:
+        print(f"✅ Within {args.budget_ms:.0f} ms p95 and {args.max_dropped:.0%} dropped frames up to "
+              f"{capacity['streams']} streams / {capacity['viewers']} viewers")
+    else:
+        print(f"⚠️ Over {args.budget_ms:.0f} ms p95 or {args.max_dropped:.0%} dropped frames at the first load level")
+
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Avatar Render Metrics
+Per-stage render histograms and per-stream counters in Prometheus text format
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Disable with AVATAR_METRICS=false; timers then become no-ops
+METRICS_ENABLED = os.getenv('AVATAR_METRICS', 'true').lower() == 'true'
+
+# Histogram bucket upper bounds
+TIME_BUCKETS_MS = (0.5, 1, 2, 5, 10, 15, 20, 25, 33, 50, 75, 100, 250)
+SIZE_BUCKETS = (16384, 32768, 65536, 131072, 262144, 524288, 1048576)
+
+# Weight of the newest frame interval in a stream's fps average
+FPS_SMOOTHING = 0.1
+
+PREFIX = 'avatar'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{key}="{escape_label(value)}"' for key, value in labels.items())
+    return '{' + pairs + '}'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Cumulative-bucket histogram like a Prometheus client's"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def lines(self, name, labels=None):
+        """Get exposition lines for this histogram"""
+        labels = labels or {}
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{format_labels(dict(labels, le=bound))} {cumulative}")
+        lines.append(f"{name}_bucket{format_labels(dict(labels, le='+Inf'))} {count}")
+        lines.append(f"{name}_sum{format_labels(labels)} {round(total, 3)}")
+        lines.append(f"{name}_count{format_labels(labels)} {count}")
+        return lines
+
+
+class StageTimer:
+    """Time consecutive render stages: each lap() records time since the previous one"""
+
+    __slots__ = ('registry', 'last')
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.registry.observe_stage(stage, (now - self.last) * 1000.0)
+        self.last = now
+
+
+class NullTimer:
+    """Timer used while metrics are disabled"""
+
+    __slots__ = ()
+
+    def lap(self, stage):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class StreamStats:
+    """Frame counters for one stream's render loop"""
+
+    def __init__(self):
+        self.frames = 0
+        self.fps = 0.0
+        self.last_frame = None
+        self.last_bytes = 0
+        self.frame_ms = Histogram(TIME_BUCKETS_MS)
+        self.encode_bytes = Histogram(SIZE_BUCKETS)
+
+    def frame(self, render_ms, nbytes, now):
+        if self.last_frame is not None and now > self.last_frame:
+            fps = 1.0 / (now - self.last_frame)
+            self.fps = fps if self.frames <= 1 else self.fps + (fps - self.fps) * FPS_SMOOTHING
+        self.last_frame = now
+        self.frames += 1
+        self.frame_ms.observe(render_ms)
+        if nbytes:
+            self.last_bytes = nbytes
+            self.encode_bytes.observe(nbytes)
+
+
+class MetricsRegistry:
+    """Render stage histograms, per-stream stats and gauges from collectors
+
+    Collectors are functions returning (name, help, samples) tuples, where
+    samples is a list of (labels, value); they are called on each scrape,
+    so queue depths and cache counters cost nothing between scrapes.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.stages = {}
+        self.streams = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def timer(self):
+        """Get a stage timer starting now"""
+        return StageTimer(self) if self.enabled else NULL_TIMER
+
+    def observe_stage(self, stage, ms):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            with self.lock:
+                histogram = self.stages.setdefault(stage, Histogram(TIME_BUCKETS_MS))
+        histogram.observe(ms)
+
+    def stream_frame(self, stream_id, render_ms, nbytes=0):
+        """Record one frame rendered by a stream's render loop"""
+        if not self.enabled:
+            return
+        stats = self.streams.get(stream_id)
+        if stats is None:
+            with self.lock:
+                stats = self.streams.setdefault(stream_id, StreamStats())
+        stats.frame(render_ms, nbytes, time.time())
+
+    def drop_stream(self, stream_id):
+        with self.lock:
+            self.streams.pop(stream_id, None)
+
+    def add_collector(self, collect_fn):
+        self.collectors.append(collect_fn)
+
+    def render(self):
+        """Get all metrics in Prometheus text exposition format"""
+        lines = []
+
+        name = f"{PREFIX}_render_stage_ms"
+        lines += [f"# HELP {name} Time spent in each render stage", f"# TYPE {name} histogram"]
+        for stage, histogram in sorted(self.stages.items()):
+            lines += histogram.lines(name, {'stage': stage})
+
+        streams = sorted(self.streams.items())
+        for metric, kind, text, value_fn in (
+            ('stream_frames_total', 'counter', 'Frames rendered by a stream', lambda s: s.frames),
+            ('stream_fps', 'gauge', 'Recent render rate of a stream', lambda s: round(s.fps, 2)),
+            ('stream_encode_last_bytes', 'gauge', 'Size of the latest encoded frame', lambda s: s.last_bytes)
+        ):
+            name = f"{PREFIX}_{metric}"
+            lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{format_labels({'stream': stream_id})} {value_fn(stats)}"
+                      for stream_id, stats in streams]
+
+        for metric, text, attribute in (
+            ('stream_frame_ms', 'Render plus encode time per frame', 'frame_ms'),
+            ('stream_encode_bytes', 'Encoded frame size', 'encode_bytes')
+        ):
+            name = f"{PREFIX}_{metric}"
+            lines += [f"# HELP {name} {text}", f"# TYPE {name} histogram"]
+            for stream_id, stats in streams:
+                lines += getattr(stats, attribute).lines(name, {'stream': stream_id})
+
+        for collect_fn in self.collectors:
+            try:
+                gauges = collect_fn()
+            except Exception as e:
+                print(f"⚠️ Metrics collector failed: {e}")
+                continue
+            for metric, text, samples in gauges:
+                name = f"{PREFIX}_{metric}"
+                lines += [f"# HELP {name} {text}", f"# TYPE {name} gauge"]
+                lines += [f"{name}{format_labels(labels)} {value}" for labels, value in samples]
+
+        return '\n'.join(lines) + '\n'
+
+
+def cache_gauges(caches):
+    """Get hit-rate and size gauges for named caches with LRUCache-style stats()"""
+    stats = {name: cache.stats() for name, cache in caches.items()}
+    return [
+        ('cache_hit_rate', 'Cache hit rate since start',
+         [({'cache': name}, round(s['hit_rate'], 4)) for name, s in stats.items()]),
+        ('cache_entries', 'Entries held by a cache',
+         [({'cache': name}, s['entries']) for name, s in stats.items()])
+    ]
+
+
+def stream_gauges(streams, frame_hub, tts_service):
+    """Get queue depth gauges for a server's streams and shared services"""
+    speech = []
+    subscribers = []
+    for stream_id, stream in list(streams.items()):
+        scheduler = stream['avatar'].speech
+        speech.append(({'stream': stream_id}, len(scheduler.pending) + scheduler.queue.qsize()))
+        subscribers.append(({'stream': stream_id}, frame_hub.subscriber_count(stream_id)))
+    levels = [({'stream': stream_id}, producer.governor.level)
+              for stream_id, producer in list(frame_hub.producers.items())]
+    return [
+        ('active_streams', 'Streams started on this server', [({}, len(streams))]),
+        ('render_loops', 'Running render loops', [({}, len(frame_hub.producers))]),
+        ('speech_queue_depth', 'Utterances waiting to be spoken', speech),
+        ('stream_subscribers', 'Socket.IO clients receiving pushed frames', subscribers),
+        ('stream_quality_level', 'Frame governor degradation level (0 = full quality)', levels),
+        ('tts_queue_depth', 'Utterances waiting for synthesis', [({}, len(tts_service.jobs))])
+    ] + cache_gauges({'encoded_frames': frame_hub.frame_cache, 'tts': tts_service.cache.memory})
+
+
+# Shared registry for the process
+metrics = MetricsRegistry()
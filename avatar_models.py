@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Avatar Model Registry
+Heavy per-avatar-type assets loaded once and shared read-only by every stream
+"""
+
+import threading
+
+import numpy as np
+
+
+class AvatarModel:
+    """Immutable assets of one avatar type
+
+    Holds the face pixels, their pre-scaled pyramid and any extra
+    resources (detectors, landmarks, layers). Arrays are made read-only
+    so a stream can never draw on another stream's face.
+    """
+
+    def __init__(self, avatar_type, face_image=None, face_pyramid=None, **resources):
+        self.avatar_type = avatar_type
+        self.face_image = face_image
+        self.face_pyramid = face_pyramid
+        self.resources = resources
+        self.lock = threading.Lock()
+        if isinstance(face_image, np.ndarray):
+            face_image.flags.writeable = False
+
+    def get(self, name, default=None):
+        """Get an extra shared resource"""
+        return self.resources.get(name, default)
+
+    def resource(self, name, build_fn):
+        """Get an extra shared resource, building it with build_fn() on first use"""
+        with self.lock:
+            if name not in self.resources:
+                self.resources[name] = build_fn()
+            return self.resources[name]
+
+    def nbytes(self):
+        """Get approximate memory held by the model's arrays"""
+        total = 0
+        if self.face_image is not None:
+            total += self.face_image.nbytes
+        if self.face_pyramid is not None:
+            total += sum(level.nbytes for level in self.face_pyramid.levels.values())
+        return total
+
+
+class ModelRegistry:
+    """Load each avatar model once; later lookups share the same instance"""
+
+    def __init__(self):
+        self.models = {}
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.loads = 0
+        self.hits = 0
+
+    def get(self, avatar_type, load_fn):
+        """Get shared model for an avatar type, calling load_fn() the first time"""
+        model = self.models.get(avatar_type)
+        if model is not None:
+            self.hits += 1
+            return model
+
+        with self.lock:
+            key_lock = self.key_locks.setdefault(avatar_type, threading.Lock())
+        # Concurrent first requests for one type wait for a single load
+        with key_lock:
+            model = self.models.get(avatar_type)
+            if model is None:
+                model = load_fn()
+                self.models[avatar_type] = model
+                self.loads += 1
+            else:
+                self.hits += 1
+        return model
+
+    def invalidate(self, avatar_type=None):
+        """Drop one model (or all) so the next lookup reloads it"""
+        with self.lock:
+            if avatar_type is None:
+                self.models.clear()
+            else:
+                self.models.pop(avatar_type, None)
+
+    def stats(self):
+        """Get loaded models and reuse counters"""
+        return {
+            'models': sorted(self.models),
+            'loads': self.loads,
+            'hits': self.hits,
+            'bytes': sum(model.nbytes() for model in self.models.values())
+        }
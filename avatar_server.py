@@ -4,9 +4,12 @@ TikTok Live AI Avatar Backend Server
 Handles AI avatar processing, speech synthesis, and video generation
 """
 
-from flask import Flask, request, jsonify
+# Startup timing starts before the heavy imports below
+from avatar_startup import startup
+
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, join_room, leave_room
 import cv2
 import numpy as np
 from PIL import Image
@@ -15,12 +18,30 @@ import json
 import time
 from dotenv import load_dotenv
 
+from avatar_delta import DeltaCanvas
+from avatar_encoder import select_encoder, encoder_report
+from avatar_config import step_down_quality
+from avatar_layout import quality_layout
+from avatar_sprites import sprite_cache, render_layer
+from avatar_transform import AffineTransform, DEFAULT_QUALITY
+from avatar_speech import SpeechScheduler, DEFAULT_PRIORITY
+from avatar_tts import tts_service, select_tts_engine, get_tts_engine, wav_header
+from avatar_catalog import catalogs, ensure_pack, pack_path
+from avatar_metrics import metrics, stream_gauges
+from avatar_governor import apply_render_hints
+from avatar_streaming import FrameHub, frame_room, encode_jpeg, MJPEG_MIMETYPE, DEFAULT_PARAMS
+from avatar_workers import RenderPool
+
+startup.mark('imports')
+
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Real threads: render loops, render-pool pipes and TTS waits block, which
+# would stall every greenlet if eventlet (in requirements.txt) were picked
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 
 # Configuration
 PORT = int(os.getenv('PYTHON_PORT', 5000))
@@ -31,16 +52,32 @@ TEMP_DIR = 'temp'
 os.makedirs(AVATAR_DIR, exist_ok=True)
 os.makedirs(TEMP_DIR, exist_ok=True)
 
+# Synthesized speech is cached on disk under TEMP_DIR
+tts_service.cache.set_root(os.path.join(TEMP_DIR, 'tts'))
+
 # Store active sessions
 active_sessions = {}
 
 class AIAvatar:
     """AI Avatar processor class"""
     
+    # Head and hair bounds (x0, y0, x1, y1) in the 1080x1920 portrait
+    HEAD_ROI = (220, 560, 860, 1290)
+    # Head moves around the base of the region so its edge stays aligned with the body
+    HEAD_PIVOT = (540, 1290)
+    
     def __init__(self, avatar_type='default'):
         self.avatar_type = avatar_type
         self.current_frame = None
         self.is_speaking = False
+        self.mouth_open = 0.0
+        # Utterances play one at a time; is_speaking and mouth_open follow them each frame
+        self.speech = SpeechScheduler()
+        self.warp_quality = DEFAULT_QUALITY
+        # Gradient animation rate, lowered by the frame governor (None = every frame)
+        self.background_fps = None
+        # Reused frame buffers; only the head and changed overlays are redrawn
+        self.canvas = DeltaCanvas()
         
     def load_avatar(self, avatar_path=None):
         """Load avatar model or image"""
@@ -52,21 +89,49 @@ class AIAvatar:
         
         return True
     
-    def create_default_avatar(self):
-        """Create a default avatar with better design - Portrait mode for TikTok"""
-        # TikTok portrait mode: 1080x1920 (9:16 ratio)
-        img = np.zeros((1920, 1080, 3), dtype=np.uint8)
+    def create_default_avatar(self, transform=None, quality=None, canvas=None):
+        """Create a default avatar with better design - Portrait mode for TikTok
+
+        Draws into the next buffer of canvas when given and returns its
+        DeltaFrame; otherwise returns a new image.
+        """
+        # TikTok portrait mode: 9:16 ratio, 1080x1920 unless a quality tier is requested
+        layout = quality_layout(quality)
         
         # Create professional gradient background (portrait)
-        time_factor = int(time.time() * 20) % 360
-        for i in range(1920):
-            # Soft gradient from dark to light
-            color_r = int(40 + abs(np.sin((i + time_factor) / 200)) * 60)
-            color_g = int(50 + abs(np.sin((i + time_factor + 120) / 200)) * 70)
-            color_b = int(80 + abs(np.sin((i + time_factor + 240) / 200)) * 80)
-            img[i, :] = [color_b, color_g, color_r]
-        
-        # Create realistic human avatar (portrait style)
+        timer = metrics.timer()
+        delta = (canvas or DeltaCanvas(enabled=False)).begin(layout.width, layout.height,
+                                                              time.time(), self.background_fps)
+        img = delta.buffer
+        timer.lap('background')
+        
+        # Static character is rendered once per avatar type and size and reused;
+        # head animation warps only the head region of that layer
+        layer = sprite_cache.get(self.avatar_type, layout.width, layout.height,
+                                 lambda: self.render_character_layer(layout))
+        head_roi = layout.roi(*self.HEAD_ROI)
+        if layer.bbox is None or delta.dirty('character', layer.bbox, self.avatar_type):
+            layer.composite(img, transform, head_roi, self.warp_quality)
+        else:
+            # Body is already in the buffer; only the head moves
+            delta.restore(head_roi)
+            layer.composite_region(img, head_roi, transform, self.warp_quality)
+        timer.lap('face_warp')
+        
+        return delta if canvas is not None else img
+    
+    def render_character_layer(self, layout=None):
+        """Render static character and labels into a sprite layer"""
+        layer = sprite_cache.get(self.avatar_type, 1080, 1920,
+                                 lambda: render_layer(self.draw_character, 1080, 1920,
+                                                      blur=5, overlay_fn=self.draw_labels))
+        if layout is None or layout.is_base():
+            return layer
+        # Smaller tiers reuse the full-size drawing, resampled once
+        return layer.resized(layout.width, layout.height)
+    
+    def draw_character(self, img):
+        """Draw realistic human avatar (portrait style)"""
         center_x = 540  # Center for portrait
         center_y = 960  # Center vertically
         
@@ -189,9 +254,10 @@ class AIAvatar:
         
         # Chin shadow
         cv2.ellipse(img, (center_x, center_y + 220), (70, 40), 0, 0, 180, (200, 170, 150), -1)
-        
-        # Apply subtle blur for smooth skin
-        img = cv2.GaussianBlur(img, (5, 5), 0)
+    
+    def draw_labels(self, img):
+        """Draw avatar name labels"""
+        center_x = 540
         
         # === TEXT LABELS ===
         avatar_name = "Female Avatar" if self.avatar_type in ['default', 'female'] else "Male Avatar"
@@ -199,115 +265,110 @@ class AIAvatar:
                    cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
         cv2.putText(img, "Live Shopping AI", (center_x - 140, 1850), 
                    cv2.FONT_HERSHEY_SIMPLEX, 1, (200, 200, 200), 2)
-        
-        return img
     
-    def apply_gesture(self, intensity=50):
+    def apply_gesture(self, intensity=50, quality=None):
         """Apply gesture animation to avatar - Portrait mode"""
         if self.avatar_image is None:
             self.avatar_image = self.create_default_avatar()
         
-        # Recreate avatar with animation (for dynamic background)
-        frame = self.create_default_avatar()
-        
         # Apply various animations based on intensity
         t = time.time()
         intensity_factor = intensity / 100.0
         
+        # Positions below are in the 1080x1920 design space, mapped to the requested tier
+        layout = quality_layout(quality)
+        
         # Portrait center
         center_x = 540
         center_y = 960
         
+        # Head tilt and breathing share one warp over the head region only
+        transform = AffineTransform()
+        pivot = layout.pt(*self.HEAD_PIVOT)
+        
         # Slight head tilt/rotation
         if intensity > 20:
             angle = np.sin(t * 1.5) * (intensity_factor * 2)
-            M = cv2.getRotationMatrix2D((center_x, center_y), angle, 1.0)
-            frame = cv2.warpAffine(frame, M, (frame.shape[1], frame.shape[0]))
-        
-        # Speaking animation - mouth movement
-        if self.is_speaking and intensity > 30:
-            mouth_open = abs(np.sin(t * 8)) * intensity_factor
-            if mouth_open > 0.5:
-                # Draw open mouth when speaking
-                mouth_y = center_y + 150
-                cv2.ellipse(frame, (center_x, mouth_y + 5), 
-                          (50, int(20 + mouth_open * 20)), 
-                          0, 0, 180, (100, 50, 50), -1)
+            transform.rotate(pivot, angle)
         
         # Breathing effect - subtle scale
         if intensity > 10:
             scale = 1.0 + np.sin(t * 0.8) * 0.008 * intensity_factor
-            h, w = frame.shape[:2]
-            M = cv2.getRotationMatrix2D((w/2, h/2), 0, scale)
-            frame = cv2.warpAffine(frame, M, (w, h))
+            transform.scale(pivot, scale)
+        
+        # Recreate avatar with animation (for dynamic background)
+        delta = self.create_default_avatar(transform, quality, self.canvas)
+        frame = delta.buffer
+        timer = metrics.timer()
+        
+        # Speaking animation - mouth follows the speech audio and the head transform
+        if self.is_speaking:
+            mouth_open = self.mouth_open
+            if mouth_open > 0.15:
+                # Draw open mouth when speaking
+                mouth_x, mouth_y = transform.apply(layout.pt(center_x, center_y + 155))
+                cv2.ellipse(frame, (int(mouth_x), int(mouth_y)), 
+                          layout.axes(50, 10 + mouth_open * 30), 
+                          0, 0, 180, (100, 50, 50), -1)
         
         # Blinking animation (occasional)
         if int(t * 3) % 10 == 0 and (t % 1) < 0.15:
             # Draw closed eyes
             eye_y = center_y + 20
-            cv2.line(frame, (center_x - 110, eye_y), (center_x - 30, eye_y), (180, 150, 130), 4)
-            cv2.line(frame, (center_x + 30, eye_y), (center_x + 110, eye_y), (180, 150, 130), 4)
+            cv2.line(frame, layout.pt(center_x - 110, eye_y), layout.pt(center_x - 30, eye_y),
+                     (180, 150, 130), layout.thickness(4))
+            cv2.line(frame, layout.pt(center_x + 30, eye_y), layout.pt(center_x + 110, eye_y),
+                     (180, 150, 130), layout.thickness(4))
         
         # === UI OVERLAYS ===
-        # Top status bar
-        cv2.rectangle(frame, (0, 0), (1080, 80), (0, 0, 0), -1)
-        cv2.rectangle(frame, (0, 0), (1080, 80), (37, 244, 238), 2)
-        
-        # FPS and status
-        fps_text = f"AI AVATAR | Gesture: {intensity}%"
-        cv2.putText(frame, fps_text, (30, 50), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (37, 244, 238), 2)
-        
-        # Speaking indicator
-        if self.is_speaking:
-            cv2.circle(frame, (1020, 40), 20, (0, 255, 0), -1)
-            cv2.putText(frame, "LIVE", (950, 50), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-        else:
-            cv2.circle(frame, (1020, 40), 20, (100, 100, 100), -1)
-        
-        # Bottom watermark
-        cv2.putText(frame, "TikTok Live Shopping", (30, 1890), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        # Top status bar, redrawn when its text changes (the filled bar covers the old one)
+        if delta.dirty('status', layout.roi(0, 0, 1080, 82), (intensity, self.is_speaking), restore=False):
+            cv2.rectangle(frame, (0, 0), layout.pt(1080, 80), (0, 0, 0), -1)
+            cv2.rectangle(frame, (0, 0), layout.pt(1080, 80), (37, 244, 238), layout.thickness(2))
+            
+            # FPS and status
+            fps_text = f"AI AVATAR | Gesture: {intensity}%"
+            cv2.putText(frame, fps_text, layout.pt(30, 50), 
+                       cv2.FONT_HERSHEY_SIMPLEX, layout.font(0.8), (37, 244, 238), layout.thickness(2))
+            
+            # Speaking indicator
+            if self.is_speaking:
+                cv2.circle(frame, layout.pt(1020, 40), layout.size(20), (0, 255, 0), -1)
+                cv2.putText(frame, "LIVE", layout.pt(950, 50), 
+                           cv2.FONT_HERSHEY_SIMPLEX, layout.font(0.7), (0, 255, 0), layout.thickness(2))
+            else:
+                cv2.circle(frame, layout.pt(1020, 40), layout.size(20), (100, 100, 100), -1)
+        
+        # Bottom watermark, over the body layer so it is only drawn on top again
+        if delta.dirty('watermark', layout.roi(0, 1865, 1080, 1905), None, restore=False):
+            cv2.putText(frame, "TikTok Live Shopping", layout.pt(30, 1890), 
+                       cv2.FONT_HERSHEY_SIMPLEX, layout.font(0.7), (255, 255, 255), layout.thickness(2))
+        timer.lap('overlays')
         
         return frame
     
-    def speak(self, text, voice_type='female-1', speed=1.0, pitch=0):
+    def speak(self, text, voice_type='female-1', speed=1.0, pitch=0, priority=DEFAULT_PRIORITY):
         """Generate speech and lip-sync animation"""
-        self.is_speaking = True
-        
-        # In production, integrate with TTS (Text-to-Speech) API
-        # For now, simulate speaking duration
-        duration = len(text) / 10 * speed  # rough estimate
+        utterance = self.speech.say(text, voice_type, speed, pitch, priority)
+        # Audio streams from the local TTS engine while the utterance plays
+        audio = tts_service.submit(utterance)
         
         print(f"🗣️ Avatar speaking: {text}")
         print(f"   Voice: {voice_type}, Speed: {speed}x, Pitch: {pitch}")
         
-        # TODO: Integrate with real TTS service like:
-        # - Google Cloud Text-to-Speech
-        # - Amazon Polly
-        # - Microsoft Azure Speech
-        # - ElevenLabs (for realistic voices)
-        # - Coqui TTS (Open source)
-        
-        # Auto-stop speaking after duration
-        import threading
-        def stop_speaking():
-            time.sleep(duration)
-            self.is_speaking = False
-        
-        threading.Thread(target=stop_speaking, daemon=True).start()
-        
         return {
             'success': True,
-            'duration': duration,
+            'id': utterance.id,
+            'duration': utterance.duration,
+            'starts_in': self.speech.starts_in(utterance.id),
+            'audio_url': f"/api/avatar/audio/{utterance.id}" if audio is not None else None,
             'text': text,
             'voice': voice_type
         }
     
-    def process_frame(self, gesture_intensity=50):
-        """Process and return current avatar frame"""
-        return self.apply_gesture(gesture_intensity)
+    def process_frame(self, gesture_intensity=50, quality=None):
+        """Process and return current avatar frame at a streaming quality tier"""
+        return self.apply_gesture(gesture_intensity, quality)
 
 
 class StreamManager:
@@ -315,8 +376,8 @@ class StreamManager:
     
     def __init__(self):
         self.streams = {}
-        self.global_avatar = AIAvatar('default')
-        self.global_avatar.load_avatar()
+        # Built on first use so the server can bind before loading assets
+        self.global_avatar = None
     
     def create_stream(self, socket_id, settings):
         """Create a new stream session"""
@@ -345,11 +406,20 @@ class StreamManager:
         return False
     
     def get_avatar(self):
-        """Get global avatar for preview"""
+        """Get global avatar for preview, building it on first use"""
+        if self.global_avatar is None:
+            avatar = AIAvatar('default')
+            avatar.load_avatar()
+            self.global_avatar = avatar
         return self.global_avatar
     
     def change_avatar(self, avatar_type):
         """Change global avatar"""
+        # Force the sprite layers of the old and new avatar to be re-rendered
+        previous = self.global_avatar.avatar_type if self.global_avatar else None
+        if previous is not None and previous != avatar_type:
+            sprite_cache.invalidate(previous)
+        sprite_cache.invalidate(avatar_type)
         self.global_avatar = AIAvatar(avatar_type)
         self.global_avatar.load_avatar()
         return True
@@ -359,6 +429,102 @@ class StreamManager:
 stream_manager = StreamManager()
 
 
+def resolve_avatar(socket_id):
+    """Get avatar for a stream, or the global avatar for preview"""
+    if socket_id == 'avatar_stream':
+        return stream_manager.get_avatar()
+    stream = stream_manager.get_stream(socket_id)
+    if not stream:
+        return None
+    return stream['avatar']
+
+
+def parse_frame_params(source):
+    """Get animation inputs from query args or a Socket.IO payload"""
+    params = {}
+    if source.get('gesture') is not None:
+        params['gesture_intensity'] = int(source.get('gesture'))
+    if source.get('res'):
+        params['resolution'] = source.get('res')
+    return params
+
+
+def stream_quality(socket_id, params):
+    """Get resolution tier for a frame: explicit request, then stream settings"""
+    if params.get('resolution'):
+        return params['resolution']
+    stream = stream_manager.get_stream(socket_id)
+    if stream:
+        return stream['settings'].get('quality')
+    return None
+
+
+def create_worker_avatar(avatar_type):
+    """Build an avatar inside a render worker process"""
+    avatar = AIAvatar(avatar_type)
+    avatar.load_avatar()
+    # Frames are copied into a shared slot before the next render, so one buffer will do
+    avatar.canvas = DeltaCanvas(buffers=1)
+    return avatar
+
+
+def render_worker_frame(avatar, params):
+    """Render one frame inside a render worker process"""
+    apply_render_hints(avatar, params)
+    avatar.is_speaking = params.get('is_speaking', False)
+    avatar.mouth_open = params.get('mouth_open', 0.0)
+    return avatar.process_frame(params['gesture_intensity'], quality=params.get('quality'))
+
+
+# Render worker processes, enabled with RENDER_WORKERS > 0
+render_pool = RenderPool(create_worker_avatar, render_worker_frame)
+
+
+def render_stream_frame(socket_id, params):
+    """Render one frame for a stream's render loop"""
+    avatar = resolve_avatar(socket_id)
+    if avatar is None:
+        render_pool.close(socket_id)
+        return None
+    # The frame governor can cap the stream's resolution tier
+    quality = step_down_quality(stream_quality(socket_id, params), params.get('resolution_step', 0))
+    # Speaking state and mouth come from the speech scheduler
+    avatar.is_speaking = avatar.speech.is_speaking()
+    avatar.mouth_open = avatar.speech.mouth()[0]
+    if render_pool.enabled:
+        frame = render_pool.render(socket_id, avatar.avatar_type,
+                                   dict(params, quality=quality, is_speaking=avatar.is_speaking,
+                                        mouth_open=avatar.mouth_open))
+    else:
+        apply_render_hints(avatar, params)
+        frame = avatar.process_frame(params['gesture_intensity'], quality=quality)
+    # Product card straight from the memory-mapped catalog pack
+    stream = stream_manager.get_stream(socket_id)
+    selection = stream.get('product') if stream else None
+    # The card lands in the avatar's reused buffer, which restores that area next time
+    avatar.canvas.invalidate(frame, catalogs.card_rect(frame, selection))
+    return catalogs.composite(frame, selection)
+
+
+# Render loops shared by HTTP polling and Socket.IO push
+frame_hub = FrameHub(render_stream_frame, socketio=socketio, jpeg_quality=85)
+
+
+# Queue depths and cache hit rates are read on each /api/metrics scrape
+metrics.add_collector(lambda: stream_gauges(stream_manager.streams, frame_hub, tts_service))
+
+
+def warm_up():
+    """Load the preview avatar and render a first frame once the server is up"""
+    with startup.stage('asset_load'):
+        stream_manager.get_avatar()
+    with startup.stage('first_frame'):
+        frame = render_stream_frame('avatar_stream', dict(DEFAULT_PARAMS))
+        encode_jpeg(frame, frame_hub.jpeg_quality)
+    startup.set_ready()
+    print(f"⏱️ Startup: {startup.summary()}")
+
+
 # API Routes
 
 @app.route('/api/health', methods=['GET'])
@@ -367,10 +533,21 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'active_streams': len(stream_manager.streams),
+        'startup': startup.report(),
+        'jpeg_encoder': encoder_report(),
+        'render_workers': render_pool.report(),
+        'tts': tts_service.report(),
+        'catalogs': catalogs.report(),
         'version': '1.0.0'
     })
 
 
+@app.route('/api/metrics', methods=['GET'])
+def render_metrics():
+    """Render stage histograms, per-stream frame stats and queue depths for Prometheus"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/api/stream/start', methods=['POST'])
 def start_stream():
     """Start a new stream session"""
@@ -401,6 +578,8 @@ def stop_stream():
     
     try:
         stream_manager.stop_stream(socket_id)
+        frame_hub.stop(socket_id)
+        render_pool.close(socket_id)
         
         return jsonify({
             'success': True,
@@ -413,6 +592,14 @@ def stop_stream():
         }), 500
 
 
+def find_stream_avatar(avatar_type):
+    """Get the avatar of the first active stream using an avatar type"""
+    for stream_data in stream_manager.streams.values():
+        if stream_data['avatar'].avatar_type == avatar_type:
+            return stream_data['avatar']
+    return None
+
+
 @app.route('/api/avatar/speak', methods=['POST'])
 def avatar_speak():
     """Make avatar speak text"""
@@ -421,22 +608,19 @@ def avatar_speak():
     voice = data.get('voice', 'female-1')
     speed = float(data.get('speed', 1.0))
     pitch = int(data.get('pitch', 0))
+    priority = data.get('priority', DEFAULT_PRIORITY)
     avatar_type = data.get('avatar', 'default')
     
     try:
         # Find active stream with this avatar
-        avatar = None
-        for stream_data in stream_manager.streams.values():
-            if stream_data['avatar'].avatar_type == avatar_type:
-                avatar = stream_data['avatar']
-                break
+        avatar = find_stream_avatar(avatar_type)
         
         if not avatar:
             # Create temporary avatar
             avatar = AIAvatar(avatar_type)
             avatar.load_avatar()
         
-        result = avatar.speak(text, voice, speed, pitch)
+        result = avatar.speak(text, voice, speed, pitch, priority)
         
         return jsonify({
             'success': True,
@@ -449,6 +633,130 @@ def avatar_speak():
         }), 500
 
 
+@app.route('/api/avatar/speech', methods=['GET'])
+def speech_status():
+    """Get current utterance and speech queue"""
+    avatar = find_stream_avatar(request.args.get('avatar', 'default'))
+    if not avatar:
+        return jsonify({'success': False, 'error': 'Avatar not streaming'}), 404
+    return jsonify({'success': True, 'speech': avatar.speech.status()})
+
+
+@app.route('/api/avatar/speak/cancel', methods=['POST'])
+def cancel_speech():
+    """Cancel current speech, one utterance by id, or everything"""
+    data = request.json or {}
+    avatar = find_stream_avatar(data.get('avatar', 'default'))
+    if not avatar:
+        return jsonify({'success': False, 'error': 'Avatar not streaming'}), 404
+    utterance_id = data.get('id')
+    cancelled = avatar.speech.cancel(int(utterance_id) if utterance_id is not None else None,
+                                     clear=bool(data.get('all')))
+    return jsonify({'success': True, 'cancelled': cancelled, 'speech': avatar.speech.status()})
+
+
+@app.route('/api/avatar/audio/<int:utterance_id>', methods=['GET'])
+def speech_audio(utterance_id):
+    """Stream an utterance's audio as WAV while it is being synthesized"""
+    if get_tts_engine() is None:
+        return jsonify({'success': False, 'error': 'No TTS engine available'}), 503
+    audio = tts_service.get(utterance_id)
+    if audio is None:
+        return jsonify({'success': False, 'error': 'Audio not found'}), 404
+    
+    def generate():
+        # The sample rate is known once synthesis has produced its first chunk
+        chunks = audio.read()
+        first = next(chunks, None)
+        yield wav_header(audio.sample_rate)
+        if first is not None:
+            yield first.tobytes()
+        for chunk in chunks:
+            yield chunk.tobytes()
+    
+    return Response(generate(), mimetype='audio/wav')
+
+
+@app.route('/api/catalog/prerender', methods=['POST'])
+def prerender_catalog():
+    """Pre-render a product catalog into a pack in the background, then load it"""
+    if get_tts_engine() is None:
+        return jsonify({'success': False, 'error': 'No TTS engine available'}), 503
+    data = request.json or {}
+    products = data.get('products')
+    if products is None:
+        try:
+            with open(data.get('path', 'products_example.json'), 'r', encoding='utf-8') as f:
+                products = json.load(f)
+        except (OSError, ValueError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    name = data.get('name', 'catalog')
+    voice = data.get('voice', 'female-1')
+    speed = float(data.get('speed', 1.0))
+    pitch = int(data.get('pitch', 0))
+    
+    def build():
+        try:
+            catalogs.load(ensure_pack(products, name, voice, speed, pitch))
+        except Exception as e:
+            print(f"❌ Catalog pre-render failed: {e}")
+    
+    socketio.start_background_task(build)
+    return jsonify({
+        'success': True,
+        'catalog': name,
+        'products': len(products),
+        'path': pack_path(name)
+    })
+
+
+@app.route('/api/catalog/load', methods=['POST'])
+def load_catalog():
+    """Memory-map a pre-rendered catalog pack"""
+    data = request.json or {}
+    try:
+        pack = catalogs.load(data.get('path') or pack_path(data.get('name', 'catalog')))
+    except (OSError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    return jsonify({
+        'success': True,
+        'catalog': pack.name,
+        'products': [meta['name'] for meta in pack.products]
+    })
+
+
+@app.route('/api/product/show', methods=['POST'])
+def show_product():
+    """Show a product card on a stream and speak its script"""
+    data = request.json or {}
+    stream = stream_manager.get_stream(data.get('socketId'))
+    if not stream:
+        return jsonify({'success': False, 'error': 'Stream not found'}), 404
+    
+    product = data.get('product')
+    if product is None:
+        # Hide the card
+        stream['product'] = None
+        return jsonify({'success': True, 'product': None})
+    
+    selection = catalogs.select(data.get('catalog', 'catalog'), product)
+    if selection is None:
+        return jsonify({'success': False, 'error': 'Product not found'}), 404
+    stream['product'] = selection
+    
+    result = None
+    if data.get('speak', True):
+        # Same voice settings as the pack, so the script is a TTS cache hit
+        header = catalogs.get(selection[0]).header
+        result = stream['avatar'].speak(catalogs.script(selection), header['voice'],
+                                        header['speed'], header['pitch'])
+    return jsonify({
+        'success': True,
+        'product': selection[1],
+        'result': result
+    })
+
+
 @app.route('/api/avatar/upload', methods=['POST'])
 def upload_avatar():
     """Upload custom avatar"""
@@ -521,26 +829,50 @@ def handle_event():
 @app.route('/api/frame/<socket_id>', methods=['GET'])
 def get_frame(socket_id):
     """Get current frame for a stream"""
-    # For preview/non-stream, use global avatar
-    if socket_id == 'avatar_stream':
-        avatar = stream_manager.get_avatar()
-    else:
-        stream = stream_manager.get_stream(socket_id)
-        if not stream:
-            return jsonify({'error': 'Stream not found'}), 404
-        avatar = stream['avatar']
-    
-    gesture_intensity = int(request.args.get('gesture', 50))
+    # avatar_stream is the global preview avatar, anything else must be a live stream
+    if resolve_avatar(socket_id) is None:
+        return jsonify({'error': 'Stream not found'}), 404
     
-    frame = avatar.process_frame(gesture_intensity)
+    # Query args only steer the stream's render loop; the frame is shared by all viewers
+    producer = frame_hub.ensure(socket_id)
+    producer.update_params(**parse_frame_params(request.args))
     
-    if frame is None:
+    latest = producer.get_latest()
+    if latest is None:
         return jsonify({'error': 'Failed to generate frame'}), 500
     
-    # Encode frame to JPEG
-    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    # Viewers asking for the same frame and quality share one encode
+    quality = request.args.get('quality', type=int)
+    if quality:
+        jpeg, etag = producer.encode(latest, max(10, min(quality, 100)))
+    else:
+        jpeg, etag = latest.jpeg, latest.etag
+    
+    headers = {
+        'Cache-Control': 'no-cache',
+        'ETag': f'"{etag}"',
+        'X-Frame-Id': str(latest.frame_id)
+    }
+    if request.if_none_match.contains(etag):
+        return '', 304, headers
+    
+    headers['Content-Type'] = 'image/jpeg'
+    return jpeg, 200, headers
+
+
+@app.route('/api/stream/<socket_id>.mjpg', methods=['GET'])
+def stream_mjpeg(socket_id):
+    """Stream frames as MJPEG (multipart/x-mixed-replace) for OBS and browsers"""
+    if resolve_avatar(socket_id) is None:
+        return jsonify({'error': 'Stream not found'}), 404
+    
+    # Animation inputs are read once; later changes arrive via frame_params or /api/frame
+    producer = frame_hub.ensure(socket_id)
+    producer.update_params(**parse_frame_params(request.args))
+    fps = request.args.get('fps', type=float)
     
-    return buffer.tobytes(), 200, {'Content-Type': 'image/jpeg'}
+    return Response(frame_hub.mjpeg_frames(socket_id, fps), mimetype=MJPEG_MIMETYPE,
+                    headers={'Cache-Control': 'no-store'})
 
 
 # WebSocket events
@@ -552,6 +884,42 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     print('Python backend client disconnected')
+    frame_hub.unsubscribe(request.sid)
+
+
+@socketio.on('subscribe_frames')
+def handle_subscribe_frames(data=None):
+    """Subscribe client to frames pushed by a stream's render loop"""
+    data = data or {}
+    stream_id = data.get('stream_id', 'avatar_stream')
+    if resolve_avatar(stream_id) is None:
+        return {'success': False, 'error': 'Stream not found'}
+    
+    join_room(frame_room(stream_id))
+    frame_hub.subscribe(request.sid, stream_id)
+    producer = frame_hub.ensure(stream_id)
+    producer.update_params(**parse_frame_params(data))
+    
+    return {'success': True, 'stream_id': stream_id, 'fps': producer.fps}
+
+
+@socketio.on('unsubscribe_frames')
+def handle_unsubscribe_frames(data=None):
+    """Stop pushing frames of a stream to client"""
+    data = data or {}
+    stream_id = data.get('stream_id', 'avatar_stream')
+    leave_room(frame_room(stream_id))
+    frame_hub.unsubscribe(request.sid, stream_id)
+    return {'success': True}
+
+
+@socketio.on('frame_params')
+def handle_frame_params(data=None):
+    """Update animation inputs of a stream's render loop"""
+    data = data or {}
+    producer = frame_hub.get(data.get('stream_id', 'avatar_stream'))
+    if producer is not None:
+        producer.update_params(**parse_frame_params(data))
 
 
 # Main
@@ -563,5 +931,19 @@ if __name__ == '__main__':
     print(f"📱 Portrait Mode (9:16): 1080x1920")
     print(f"🚀 Server ready at http://localhost:{PORT}")
     
+    # Pick the fastest JPEG backend before serving frames
+    with startup.stage('jpeg_benchmark'):
+        encoder = select_encoder()
+    print(f"🖼️ JPEG encoder: {encoder.name}")
+    
+    with startup.stage('tts_engine'):
+        select_tts_engine()
+    
+    # Fork render workers before any request threads exist
+    render_pool.start()
+    
+    # Assets and the first frame load in the background so the port binds right away
+    socketio.start_background_task(warm_up)
+    
     socketio.run(app, host='0.0.0.0', port=PORT, debug=False, allow_unsafe_werkzeug=True)
 
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Avatar Speech Scheduler
+Per-avatar queue of utterances played back one at a time on the wall clock
+"""
+
+import heapq
+import itertools
+import queue
+import threading
+import time
+
+from avatar_visemes import VisemeTimeline, REST, viseme_open
+
+# Lower value speaks first; a more urgent utterance interrupts the current one
+PRIORITIES = {
+    'gift': 0,
+    'greeting': 1,
+    'chat': 2
+}
+DEFAULT_PRIORITY = 'chat'
+
+_utterance_ids = itertools.count(1)
+
+
+def speech_priority(name):
+    """Get numeric priority for a priority name or number"""
+    if isinstance(name, int):
+        return name
+    return PRIORITIES.get(str(name or DEFAULT_PRIORITY).lower(), PRIORITIES[DEFAULT_PRIORITY])
+
+
+def speech_duration(text, speed=1.0):
+    """Get estimated duration of an utterance in seconds (speed is a rate)"""
+    return len(text) / 10 / max(speed, 0.1)
+
+
+class Utterance:
+    """One queued piece of speech and its viseme timeline"""
+
+    def __init__(self, text, voice='female-1', speed=1.0, pitch=0, priority=DEFAULT_PRIORITY,
+                 duration=None, utterance_id=None):
+        self.id = utterance_id or next(_utterance_ids)
+        self.text = text
+        self.voice = voice
+        self.speed = speed
+        self.pitch = pitch
+        self.priority = speech_priority(priority)
+        self.duration = speech_duration(text, speed) if duration is None else duration
+        self.timeline = VisemeTimeline(text, self.duration)
+        self.queued = time.time()
+        # Scheduler clock time the utterance was taken off speech_queue
+        self.arrived = None
+        self.started = None
+        self.cancelled = False
+        # SpeechAudio when a TTS engine synthesizes the utterance
+        self.audio = None
+        # Mouth sampled by another process (render workers)
+        self.mirrored_mouth = None
+
+    def set_duration(self, duration):
+        """Replace the estimated duration, e.g. with the synthesized audio length"""
+        self.timeline = VisemeTimeline(self.text, duration)
+        self.duration = duration
+
+    def elapsed(self, now):
+        return now - self.started if self.started is not None else 0.0
+
+    def ends(self):
+        return self.started + self.duration
+
+    def mouth(self, now):
+        """Get (mouth_open, viseme id) at a wall-clock time
+
+        Comes from the synthesized audio once it reaches that point, and
+        from the text timeline before audio arrives or without a TTS engine.
+        """
+        if self.mirrored_mouth is not None:
+            return self.mirrored_mouth
+        elapsed = self.elapsed(now)
+        audio = self.audio
+        if audio is not None and audio.lipsync is not None:
+            sample = audio.lipsync.sample(elapsed)
+            if sample is not None:
+                return sample
+            if audio.done:
+                return 0.0, REST
+        viseme = self.timeline.at(elapsed)
+        return viseme_open(viseme), viseme
+
+    def progress(self, now):
+        """Get fraction of the utterance spoken"""
+        return self.timeline.progress(self.elapsed(now))
+
+    def to_dict(self, now=None):
+        """Get JSON-friendly state (also sent to render workers)"""
+        now = now or time.time()
+        return {
+            'id': self.id,
+            'text': self.text,
+            'voice': self.voice,
+            'speed': self.speed,
+            'pitch': self.pitch,
+            'priority': self.priority,
+            'duration': self.duration,
+            'started': self.started,
+            'progress': round(self.progress(now), 3) if self.started is not None else 0.0
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        utterance = cls(data['text'], data['voice'], data['speed'], data['pitch'], data['priority'],
+                        data['duration'], data['id'])
+        utterance.started = data['started']
+        return utterance
+
+
+class SpeechScheduler:
+    """Play an avatar's utterances in priority order, one at a time
+
+    speak() calls put utterances on speech_queue. The scheduler has no
+    timer thread: every read drains the queue and advances playback from
+    the clock. An utterance that was already waiting starts where the
+    previous one ended, one that arrived later starts when it arrived, so
+    no speech is skipped however rarely the scheduler is polled. An
+    utterance with a more urgent priority interrupts the current one,
+    which is queued again to be repeated from the start.
+    """
+
+    def __init__(self, speech_queue=None):
+        self.queue = speech_queue if speech_queue is not None else queue.Queue()
+        self.pending = []
+        self.current = None
+        self.lock = threading.Lock()
+        self.spoken = 0
+        self.cancelled = 0
+        self.preempted = 0
+
+    def say(self, text, voice='female-1', speed=1.0, pitch=0, priority=DEFAULT_PRIORITY, duration=None):
+        """Queue an utterance; returns the Utterance"""
+        utterance = Utterance(text, voice, speed, pitch, priority, duration)
+        self.queue.put(utterance)
+        self.advance()
+        return utterance
+
+    def advance(self, now=None):
+        """Move queued utterances into the schedule and finish elapsed ones"""
+        now = now or time.time()
+        with self.lock:
+            while True:
+                try:
+                    utterance = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(utterance, dict):
+                    utterance = Utterance(utterance['text'], utterance.get('voice', 'female-1'),
+                                          utterance.get('speed', 1.0), utterance.get('pitch', 0),
+                                          utterance.get('priority', DEFAULT_PRIORITY))
+                utterance.arrived = now
+                heapq.heappush(self.pending, (utterance.priority, utterance.id, utterance))
+
+            # Preempt the current utterance for a more urgent one
+            current = self.current
+            if current is not None and self.pending and self.pending[0][0] < current.priority:
+                current.started = None
+                heapq.heappush(self.pending, (current.priority, current.id, current))
+                self.current = None
+                self.preempted += 1
+                print(f"⏹️ Speech interrupted for priority {self.pending[0][0]}: {current.text[:40]}")
+                started = now
+            else:
+                started = None
+
+            while True:
+                if self.current is not None:
+                    if self.current.ends() > now:
+                        break
+                    started = self.current.ends()
+                    self.current = None
+                    self.spoken += 1
+                if not self.pending:
+                    break
+                _, _, utterance = heapq.heappop(self.pending)
+                # Back-to-back speech starts when the previous utterance ended,
+                # unless it arrived after that
+                if started is None:
+                    utterance.started = now
+                else:
+                    utterance.started = max(started, utterance.arrived or started)
+                self.current = utterance
+
+    def now_speaking(self, now=None):
+        """Get the utterance being spoken, or None"""
+        self.advance(now)
+        return self.current
+
+    def is_speaking(self, now=None):
+        return self.now_speaking(now) is not None
+
+    def cancel(self, utterance_id=None, clear=False):
+        """Cancel the current utterance, a specific one by id, or everything with clear=True"""
+        self.advance()
+        cancelled = 0
+        with self.lock:
+            if clear or utterance_id is not None:
+                keep = [item for item in self.pending if not clear and item[2].id != utterance_id]
+                for item in self.pending:
+                    if item not in keep:
+                        item[2].cancelled = True
+                cancelled += len(self.pending) - len(keep)
+                self.pending = keep
+                heapq.heapify(self.pending)
+            current = self.current
+            if current is not None and (clear or utterance_id in (None, current.id)):
+                current.cancelled = True
+                self.current = None
+                cancelled += 1
+                # Whatever is next starts right away
+                if self.pending:
+                    _, _, utterance = heapq.heappop(self.pending)
+                    utterance.started = time.time()
+                    self.current = utterance
+            self.cancelled += cancelled
+        return cancelled
+
+    def follow(self, state):
+        """Mirror another process's current utterance (used by render workers)"""
+        with self.lock:
+            if not state:
+                self.current = None
+                return
+            if self.current is None or self.current.id != state['id']:
+                self.current = Utterance.from_dict(state)
+            mouth = state.get('mouth')
+            self.current.mirrored_mouth = tuple(mouth) if mouth else None
+
+    def mouth(self, now=None):
+        """Get (mouth_open, viseme id) of the current utterance, (0.0, None) when silent"""
+        now = now or time.time()
+        utterance = self.now_speaking(now)
+        if utterance is None:
+            return 0.0, None
+        return utterance.mouth(now)
+
+    def snapshot(self, now=None):
+        """Get current utterance and its mouth as a dict, or None"""
+        now = now or time.time()
+        utterance = self.now_speaking(now)
+        if utterance is None:
+            return None
+        return dict(utterance.to_dict(now), mouth=utterance.mouth(now))
+
+    def starts_in(self, utterance_id):
+        """Get seconds until an utterance starts, or None if it is not scheduled"""
+        status = self.status()
+        if status['current'] and status['current']['id'] == utterance_id:
+            return 0.0
+        for utterance in status['queued']:
+            if utterance['id'] == utterance_id:
+                return utterance['starts_in']
+        return None
+
+    def status(self):
+        """Get current utterance, queue and counters"""
+        now = time.time()
+        self.advance(now)
+        with self.lock:
+            current = self.current
+            pending = [item[2] for item in sorted(self.pending)]
+        wait = current.ends() - now if current is not None else 0.0
+        queued = []
+        for utterance in pending:
+            queued.append(dict(utterance.to_dict(now), starts_in=round(max(0.0, wait), 2)))
+            wait += utterance.duration
+        return {
+            'current': current.to_dict(now) if current is not None else None,
+            'queued': queued,
+            'spoken': self.spoken,
+            'cancelled': self.cancelled,
+            'preempted': self.preempted
+        }
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Avatar Sprite Cache
+Render static avatar layers once and composite them over animated frames
+"""
+
+import threading
+
+import cv2
+import numpy as np
+
+from avatar_transform import get_interpolation
+
+
+class SpriteLayer:
+    """Pre-rendered BGRA layer ready for fast compositing"""
+
+    def __init__(self, bgra):
+        self.bgra = bgra
+        self.height, self.width = bgra.shape[:2]
+
+        # Only composite the area that actually has coverage
+        alpha = bgra[:, :, 3]
+        ys, xs = np.nonzero(alpha)
+        if len(ys) == 0:
+            self.bbox = None
+            return
+        self.bbox = (int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1)
+
+        x0, y0, x1, y1 = self.bbox
+        crop = bgra[y0:y1, x0:x1]
+        crop_alpha = crop[:, :, 3:4].astype(np.uint16)
+        self.premultiplied = ((crop[:, :, :3].astype(np.uint16) * crop_alpha + 127) // 255).astype(np.uint8)
+        self.inverse_alpha = cv2.merge([255 - crop[:, :, 3]] * 3)
+
+    @classmethod
+    def from_parts(cls, width, height, bbox, premultiplied, inverse_alpha):
+        """Rebuild a layer from saved blend planes (e.g. memory-mapped from a pack)"""
+        layer = cls.__new__(cls)
+        layer.bgra = None
+        layer.width, layer.height = width, height
+        layer.bbox = tuple(bbox) if bbox else None
+        layer.premultiplied = premultiplied
+        layer.inverse_alpha = inverse_alpha
+        return layer
+
+    def resized(self, width, height):
+        """Get a copy of this layer resampled to another frame size"""
+        interpolation = cv2.INTER_AREA if width < self.width else cv2.INTER_LINEAR
+        return SpriteLayer(cv2.resize(self.bgra, (width, height), interpolation=interpolation))
+
+    @classmethod
+    def from_renders(cls, on_black, on_white):
+        """Build layer from the same drawing rendered over black and white
+
+        Alpha is recovered from how much the backdrop shows through, which
+        keeps anti-aliasing and blur edges intact.
+        """
+        diff = on_white.astype(np.int16) - on_black.astype(np.int16)
+        alpha = 255 - np.clip(diff.mean(axis=2), 0, 255)
+        alpha = alpha.astype(np.uint8)
+
+        # on_black holds premultiplied color; recover straight color
+        safe_alpha = np.maximum(alpha, 1).astype(np.float32)[:, :, np.newaxis]
+        color = np.clip(on_black.astype(np.float32) * 255.0 / safe_alpha, 0, 255).astype(np.uint8)
+        color[alpha == 0] = 0
+
+        return cls(np.dstack([color, alpha]))
+
+    def composite(self, frame, transform=None, roi=None, quality=None):
+        """Alpha blend layer over frame in place
+
+        When a transform is given, the part of the layer inside roi
+        (x0, y0, x1, y1) is warped by it in the same pass, so only that
+        region is resampled and the background behind it stays untouched.
+        """
+        if self.bbox is None:
+            return frame
+
+        warp_roi = None
+        if transform is not None and roi is not None and not transform.is_identity():
+            rx0, ry0, rx1, ry1 = roi
+            rx0, ry0 = max(0, rx0), max(0, ry0)
+            rx1, ry1 = min(frame.shape[1], rx1), min(frame.shape[0], ry1)
+            if rx1 > rx0 and ry1 > ry0:
+                warp_roi = (rx0, ry0, rx1, ry1)
+                background = frame[ry0:ry1, rx0:rx1].copy()
+
+        x0, y0, x1, y1 = self.bbox
+        region = frame[y0:y1, x0:x1]
+        cv2.multiply(region, self.inverse_alpha, dst=region, scale=1.0 / 255)
+        cv2.add(region, self.premultiplied, dst=region)
+
+        if warp_roi is not None:
+            rx0, ry0, rx1, ry1 = warp_roi
+            size = (rx1 - rx0, ry1 - ry0)
+            M = transform.local_matrix(rx0, ry0, src_offset=(x0, y0))
+            flags = get_interpolation(quality)
+            color = cv2.warpAffine(self.premultiplied, M, size, flags=flags,
+                                   borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0))
+            inverse = cv2.warpAffine(self.inverse_alpha, M, size, flags=flags,
+                                     borderMode=cv2.BORDER_CONSTANT, borderValue=(255, 255, 255))
+            cv2.multiply(background, inverse, dst=background, scale=1.0 / 255)
+            cv2.add(background, color, dst=frame[ry0:ry1, rx0:rx1])
+        return frame
+
+    def composite_region(self, frame, roi, transform=None, quality=None):
+        """Alpha blend only the part of the layer inside roi, warped by transform
+
+        For frames that already show the rest of the layer; roi has to hold
+        the plain background.
+        """
+        if self.bbox is None:
+            return frame
+        x0, y0, x1, y1 = self.bbox
+        rx0, ry0 = max(0, roi[0]), max(0, roi[1])
+        rx1, ry1 = min(frame.shape[1], roi[2]), min(frame.shape[0], roi[3])
+        if rx1 <= rx0 or ry1 <= ry0:
+            return frame
+
+        if transform is None or transform.is_identity():
+            # Unwarped: blend the overlap of roi and the layer bounds
+            ix0, iy0, ix1, iy1 = max(rx0, x0), max(ry0, y0), min(rx1, x1), min(ry1, y1)
+            if ix1 <= ix0 or iy1 <= iy0:
+                return frame
+            target = frame[iy0:iy1, ix0:ix1]
+            cv2.multiply(target, self.inverse_alpha[iy0 - y0:iy1 - y0, ix0 - x0:ix1 - x0], dst=target,
+                         scale=1.0 / 255)
+            cv2.add(target, self.premultiplied[iy0 - y0:iy1 - y0, ix0 - x0:ix1 - x0], dst=target)
+            return frame
+
+        region = frame[ry0:ry1, rx0:rx1]
+        size = (rx1 - rx0, ry1 - ry0)
+        M = transform.local_matrix(rx0, ry0, src_offset=(x0, y0))
+        flags = get_interpolation(quality)
+        color = cv2.warpAffine(self.premultiplied, M, size, flags=flags,
+                               borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0))
+        inverse = cv2.warpAffine(self.inverse_alpha, M, size, flags=flags,
+                                 borderMode=cv2.BORDER_CONSTANT, borderValue=(255, 255, 255))
+        cv2.multiply(region, inverse, dst=region, scale=1.0 / 255)
+        cv2.add(region, color, dst=region)
+        return frame
+
+
+def render_layer(draw_fn, width, height, blur=None, overlay_fn=None):
+    """Render a drawing function into a SpriteLayer
+
+    draw_fn(img) draws onto a BGR image; blur is an optional Gaussian kernel
+    size applied afterwards, and overlay_fn(img) draws sharp content such as
+    text labels on top of the blurred result.
+    """
+    renders = []
+    for backdrop in (0, 255):
+        img = np.full((height, width, 3), backdrop, dtype=np.uint8)
+        draw_fn(img)
+        if blur:
+            img = cv2.GaussianBlur(img, (blur, blur), 0)
+        if overlay_fn:
+            overlay_fn(img)
+        renders.append(img)
+    return SpriteLayer.from_renders(*renders)
+
+
+class SpriteCache:
+    """Cache of rendered sprite layers keyed by avatar type and size"""
+
+    def __init__(self):
+        self.layers = {}
+        # Re-entrant so a layer can be derived from another cached layer
+        self.lock = threading.RLock()
+
+    def get(self, avatar_type, width, height, render_fn):
+        """Get cached layer, rendering it on first use"""
+        key = (avatar_type, width, height)
+        layer = self.layers.get(key)
+        if layer is None:
+            with self.lock:
+                layer = self.layers.get(key)
+                if layer is None:
+                    layer = render_fn()
+                    self.layers[key] = layer
+        return layer
+
+    def invalidate(self, avatar_type=None):
+        """Drop cached layers for one avatar type, or all of them"""
+        with self.lock:
+            if avatar_type is None:
+                self.layers.clear()
+            else:
+                for key in [k for k in self.layers if k[0] == avatar_type]:
+                    del self.layers[key]
+
+
+# Shared cache for all avatars in this process
+sprite_cache = SpriteCache()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Avatar Startup
+Startup-time report and lazy loading of heavy optional backends
+"""
+
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+
+# Taken when the first server module imports this one
+PROCESS_START = time.perf_counter()
+
+
+class StartupReport:
+    """Time the stages between process start and the first rendered frame"""
+
+    def __init__(self, started=PROCESS_START):
+        self.started = started
+        self.stages = {}
+        self.ready_at = None
+        self.lock = threading.Lock()
+
+    def mark(self, name):
+        """Record time from process start to now as a stage"""
+        with self.lock:
+            self.stages[name] = round((time.perf_counter() - self.started) * 1000, 1)
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block as a stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.stages[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def set_ready(self):
+        """Mark the server as warmed up"""
+        self.ready_at = time.perf_counter()
+
+    def report(self):
+        """Get stage timings in milliseconds"""
+        with self.lock:
+            stages = dict(self.stages)
+        return {
+            'ready': self.ready_at is not None,
+            'ready_ms': round((self.ready_at - self.started) * 1000, 1) if self.ready_at else None,
+            'stages_ms': stages
+        }
+
+    def summary(self):
+        """Get one-line summary for the console"""
+        parts = [f"{name} {ms:.0f} ms" for name, ms in self.report()['stages_ms'].items()]
+        return ", ".join(parts)
+
+
+startup = StartupReport()
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def load_backend(module_name):
+    """Import an optional backend on first use; returns None if unavailable"""
+    with _backends_lock:
+        if module_name in _backends:
+            return _backends[module_name]
+        try:
+            with startup.stage(f"import_{module_name}"):
+                module = importlib.import_module(module_name)
+            print(f"✅ Loaded {module_name}")
+        except Exception as e:
+            print(f"⚠️ {module_name} not available: {e}")
+            module = None
+        _backends[module_name] = module
+        return module
+
+
+def backend_status():
+    """Get which optional backends were loaded"""
+    return {name: module is not None for name, module in _backends.items()}
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Avatar Frame Streaming
+Per-stream render loops that publish into a latest-frame slot
+and push encoded frames to subscribed Socket.IO clients
+"""
+
+import itertools
+import threading
+import time
+
+from avatar_cache import EncodedFrameCache, make_etag
+from avatar_config import DEFAULT_FPS
+from avatar_encoder import get_encoder
+from avatar_governor import FrameGovernor
+from avatar_metrics import metrics
+
+# Socket.IO event and room prefix used for pushed frames
+FRAME_EVENT = 'avatar_frame'
+ROOM_PREFIX = 'frames:'
+
+# Multipart boundary for MJPEG streams
+MJPEG_BOUNDARY = 'frame'
+MJPEG_MIMETYPE = f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}'
+
+# Default animation inputs for a fresh stream
+DEFAULT_PARAMS = {
+    'gesture_intensity': 50,
+    'is_speaking': False,
+    'text': ''
+}
+
+
+def frame_room(stream_id):
+    """Get Socket.IO room name for a stream's frames"""
+    return f"{ROOM_PREFIX}{stream_id}"
+
+
+def encode_jpeg(frame, quality):
+    """Encode BGR frame to JPEG bytes with the selected backend"""
+    timer = metrics.timer()
+    jpeg = get_encoder().encode(frame, quality)
+    timer.lap('encode')
+    return jpeg
+
+
+class RenderedFrame:
+    """One rendered frame plus the inputs it was rendered from"""
+
+    def __init__(self, frame_id, timestamp, frame, params):
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.frame = frame
+        self.params = params
+        self.jpeg = None
+        self.etag = None
+
+
+class FrameProducer:
+    """Render loop for one stream
+
+    Renders at a target fps and keeps only the most recent frame, so any
+    number of HTTP or Socket.IO consumers share a single render per tick.
+    """
+
+    def __init__(self, hub, stream_id, fps):
+        self.hub = hub
+        self.stream_id = stream_id
+        self.fps = fps
+        self.params = dict(DEFAULT_PARAMS)
+        self.running = False
+        # Bumped for every loop started, so a loop that already exited can't discard its successor
+        self.generation = 0
+        self.last_access = time.time()
+        # Frame ids count up from 1 per producer; created tells producers of a stream apart
+        self.created = time.time()
+        self.frame_ids = itertools.count(1)
+        self.frame_id = 0
+        # Most recent RenderedFrame
+        self.latest = None
+        # Steps quality down when frames take longer than the fps budget
+        self.governor = FrameGovernor(fps)
+
+    def update_params(self, **params):
+        """Update animation inputs used by the next render"""
+        for key, value in params.items():
+            if value is not None:
+                self.params[key] = value
+        self.touch()
+
+    def touch(self):
+        """Mark producer as in use so the idle timeout does not stop it"""
+        self.last_access = time.time()
+
+    def frame_key(self, rendered, quality):
+        """Get cache key for one encoding of a rendered frame
+
+        Keyed on the frame itself rather than its inputs, since mouth,
+        visemes, product cards and governor level all change the picture.
+        """
+        height, width = rendered.frame.shape[:2]
+        return (
+            self.stream_id,
+            self.created,
+            rendered.frame_id,
+            quality,
+            f"{width}x{height}"
+        )
+
+    def encode(self, rendered, quality=None):
+        """Get (jpeg, etag) for a rendered frame, sharing encodes through the hub cache"""
+        quality = quality or self.hub.jpeg_quality
+        key = self.frame_key(rendered, quality)
+        jpeg = self.hub.frame_cache.get_or_encode(key, lambda: encode_jpeg(rendered.frame, quality))
+        return jpeg, make_etag(key)
+
+    def render_once(self):
+        """Render, encode and publish one frame; returns False if the stream is gone"""
+        hints = self.governor.hints()
+        params = dict(self.params, **hints)
+        started = time.perf_counter()
+        frame = self.hub.render_fn(self.stream_id, params)
+        if frame is None:
+            return False
+
+        frame_id = next(self.frame_ids)
+        rendered = RenderedFrame(frame_id, time.time(), frame, params)
+        rendered.jpeg, rendered.etag = self.encode(rendered, hints.get('jpeg_quality'))
+        if rendered.jpeg is None:
+            return True
+        cost = time.perf_counter() - started
+        self.governor.record(cost)
+        metrics.stream_frame(self.stream_id, cost * 1000.0, len(rendered.jpeg))
+
+        self.latest = rendered
+        self.frame_id = frame_id
+        self.hub.publish(self, rendered.jpeg)
+        return True
+
+    def get_latest(self):
+        """Get latest RenderedFrame, rendering one if nothing exists yet"""
+        self.touch()
+        if self.latest is None:
+            self.render_once()
+        return self.latest
+
+    def start(self):
+        """Start the background render loop; called with the hub lock held"""
+        if self.running:
+            return
+        self.running = True
+        self.generation += 1
+        self.touch()
+        generation = self.generation
+        self.hub.start_task(lambda: self.run(generation))
+
+    def stop(self):
+        """Ask the render loop to exit after the current frame"""
+        self.running = False
+
+    def is_idle(self):
+        """Check whether nobody has read or subscribed recently"""
+        if self.hub.subscriber_count(self.stream_id) > 0:
+            return False
+        return time.time() - self.last_access > self.hub.idle_timeout
+
+    def run(self, generation):
+        """Render loop body"""
+        print(f"🎬 Render loop started for {self.stream_id} @ {self.fps} fps")
+        interval = 1.0 / self.fps
+        next_tick = time.time()
+        while self.running and self.generation == generation:
+            try:
+                if not self.render_once():
+                    break
+            except Exception as e:
+                print(f"❌ Render error for {self.stream_id}: {e}")
+
+            if self.is_idle():
+                break
+
+            # Frames stay on a fixed cadence; a late frame doesn't trigger a burst to catch up
+            next_tick += interval
+            delay = next_tick - time.time()
+            if delay < -interval:
+                next_tick = time.time()
+            self.hub.sleep(max(0.0, delay))
+
+        self.hub.discard(self, generation)
+        if not self.running:
+            # Let go of the last frame, which may point into render worker memory
+            self.latest = None
+        print(f"⏹️ Render loop stopped for {self.stream_id}")
+
+
+class FrameHub:
+    """Owns render loops for all streams of a server
+
+    render_fn(stream_id, params) returns a BGR frame, or None once the
+    stream no longer exists.
+    """
+
+    def __init__(self, render_fn, socketio=None, fps=DEFAULT_FPS, jpeg_quality=90, idle_timeout=10.0):
+        self.render_fn = render_fn
+        self.socketio = socketio
+        self.fps = fps
+        self.jpeg_quality = jpeg_quality
+        self.idle_timeout = idle_timeout
+        self.frame_cache = EncodedFrameCache()
+        self.producers = {}
+        self.subscriptions = {}
+        self.lock = threading.Lock()
+
+    def start_task(self, target):
+        """Run target in the background using the server's async mode"""
+        if self.socketio is not None:
+            return self.socketio.start_background_task(target)
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        return thread
+
+    def sleep(self, seconds):
+        """Sleep cooperatively with the server's async mode"""
+        if self.socketio is not None:
+            self.socketio.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
+    def ensure(self, stream_id, fps=None):
+        """Get the producer for a stream, starting its render loop if needed"""
+        with self.lock:
+            producer = self.producers.get(stream_id)
+            if producer is None:
+                producer = FrameProducer(self, stream_id, fps or self.fps)
+                self.producers[stream_id] = producer
+            producer.start()
+        return producer
+
+    def get(self, stream_id):
+        """Get the producer for a stream if one is running"""
+        return self.producers.get(stream_id)
+
+    def discard(self, producer, generation):
+        """Forget a producer whose loop has exited, unless a newer loop took over"""
+        with self.lock:
+            if producer.generation != generation:
+                return
+            producer.running = False
+            if self.producers.get(producer.stream_id) is producer:
+                del self.producers[producer.stream_id]
+                metrics.drop_stream(producer.stream_id)
+
+    def stop(self, stream_id):
+        """Stop a stream's render loop"""
+        with self.lock:
+            producer = self.producers.pop(stream_id, None)
+        if producer is not None:
+            producer.stop()
+            # The last frame may be a view into render worker memory that is about to be freed
+            producer.latest = None
+        return producer is not None
+
+    def subscribe(self, sid, stream_id):
+        """Register a Socket.IO client for pushed frames"""
+        with self.lock:
+            self.subscriptions.setdefault(stream_id, set()).add(sid)
+
+    def unsubscribe(self, sid, stream_id=None):
+        """Remove a client from one stream, or from every stream"""
+        with self.lock:
+            stream_ids = [stream_id] if stream_id is not None else list(self.subscriptions)
+            for key in stream_ids:
+                subscribers = self.subscriptions.get(key)
+                if subscribers is None:
+                    continue
+                subscribers.discard(sid)
+                if not subscribers:
+                    del self.subscriptions[key]
+            return stream_ids
+
+    def subscriber_count(self, stream_id):
+        """Get number of push subscribers for a stream"""
+        return len(self.subscriptions.get(stream_id, ()))
+
+    def publish(self, producer, jpeg):
+        """Push an encoded frame to subscribers of its stream"""
+        if self.socketio is None or self.subscriber_count(producer.stream_id) == 0:
+            return
+        self.socketio.emit(FRAME_EVENT, {
+            'stream_id': producer.stream_id,
+            'frame_id': producer.frame_id,
+            'image': jpeg
+        }, to=frame_room(producer.stream_id))
+
+    def mjpeg_frames(self, stream_id, fps=None):
+        """Yield multipart JPEG parts from a stream's render loop
+
+        Runs until the stream's render loop exits; each new frame is sent
+        once, at no more than fps frames per second.
+        """
+        producer = self.ensure(stream_id)
+        if not fps or fps <= 0:
+            fps = producer.fps
+        interval = 1.0 / min(fps, producer.fps)
+        last_frame_id = None
+
+        while producer.running:
+            started = time.time()
+            latest = producer.get_latest()
+            if latest is not None and latest.frame_id != last_frame_id:
+                last_frame_id, jpeg = latest.frame_id, latest.jpeg
+                yield (
+                    f"--{MJPEG_BOUNDARY}\r\n"
+                    f"Content-Type: image/jpeg\r\n"
+                    f"Content-Length: {len(jpeg)}\r\n\r\n"
+                ).encode('ascii') + jpeg + b"\r\n"
+
+            elapsed = time.time() - started
+            self.sleep(max(0.0, interval - elapsed))
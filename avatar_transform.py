@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Avatar Transform Pipeline
+Compose head tilt, breathing scale and translation into a single warp
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+# Interpolation quality tiers, cheapest first
+INTERPOLATION_TIERS = {
+    'nearest': cv2.INTER_NEAREST,
+    'linear': cv2.INTER_LINEAR,
+    'cubic': cv2.INTER_CUBIC
+}
+QUALITY_ORDER = ['nearest', 'linear', 'cubic']
+
+DEFAULT_QUALITY = os.getenv('WARP_QUALITY', 'linear')
+if DEFAULT_QUALITY not in INTERPOLATION_TIERS:
+    DEFAULT_QUALITY = 'linear'
+
+
+def get_interpolation(quality=None):
+    """Get OpenCV interpolation flag for a quality tier"""
+    return INTERPOLATION_TIERS.get(quality or DEFAULT_QUALITY, cv2.INTER_LINEAR)
+
+
+class AffineTransform:
+    """Chain of 2D affine steps collapsed into one matrix
+
+    Steps are applied in the order they are added, exactly as if each one
+    was a separate cv2.warpAffine call.
+    """
+
+    def __init__(self):
+        self.matrix = np.eye(3, dtype=np.float64)
+
+    def _then(self, step):
+        step3 = np.vstack([step, [0.0, 0.0, 1.0]])
+        self.matrix = step3 @ self.matrix
+        return self
+
+    def rotate(self, center, angle):
+        """Rotate by angle degrees around center"""
+        if angle:
+            self._then(cv2.getRotationMatrix2D(center, angle, 1.0))
+        return self
+
+    def scale(self, center, factor):
+        """Scale by factor around center"""
+        if factor != 1.0:
+            self._then(cv2.getRotationMatrix2D(center, 0, factor))
+        return self
+
+    def translate(self, dx, dy):
+        """Shift by (dx, dy) pixels"""
+        if dx or dy:
+            self._then(np.array([[1.0, 0.0, dx], [0.0, 1.0, dy]]))
+        return self
+
+    def is_identity(self):
+        """Check whether the transform is a no-op"""
+        return np.allclose(self.matrix, np.eye(3))
+
+    def to_matrix(self):
+        """Get 2x3 matrix for cv2.warpAffine"""
+        return self.matrix[:2]
+
+    def apply(self, point):
+        """Map a point through the transform"""
+        x, y = point
+        m = self.matrix
+        return (m[0, 0] * x + m[0, 1] * y + m[0, 2], m[1, 0] * x + m[1, 1] * y + m[1, 2])
+
+    def local_matrix(self, x_offset, y_offset, src_offset=None):
+        """Get 2x3 matrix between regions of a larger image
+
+        The destination region starts at (x_offset, y_offset); the source
+        region starts at src_offset, defaulting to the same position.
+        """
+        src_x, src_y = src_offset if src_offset is not None else (x_offset, y_offset)
+        to_local = np.array([[1.0, 0.0, -x_offset], [0.0, 1.0, -y_offset], [0.0, 0.0, 1.0]])
+        to_global = np.array([[1.0, 0.0, src_x], [0.0, 1.0, src_y], [0.0, 0.0, 1.0]])
+        return (to_local @ self.matrix @ to_global)[:2]
+
+    def warp(self, img, quality=None, dst=None):
+        """Warp whole image with a single resample"""
+        h, w = img.shape[:2]
+        if self.is_identity():
+            if dst is None:
+                return img.copy()
+            np.copyto(dst, img)
+            return dst
+        return cv2.warpAffine(img, self.to_matrix(), (w, h), dst=dst,
+                              flags=get_interpolation(quality))
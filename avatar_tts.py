@@ -0,0 +1,582 @@
+#!/usr/bin/env python3
+"""
+Avatar Text-to-Speech
+Pluggable local TTS engines (piper, espeak-ng, tone synthesizer) streaming
+16-bit PCM in small chunks while the rest of the sentence is synthesized
+"""
+
+import hashlib
+import heapq
+import json
+import os
+import shutil
+import struct
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from avatar_cache import LRUCache
+from avatar_lipsync import LipSyncTrack
+
+# TTS options, overridable from the environment
+TTS_ENGINE = os.getenv('TTS_ENGINE', 'auto')
+TTS_LANGUAGE = os.getenv('TTS_LANGUAGE', 'id')
+TTS_CHUNK_MS = int(os.getenv('TTS_CHUNK_MS', '20'))
+PIPER_MODEL = os.getenv('PIPER_MODEL', '')
+TTS_CACHE_ENTRIES = int(os.getenv('TTS_CACHE_ENTRIES', '64'))
+TTS_CACHE_DISK_MB = float(os.getenv('TTS_CACHE_DISK_MB', '200'))
+
+# Finished utterance audio kept for late listeners
+RECENT_AUDIO = 32
+
+# Engines tried in order by 'auto'; the tone synthesizer is only used when asked for
+ENGINE_ORDER = ('piper', 'espeak')
+
+
+class TTSEngine:
+    """Base TTS backend: stream() yields int16 mono chunks at sample_rate"""
+
+    name = 'base'
+    sample_rate = 22050
+
+    def available(self):
+        """Check whether the backend can be used in this environment"""
+        return True
+
+    def chunk_samples(self):
+        return max(1, self.sample_rate * TTS_CHUNK_MS // 1000)
+
+    def identity(self):
+        """Get what decides this engine's output, for cache keys"""
+        return self.name
+
+    def synthesize(self, text, voice='female-1', speed=1.0, pitch=0):
+        """Start one synthesis; returns (sample_rate, chunk iterator)"""
+        return self.sample_rate, self.stream(text, voice, speed, pitch)
+
+    def stream(self, text, voice='female-1', speed=1.0, pitch=0):
+        raise NotImplementedError
+
+
+class ProcessEngine(TTSEngine):
+    """Backend running a local TTS binary and reading PCM from its stdout"""
+
+    def command(self, text, voice, speed, pitch):
+        raise NotImplementedError
+
+    def read_header(self, stdout):
+        """Consume any header before the PCM data; returns its sample rate, if any"""
+        return None
+
+    def synthesize(self, text, voice='female-1', speed=1.0, pitch=0):
+        args, stdin = self.command(text, voice, speed, pitch)
+        process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL)
+        try:
+            if stdin is not None:
+                process.stdin.write(stdin.encode('utf-8'))
+            process.stdin.close()
+            sample_rate = self.read_header(process.stdout) or self.sample_rate
+        except Exception:
+            process.kill()
+            process.wait()
+            raise
+        return sample_rate, self.read_pcm(process)
+
+    def stream(self, text, voice='female-1', speed=1.0, pitch=0):
+        return self.synthesize(text, voice, speed, pitch)[1]
+
+    def read_pcm(self, process):
+        """Yield int16 chunks from the binary's stdout until it exits"""
+        try:
+            chunk_bytes = self.chunk_samples() * 2
+            pending = b''
+            while True:
+                data = process.stdout.read1(chunk_bytes)
+                if not data:
+                    break
+                pending += data
+                usable = len(pending) - len(pending) % 2
+                if usable:
+                    yield np.frombuffer(pending[:usable], dtype=np.int16)
+                    pending = pending[usable:]
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+
+
+class PiperEngine(ProcessEngine):
+    """piper neural TTS, used when the binary and PIPER_MODEL are present"""
+
+    name = 'piper'
+
+    def __init__(self, model=PIPER_MODEL):
+        self.binary = shutil.which('piper')
+        self.model = model
+        if self.available():
+            # Piper voices ship their sample rate in <model>.json
+            try:
+                with open(f"{model}.json", 'r', encoding='utf-8') as f:
+                    self.sample_rate = json.load(f)['audio']['sample_rate']
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def available(self):
+        return bool(self.binary and self.model and os.path.exists(self.model))
+
+    def identity(self):
+        return f"{self.name}:{os.path.abspath(self.model)}"
+
+    def command(self, text, voice, speed, pitch):
+        args = [self.binary, '--model', self.model, '--output-raw',
+                '--length_scale', f"{1.0 / max(speed, 0.1):.3f}"]
+        return args, text
+
+
+class EspeakEngine(ProcessEngine):
+    """espeak-ng (or espeak) formant synthesizer"""
+
+    name = 'espeak'
+
+    VOICES = {
+        'female-1': '+f3',
+        'female-2': '+f4',
+        'male-1': '+m3',
+        'male-2': '+m5'
+    }
+
+    def __init__(self, language=TTS_LANGUAGE):
+        self.binary = shutil.which('espeak-ng') or shutil.which('espeak')
+        self.language = language
+
+    def available(self):
+        return self.binary is not None
+
+    def identity(self):
+        return f"{self.name}:{self.language}"
+
+    def command(self, text, voice, speed, pitch):
+        variant = self.VOICES.get(voice, '+f3')
+        args = [self.binary, '--stdout', '-v', f"{self.language}{variant}",
+                '-s', str(int(175 * speed)), '-p', str(max(0, min(99, 50 + int(pitch) * 4))), text]
+        return args, None
+
+    def read_header(self, stdout):
+        # 44-byte WAV header; the sizes are unknown while streaming
+        header = stdout.read(44)
+        if len(header) == 44 and header[:4] == b'RIFF':
+            return struct.unpack('<I', header[24:28])[0]
+        return None
+
+
+class ToneEngine(TTSEngine):
+    """Deterministic tone synthesizer for tests, only used with TTS_ENGINE=tone
+
+    Each character becomes 100 ms (at speed 1.0) of sound: vowels are
+    voiced tones with two formants, consonants are short noise bursts and
+    everything else is silence, so the output has speech-like loudness
+    and identical text always produces identical samples.
+    """
+
+    name = 'tone'
+    sample_rate = 16000
+
+    BASE_PITCH = {
+        'female-1': 210.0,
+        'female-2': 240.0,
+        'male-1': 120.0,
+        'male-2': 105.0
+    }
+
+    # (F1, F2) in Hz
+    FORMANTS = {
+        'a': (800, 1200),
+        'e': (500, 1900),
+        'i': (300, 2300),
+        'o': (500, 900),
+        'u': (350, 800),
+        'y': (300, 2100)
+    }
+
+    def segment(self, char, samples, f0):
+        """Synthesize one character"""
+        t = np.arange(samples, dtype=np.float32) / self.sample_rate
+        char = char.lower()
+        if char in self.FORMANTS:
+            f1, f2 = self.FORMANTS[char]
+            wave = (0.5 * np.sin(2 * np.pi * f0 * t) +
+                    0.3 * np.sin(2 * np.pi * f1 * t) +
+                    0.2 * np.sin(2 * np.pi * f2 * t))
+            gain = 0.6
+        elif char.isalpha():
+            rng = np.random.default_rng(ord(char))
+            wave = rng.uniform(-1.0, 1.0, samples).astype(np.float32)
+            # Voiced consonants get a hum under the noise
+            if char in 'bdgjlmnrvwz':
+                wave = 0.4 * wave + 0.6 * np.sin(2 * np.pi * f0 * t)
+            gain = 0.2
+        else:
+            return np.zeros(samples, dtype=np.int16)
+
+        # 5 ms ramps avoid clicks between characters
+        ramp = min(samples // 2, self.sample_rate // 200)
+        envelope = np.ones(samples, dtype=np.float32)
+        if ramp:
+            envelope[:ramp] = np.linspace(0.0, 1.0, ramp)
+            envelope[-ramp:] = np.linspace(1.0, 0.0, ramp)
+        return (wave * envelope * gain * 32767).astype(np.int16)
+
+    def stream(self, text, voice='female-1', speed=1.0, pitch=0):
+        f0 = self.BASE_PITCH.get(voice, 210.0) * 2 ** (int(pitch) / 12.0)
+        samples = int(self.sample_rate * 0.1 / max(speed, 0.1))
+        chunk = self.chunk_samples()
+        pending = np.zeros(0, dtype=np.int16)
+        for char in text:
+            pending = np.concatenate([pending, self.segment(char, samples, f0)])
+            while len(pending) >= chunk:
+                yield pending[:chunk]
+                pending = pending[chunk:]
+        if len(pending):
+            yield pending
+
+
+ENGINES = {
+    'piper': PiperEngine(),
+    'espeak': EspeakEngine(),
+    'tone': ToneEngine()
+}
+
+_selected = None
+_checked = False
+_selected_lock = threading.Lock()
+
+
+def select_tts_engine(engine=None):
+    """Pick the TTS backend: an explicit one, or the best installed one
+
+    Returns None when no speech engine is installed; speech then plays
+    from the text timeline without audio.
+    """
+    global _selected, _checked
+    engine = engine or TTS_ENGINE
+    with _selected_lock:
+        backend = ENGINES.get(engine)
+        if backend is not None and backend.available():
+            _selected = backend
+        else:
+            if engine != 'auto':
+                print(f"⚠️ TTS engine '{engine}' not available, picking one instead")
+            _selected = next((ENGINES[name] for name in ENGINE_ORDER if ENGINES[name].available()), None)
+        _checked = True
+        if _selected is None:
+            print("⚠️ TTS engine: none (install piper or espeak-ng), speech audio disabled")
+        else:
+            print(f"🗣️ TTS engine: {_selected.name}")
+        return _selected
+
+
+def get_tts_engine():
+    """Get the selected TTS backend (None without one), selecting on first use"""
+    if not _checked:
+        return select_tts_engine()
+    return _selected
+
+
+def wav_header(sample_rate, samples=None):
+    """Get a 16-bit mono WAV header; sizes are 0xFFFFFFFF while streaming"""
+    data_size = samples * 2 if samples is not None else 0xFFFFFFFF
+    riff_size = data_size + 36 if samples is not None else 0xFFFFFFFF
+    return (b'RIFF' + struct.pack('<I', riff_size) + b'WAVE' +
+            b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16) +
+            b'data' + struct.pack('<I', data_size))
+
+
+class SpeechAudio:
+    """PCM of one utterance, appended chunk by chunk as it is synthesized"""
+
+    def __init__(self, utterance_id, sample_rate):
+        self.utterance_id = utterance_id
+        self.sample_rate = sample_rate
+        self.chunks = []
+        self.samples = 0
+        self.done = False
+        self.error = None
+        self.created = time.perf_counter()
+        self.first_chunk_ms = None
+        self.cond = threading.Condition()
+        # Mouth track analyzed once here, shared by every stream showing the avatar
+        self.lipsync = None
+
+    @classmethod
+    def from_cache(cls, utterance_id, entry):
+        """Build finished audio from a cached synthesis"""
+        audio = cls(utterance_id, entry['sample_rate'])
+        audio.chunks = [entry['pcm']]
+        audio.samples = len(entry['pcm'])
+        audio.lipsync = LipSyncTrack.from_arrays(entry['sample_rate'], entry['mouth_open'], entry['visemes'])
+        audio.first_chunk_ms = 0.0
+        audio.done = True
+        return audio
+
+    def to_cache(self):
+        """Get a cache entry for finished audio, or None if it can't be cached"""
+        if not self.done or self.error or not self.samples or self.lipsync is None:
+            return None
+        frames = self.lipsync.arrays()
+        if frames is None:
+            return None
+        return {
+            'pcm': self.pcm(),
+            'sample_rate': self.sample_rate,
+            'mouth_open': frames[0],
+            'visemes': frames[1],
+            'duration': self.duration()
+        }
+
+    def append(self, chunk):
+        if self.lipsync is None:
+            self.lipsync = LipSyncTrack(self.sample_rate)
+        self.lipsync.feed(chunk)
+        with self.cond:
+            if self.first_chunk_ms is None:
+                self.first_chunk_ms = round((time.perf_counter() - self.created) * 1000, 1)
+            self.chunks.append(chunk)
+            self.samples += len(chunk)
+            self.cond.notify_all()
+
+    def finish(self, error=None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+
+    def duration(self):
+        """Get seconds of audio synthesized so far"""
+        return self.samples / self.sample_rate
+
+    def read(self, timeout=10.0):
+        """Yield chunks as they arrive until synthesis finishes"""
+        index = 0
+        while True:
+            with self.cond:
+                while index >= len(self.chunks) and not self.done:
+                    if not self.cond.wait(timeout):
+                        return
+                chunks = self.chunks[index:]
+                done = self.done
+            for chunk in chunks:
+                yield chunk
+            index += len(chunks)
+            if done and index >= len(self.chunks):
+                return
+
+    def pcm(self):
+        """Get all audio synthesized so far as one int16 array"""
+        with self.cond:
+            chunks = list(self.chunks)
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int16)
+
+
+class TTSCache:
+    """Synthesized utterances keyed by engine, text, voice, speed and pitch
+
+    Entries hold the PCM, the lip-sync frames and the duration. Recent
+    entries stay in an in-memory LRU; every entry is also saved as
+    <hash>.npz under the cache directory, which is pruned oldest first
+    past max_disk_mb. Pinned entries (catalog pack scripts, memory-mapped)
+    are looked up first and never evicted.
+    """
+
+    def __init__(self, root=None, max_entries=TTS_CACHE_ENTRIES, max_disk_mb=TTS_CACHE_DISK_MB):
+        self.root = root
+        self.memory = LRUCache(max_entries)
+        self.pinned = {}
+        self.pinned_hits = 0
+        self.max_disk_bytes = int(max_disk_mb * 1024 * 1024)
+        self.disk_hits = 0
+        self.lock = threading.Lock()
+
+    def set_root(self, root):
+        """Set the directory for the on-disk tier"""
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, engine, text, voice, speed, pitch):
+        digest = hashlib.sha1(repr((engine, text, voice, float(speed), int(pitch))).encode('utf-8'))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, f"{key}.npz")
+
+    def pin(self, key, entry):
+        """Keep an entry outside the LRU until the process exits"""
+        self.pinned[key] = entry
+
+    def get(self, key):
+        """Get a cache entry from pinned entries, memory, then disk; None on a miss"""
+        entry = self.pinned.get(key)
+        if entry is not None:
+            self.pinned_hits += 1
+            return entry
+        entry = self.memory.get(key)
+        if entry is not None or not self.root:
+            return entry
+        try:
+            with np.load(self.path(key), allow_pickle=False) as data:
+                entry = {
+                    'pcm': data['pcm'],
+                    'sample_rate': int(data['sample_rate']),
+                    'mouth_open': data['mouth_open'],
+                    'visemes': data['visemes'],
+                    'duration': float(data['duration'])
+                }
+        except (OSError, ValueError, KeyError):
+            return None
+        self.disk_hits += 1
+        self.memory.put(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        """Store an entry in memory and on disk"""
+        self.memory.put(key, entry)
+        if not self.root:
+            return
+        try:
+            tmp_path = f"{self.path(key)}.{os.getpid()}.tmp.npz"
+            np.savez(tmp_path, **entry)
+            os.replace(tmp_path, self.path(key))
+            self.prune()
+        except OSError as e:
+            print(f"⚠️ Could not write TTS cache: {e}")
+
+    def prune(self):
+        """Delete the oldest files once the directory is over its size limit"""
+        with self.lock:
+            files = []
+            for name in os.listdir(self.root):
+                if name.endswith('.npz') and '.tmp' not in name:
+                    stat = os.stat(os.path.join(self.root, name))
+                    files.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in files)
+            for _, size, name in sorted(files):
+                if total <= self.max_disk_bytes:
+                    break
+                os.remove(os.path.join(self.root, name))
+                total -= size
+
+    def stats(self):
+        return dict(self.memory.stats(), disk_hits=self.disk_hits, pinned=len(self.pinned),
+                    pinned_hits=self.pinned_hits, root=self.root)
+
+
+class TTSService:
+    """Synthesize queued utterances on one background thread
+
+    Utterances are synthesized in priority order as soon as they are
+    submitted, so audio is ready (or streaming) when the speech scheduler
+    starts them. Cancelled utterances stop between chunks.
+    """
+
+    def __init__(self, engine=None, cache=None):
+        self.engine = engine
+        self.cache = cache or TTSCache()
+        self.jobs = []
+        self.audio = OrderedDict()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.synthesized = 0
+        self.failures = 0
+
+    def submit(self, utterance):
+        """Queue an utterance for synthesis; returns its SpeechAudio, or None without an engine"""
+        engine = self.engine or get_tts_engine()
+        if engine is None:
+            return None
+        key = self.cache.key(engine.identity(), utterance.text, utterance.voice, utterance.speed, utterance.pitch)
+        entry = self.cache.get(key)
+        if entry is not None:
+            # Repeated lines (greetings, gift thanks, product scripts) skip synthesis
+            audio = SpeechAudio.from_cache(utterance.id, entry)
+            utterance.audio = audio
+            utterance.set_duration(entry['duration'])
+            with self.lock:
+                self.remember(audio)
+            return audio
+
+        audio = SpeechAudio(utterance.id, engine.sample_rate)
+        utterance.audio = audio
+        with self.lock:
+            heapq.heappush(self.jobs, (utterance.priority, utterance.id, utterance, engine, key))
+            self.remember(audio)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        self.wake.set()
+        return audio
+
+    def remember(self, audio):
+        self.audio[audio.utterance_id] = audio
+        while len(self.audio) > RECENT_AUDIO:
+            self.audio.popitem(last=False)
+
+    def get(self, utterance_id):
+        """Get audio of a recent utterance, or None"""
+        return self.audio.get(utterance_id)
+
+    def run(self):
+        while True:
+            self.wake.wait()
+            with self.lock:
+                if not self.jobs:
+                    self.wake.clear()
+                    continue
+                _, _, utterance, engine, key = heapq.heappop(self.jobs)
+            self.synthesize(utterance, engine, key)
+
+    def synthesize(self, utterance, engine, key=None):
+        """Stream one utterance's PCM into its SpeechAudio"""
+        audio = utterance.audio
+        try:
+            sample_rate, chunks = engine.synthesize(utterance.text, utterance.voice, utterance.speed, utterance.pitch)
+            # espeak reports its real sample rate in the stream header
+            audio.sample_rate = sample_rate
+            for chunk in chunks:
+                if utterance.cancelled:
+                    break
+                audio.append(chunk)
+            audio.finish()
+            self.synthesized += 1
+        except Exception as e:
+            print(f"❌ TTS {engine.name} failed: {e}")
+            audio.finish(str(e))
+            self.failures += 1
+            return
+        if not utterance.cancelled and audio.samples:
+            # Real audio length replaces the text-length estimate
+            utterance.set_duration(audio.duration())
+            entry = audio.to_cache()
+            if key is not None and entry is not None:
+                self.cache.put(key, entry)
+
+    def report(self):
+        """Get engine and synthesis counters"""
+        recent = [audio.first_chunk_ms for audio in list(self.audio.values()) if audio.first_chunk_ms is not None]
+        engine = self.engine or get_tts_engine()
+        return {
+            'engine': engine.name if engine is not None else 'none',
+            'available': [name for name, backend in ENGINES.items() if backend.available()],
+            'queued': len(self.jobs),
+            'synthesized': self.synthesized,
+            'failures': self.failures,
+            'first_chunk_ms': round(sum(recent) / len(recent), 1) if recent else None,
+            'cache': self.cache.stats()
+        }
+
+
+# Shared synthesis thread for every avatar in the process
+tts_service = TTSService()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Avatar Visemes
+Text to viseme timelines and a per-avatar atlas of pre-rendered mouth shapes
+"""
+
+import threading
+
+import cv2
+import numpy as np
+
+# Mouth shapes: (mouth_open 0..1, width factor)
+VISEMES = {
+    'rest': (0.0, 1.0),
+    'mbp': (0.0, 0.94),
+    'fv': (0.15, 1.0),
+    'consonant': (0.3, 1.0),
+    'ee': (0.35, 1.15),
+    'aa': (0.85, 1.05),
+    'oh': (0.6, 0.85),
+    'oo': (0.35, 0.75)
+}
+VISEME_NAMES = list(VISEMES)
+VISEME_IDS = {name: index for index, name in enumerate(VISEME_NAMES)}
+REST = VISEME_IDS['rest']
+
+# Letters that have their own mouth shape; other letters are 'consonant'
+LETTER_VISEMES = {
+    'a': 'aa', 'e': 'ee', 'i': 'ee', 'y': 'ee',
+    'o': 'oh', 'u': 'oo', 'w': 'oo', 'q': 'oo',
+    'm': 'mbp', 'b': 'mbp', 'p': 'mbp',
+    'f': 'fv', 'v': 'fv'
+}
+
+
+def char_viseme(char):
+    """Get viseme id for one character"""
+    char = char.lower()
+    if char in LETTER_VISEMES:
+        return VISEME_IDS[LETTER_VISEMES[char]]
+    if char.isalpha():
+        return VISEME_IDS['consonant']
+    return REST
+
+
+def viseme_open(viseme):
+    """Get mouth opening (0..1) of a viseme id"""
+    return VISEMES[VISEME_NAMES[viseme]][0]
+
+
+class VisemeTimeline:
+    """Viseme ids over the duration of one utterance
+
+    Built once per text; lookups are a binary search on start times.
+    """
+
+    def __init__(self, text, duration):
+        self.text = text
+        self.duration = max(duration, 1e-3)
+
+        ids = [char_viseme(char) for char in text] or [REST]
+        step = self.duration / len(ids)
+        # Merge runs of the same shape
+        starts, merged = [], []
+        for index, viseme in enumerate(ids):
+            if not merged or merged[-1] != viseme:
+                starts.append(index * step)
+                merged.append(viseme)
+        self.starts = np.array(starts, dtype=np.float64)
+        self.ids = np.array(merged, dtype=np.int32)
+
+    def at(self, elapsed, loop=False):
+        """Get viseme id at elapsed seconds (rest once finished unless looping)"""
+        if loop:
+            elapsed %= self.duration
+        elif elapsed >= self.duration or elapsed < 0:
+            return REST
+        index = int(np.searchsorted(self.starts, elapsed, side='right')) - 1
+        return int(self.ids[max(0, index)])
+
+    def progress(self, elapsed):
+        """Get fraction of the utterance spoken"""
+        return min(1.0, max(0.0, elapsed / self.duration))
+
+
+class VisemeAtlas:
+    """Mouth shapes pre-rendered once per avatar and face size
+
+    Each entry is a small BGR patch over the mouth region blended through
+    the region's feathered mask, so drawing a viseme is a table lookup
+    plus one alpha blend.
+    """
+
+    def __init__(self, face_pyramid, animator):
+        self.face_pyramid = face_pyramid
+        self.animator = animator
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def build(self, size):
+        """Render every viseme for one face size"""
+        region = self.animator.geometry(size).get('mouth')
+        if region is None:
+            return None
+        base = self.face_pyramid.get(size)
+        x0, y0, x1, y1 = region.roi
+        patches = []
+        for name in VISEME_NAMES:
+            mouth_open, width = VISEMES[name]
+            canvas = np.array(base[y0:y1, x0:x1])
+            local = RegionAt(region, (-x0, -y0))
+            self.animator.warp_mouth(canvas, local, mouth_open, width, blend=False)
+            canvas.flags.writeable = False
+            patches.append(canvas)
+        return region, patches
+
+    def get(self, size):
+        """Get (region, patches) for a face size, building them on first use"""
+        entry = self.entries.get(size)
+        if entry is None:
+            with self.lock:
+                entry = self.entries.get(size)
+                if entry is None:
+                    entry = self.build(size)
+                    self.entries[size] = entry
+        return entry
+
+    def blit(self, face_img, viseme, transform=None):
+        """Draw a viseme onto a rendered face"""
+        entry = self.get(face_img.shape[0])
+        if entry is None:
+            return
+        region, patches = entry
+        dx, dy = self.animator.region_offset(region, transform)
+        x0, y0, x1, y1 = region.roi
+        x0, x1, y0, y1 = x0 + dx, x1 + dx, y0 + dy, y1 + dy
+        h, w = face_img.shape[:2]
+        if x0 < 0 or y0 < 0 or x1 > w or y1 > h:
+            return
+        target = face_img[y0:y1, x0:x1]
+        target[:] = cv2.blendLinear(patches[viseme], target, region.mask, region.inverse_mask)
+
+
+class RegionAt:
+    """View of a region's geometry with its ROI moved by an offset"""
+
+    def __init__(self, region, offset):
+        dx, dy = offset
+        x0, y0, x1, y1 = region.roi
+        self.roi = (x0 + dx, y0 + dy, x1 + dx, y1 + dy)
+        self.center = (region.center[0] + dx, region.center[1] + dy)
+        self.width = region.width
+        self.height = region.height
+        self.mask = region.mask
+        self.inverse_mask = region.inverse_mask
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Avatar Render Workers
+Process pool that renders streams on separate cores and hands frames
+back to the web process through shared memory
+"""
+
+import atexit
+import multiprocessing as mp
+import os
+import threading
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+from avatar_config import BASE_WIDTH, BASE_HEIGHT
+
+# Number of render processes; 0 renders in the web process as before
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', '0'))
+
+# Frame buffers per stream. A returned frame stays valid until its
+# stream has rendered FRAME_SLOTS - 1 more frames.
+FRAME_SLOTS = 3
+SLOT_BYTES = BASE_WIDTH * BASE_HEIGHT * 3
+
+
+def attach_shared_memory(name):
+    """Attach to a segment owned by the web process"""
+    shm = shared_memory.SharedMemory(name=name)
+    # Keep this process's resource tracker from unlinking it on exit
+    try:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+    return shm
+
+
+# Segments of closed streams whose frames were still being read, retried
+# every RETIRE_RETRY seconds until the last view is gone
+_retired = []
+_retired_lock = threading.Lock()
+_retry_timer = None
+RETIRE_RETRY = 1.0
+
+
+def close_retired():
+    """Close retired segments once no frame views point into them"""
+    global _retry_timer
+    with _retired_lock:
+        for shm in list(_retired):
+            try:
+                shm.close()
+            except BufferError:
+                continue
+            _retired.remove(shm)
+        if _retired and _retry_timer is None:
+            _retry_timer = threading.Timer(RETIRE_RETRY, retry_retired)
+            _retry_timer.daemon = True
+            _retry_timer.start()
+
+
+def retry_retired():
+    global _retry_timer
+    with _retired_lock:
+        _retry_timer = None
+    close_retired()
+
+
+def worker_main(conn, avatar_fn, render_fn):
+    """Render loop of a worker process
+
+    Keeps one avatar per owned stream, renders on request and writes
+    the frame into the stream's shared buffer slot.
+    """
+    avatars = {}
+    buffers = {}
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        command = message[0]
+        if command == 'render':
+            _, stream_id, avatar_type, params, shm_name, slot = message
+            try:
+                entry = avatars.get(stream_id)
+                if entry is None or entry[0] != avatar_type:
+                    entry = (avatar_type, avatar_fn(avatar_type))
+                    avatars[stream_id] = entry
+
+                frame = render_fn(entry[1], params)
+                if frame is None:
+                    conn.send(('gone',))
+                    continue
+                if frame.nbytes > SLOT_BYTES:
+                    raise ValueError(f"frame {frame.shape} larger than shared slot")
+
+                shm = buffers.get(shm_name)
+                if shm is None:
+                    shm = buffers[shm_name] = attach_shared_memory(shm_name)
+                view = np.ndarray(frame.shape, np.uint8, buffer=shm.buf, offset=slot * SLOT_BYTES)
+                np.copyto(view, frame)
+                del view
+                conn.send(('ok', frame.shape))
+            except Exception as e:
+                conn.send(('error', str(e)))
+
+        elif command == 'close':
+            _, stream_id, shm_name = message
+            avatars.pop(stream_id, None)
+            shm = buffers.pop(shm_name, None)
+            if shm is not None:
+                shm.close()
+
+        elif command == 'stop':
+            break
+
+    for shm in buffers.values():
+        shm.close()
+
+
+class StreamSlots:
+    """Shared frame buffers for one stream, owned by the web process"""
+
+    def __init__(self, worker):
+        self.worker = worker
+        self.shm = shared_memory.SharedMemory(create=True, size=FRAME_SLOTS * SLOT_BYTES)
+        self.next_slot = 0
+
+    def take_slot(self):
+        """Get the next buffer slot to render into"""
+        slot = self.next_slot
+        self.next_slot = (slot + 1) % FRAME_SLOTS
+        return slot
+
+    def frame(self, shape, slot):
+        """Get a zero-copy view of a rendered frame"""
+        # frombuffer holds a buffer export, so the segment can't be unmapped under the view
+        count = int(np.prod(shape))
+        return np.frombuffer(self.shm.buf, np.uint8, count, slot * SLOT_BYTES).reshape(shape)
+
+    def release(self):
+        """Free the segment; it is unmapped once views still in use are gone"""
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        with _retired_lock:
+            _retired.append(self.shm)
+        close_retired()
+
+
+class RenderWorker:
+    """Handle on one worker process"""
+
+    def __init__(self, context, index, avatar_fn, render_fn):
+        self.context = context
+        self.index = index
+        self.avatar_fn = avatar_fn
+        self.render_fn = render_fn
+        self.streams = set()
+        self.lock = threading.Lock()
+        self.conn = None
+        self.process = None
+
+    def start(self):
+        """Start the worker process"""
+        self.conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(
+            target=worker_main,
+            args=(child_conn, self.avatar_fn, self.render_fn),
+            name=f'avatar-render-{self.index}',
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def request(self, message):
+        """Send a command and wait for its reply"""
+        with self.lock:
+            try:
+                self.conn.send(message)
+                return self.conn.recv()
+            except (EOFError, OSError):
+                # Worker died; a fresh one rebuilds its avatars on demand
+                print(f"⚠️ Render worker {self.index} died, restarting")
+                self.start()
+                raise RuntimeError(f"render worker {self.index} restarted")
+
+    def send(self, message):
+        """Send a command without waiting for a reply"""
+        with self.lock:
+            try:
+                self.conn.send(message)
+            except (EOFError, OSError):
+                pass
+
+    def stop(self):
+        """Ask the worker to exit"""
+        self.send(('stop',))
+        if self.process is not None:
+            self.process.join(timeout=2.0)
+            if self.process.is_alive():
+                self.process.terminate()
+
+
+class RenderPool:
+    """Spread stream rendering over worker processes
+
+    avatar_fn(avatar_type) builds an avatar inside a worker and
+    render_fn(avatar, params) renders one BGR frame from it. Each stream
+    is pinned to the least busy worker on first use.
+    """
+
+    def __init__(self, avatar_fn, render_fn, workers=RENDER_WORKERS):
+        self.avatar_fn = avatar_fn
+        self.render_fn = render_fn
+        self.worker_count = max(0, workers)
+        self.workers = []
+        self.slots = {}
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.worker_count > 0
+
+    def start(self):
+        """Start worker processes (call before serving requests)"""
+        if not self.enabled or self.workers:
+            return
+        # Fork shares the already-loaded modules and assets with workers
+        if 'fork' in mp.get_all_start_methods():
+            context = mp.get_context('fork')
+        else:
+            context = mp.get_context()
+
+        for index in range(self.worker_count):
+            worker = RenderWorker(context, index, self.avatar_fn, self.render_fn)
+            worker.start()
+            self.workers.append(worker)
+        atexit.register(self.stop)
+        print(f"🧵 Render workers: {self.worker_count} processes")
+
+    def assign(self, stream_id):
+        """Get shared buffers for a stream, pinning it to a worker"""
+        with self.lock:
+            slots = self.slots.get(stream_id)
+            if slots is None:
+                worker = min(self.workers, key=lambda w: len(w.streams))
+                slots = StreamSlots(worker)
+                worker.streams.add(stream_id)
+                self.slots[stream_id] = slots
+            return slots
+
+    def render(self, stream_id, avatar_type, params):
+        """Render a frame in the stream's worker; returns a shared-memory view"""
+        # Segments of stopped streams whose last frames have been let go since
+        if _retired:
+            close_retired()
+        slots = self.assign(stream_id)
+        slot = slots.take_slot()
+        reply = slots.worker.request(('render', stream_id, avatar_type, params, slots.shm.name, slot))
+
+        status = reply[0]
+        if status == 'gone':
+            return None
+        if status == 'error':
+            raise RuntimeError(reply[1])
+        return slots.frame(reply[1], slot)
+
+    def close(self, stream_id):
+        """Drop a stream's worker state and shared buffers"""
+        with self.lock:
+            slots = self.slots.pop(stream_id, None)
+        if slots is None:
+            return
+        slots.worker.streams.discard(stream_id)
+        slots.worker.send(('close', stream_id, slots.shm.name))
+        slots.release()
+
+    def stop(self):
+        """Stop all workers and free shared buffers"""
+        for stream_id in list(self.slots):
+            self.close(stream_id)
+        for worker in self.workers:
+            worker.stop()
+        self.workers = []
+
+    def report(self):
+        """Get worker and stream assignment summary"""
+        return {
+            'workers': len(self.workers),
+            'streams': {worker.index: sorted(worker.streams) for worker in self.workers}
+        }
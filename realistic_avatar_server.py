@@ -4,26 +4,47 @@ Realistic Human Avatar Server - Using Real Photos
 Menggunakan foto orang asli untuk avatar yang realistis
 """
 
-from flask import Flask, request, jsonify
+# Startup timing starts before the heavy imports below
+from avatar_startup import startup
+
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, join_room, leave_room
 import cv2
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 import os
 import json
 import time
-import requests
 from io import BytesIO
 import base64
 from dotenv import load_dotenv
 
+from avatar_assets import FacePyramid, face_size_for_height, face_assets
+from avatar_delta import DeltaCanvas, FULL_DRAW
+from avatar_config import step_down_quality
+from avatar_layout import quality_layout, frame_layout, face_layout
+from avatar_models import AvatarModel, ModelRegistry
+from avatar_encoder import select_encoder, encoder_report
+from avatar_transform import AffineTransform, DEFAULT_QUALITY
+from avatar_speech import SpeechScheduler, DEFAULT_PRIORITY
+from avatar_tts import tts_service, select_tts_engine, get_tts_engine, wav_header
+from avatar_catalog import catalogs, ensure_pack, pack_path
+from avatar_metrics import metrics, stream_gauges
+from avatar_governor import apply_render_hints
+from avatar_streaming import FrameHub, frame_room, encode_jpeg, MJPEG_MIMETYPE, DEFAULT_PARAMS
+from avatar_workers import RenderPool
+
+startup.mark('imports')
+
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Real threads: render loops, render-pool pipes and TTS waits block, which
+# would stall every greenlet if eventlet (in requirements.txt) were picked
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 
 # Configuration
 PORT = int(os.getenv('PYTHON_PORT', 5000))
@@ -34,9 +55,15 @@ TEMP_DIR = 'temp'
 os.makedirs(AVATAR_DIR, exist_ok=True)
 os.makedirs(TEMP_DIR, exist_ok=True)
 
+# Synthesized speech is cached on disk under TEMP_DIR
+tts_service.cache.set_root(os.path.join(TEMP_DIR, 'tts'))
+
 # Store active sessions
 active_sessions = {}
 
+# Face assets per avatar type, shared by all streams
+model_registry = ModelRegistry()
+
 class RealisticAvatar:
     """Realistic Human Avatar using real photos"""
     
@@ -44,39 +71,48 @@ class RealisticAvatar:
         self.avatar_type = avatar_type
         self.current_frame = None
         self.is_speaking = False
+        self.mouth_open = 0.0
+        # Utterances play one at a time; is_speaking and mouth_open follow them each frame
+        self.speech = SpeechScheduler()
         self.face_image = None
+        self.face_pyramid = None
+        self.warp_quality = DEFAULT_QUALITY
+        # Gradient animation rate, lowered by the frame governor (None = every frame)
+        self.background_fps = None
+        # Reused frame buffers; only the face and changed overlays are redrawn
+        self.canvas = DeltaCanvas()
+        # Heavy assets are loaded once per avatar type and shared read-only
+        self.model = model_registry.get(avatar_type, self.load_model)
+        self.face_image = self.model.face_image
+        self.face_pyramid = self.model.face_pyramid
+        
+    def load_model(self):
+        """Load assets shared by every stream of this avatar type"""
         self.load_realistic_avatar()
-        
+        return AvatarModel(self.avatar_type, self.face_image, self.face_pyramid)
+    
     def load_realistic_avatar(self):
-        """Load realistic human avatar from real photos"""
-        try:
-            # Download realistic human photos from Pravatar (free service)
-            if self.avatar_type == 'female':
-                # Professional female avatar
-                avatar_url = "https://i.pravatar.cc/400?img=5"  # Professional woman
-            elif self.avatar_type == 'male':
-                # Professional male avatar  
-                avatar_url = "https://i.pravatar.cc/400?img=12"  # Professional man
-            else:
-                # Default professional woman
-                avatar_url = "https://i.pravatar.cc/400?img=1"
-            
-            # Download image
-            response = requests.get(avatar_url, timeout=10)
-            if response.status_code == 200:
-                # Convert to OpenCV format
-                img_array = np.array(bytearray(response.content), dtype=np.uint8)
-                self.face_image = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-                
-                # Resize to standard size
-                self.face_image = cv2.resize(self.face_image, (400, 400))
-                print(f"✅ Loaded realistic {self.avatar_type} avatar from {avatar_url}")
-            else:
-                self.create_fallback_avatar()
-                
-        except Exception as e:
-            print(f"❌ Error loading realistic avatar: {e}")
-            self.create_fallback_avatar()
+        """Load realistic human avatar from the asset cache, downloading it on first use"""
+        # Realistic human photos from Pravatar (free service)
+        if self.avatar_type == 'female':
+            # Professional female avatar
+            avatar_url = "https://i.pravatar.cc/400?img=5"  # Professional woman
+        elif self.avatar_type == 'male':
+            # Professional male avatar  
+            avatar_url = "https://i.pravatar.cc/400?img=12"  # Professional man
+        else:
+            # Default professional woman
+            avatar_url = "https://i.pravatar.cc/400?img=1"
+        
+        # Decoded, pre-scaled face from disk; the network is only hit on a cold cache
+        asset = face_assets.load(self.avatar_type, avatar_url)
+        if asset is not None:
+            self.face_image, self.face_pyramid = asset
+            return
+        
+        self.create_fallback_avatar()
+        # Pre-scale face once for every portrait size
+        self.face_pyramid = FacePyramid(self.face_image)
     
     def create_fallback_avatar(self):
         """Create fallback realistic avatar if download fails"""
@@ -117,144 +153,153 @@ class RealisticAvatar:
         self.face_image = img
         print("✅ Created fallback realistic avatar")
     
-    def create_portrait_frame(self, gesture_intensity=50):
+    def create_portrait_frame(self, gesture_intensity=50, quality=None):
         """Create portrait frame with realistic human avatar"""
         # Portrait dimensions for TikTok (9:16)
-        frame = np.zeros((1920, 1080, 3), dtype=np.uint8)
-        
         # Animated gradient background
         t = time.time()
-        for i in range(1920):
-            color_r = int(40 + abs(np.sin((i + t * 20) / 200)) * 60)
-            color_g = int(50 + abs(np.sin((i + t * 20 + 120) / 200)) * 70)
-            color_b = int(80 + abs(np.sin((i + t * 20 + 240) / 200)) * 80)
-            frame[i, :] = [color_b, color_g, color_r]
+        layout = quality_layout(quality)
+        timer = metrics.timer()
+        delta = self.canvas.begin(layout.width, layout.height, t, self.background_fps)
+        frame = delta.buffer
+        timer.lap('background')
         
         if self.face_image is not None:
-            # Resize face to fit portrait
-            face_resized = cv2.resize(self.face_image, (600, 600))
-            
-            # Apply gesture animation
-            face_animated = self.apply_gesture_to_face(face_resized, gesture_intensity)
+            # Pre-scaled face to fit portrait
+            face_resized = self.face_pyramid.get(face_size_for_height(layout.height))
             
             # Position face in center of portrait
-            y_offset = 300
-            x_offset = 240
+            h, w = face_resized.shape[:2]
+            y_offset = layout.y(300)
+            x_offset = (layout.width - w) // 2
+            face_roi = frame[y_offset:y_offset+h, x_offset:x_offset+w]
             
-            # Blend face onto background
-            h, w = face_animated.shape[:2]
-            frame[y_offset:y_offset+h, x_offset:x_offset+w] = face_animated
+            # Apply gesture animation straight into the face region
+            face_animated = self.apply_gesture_to_face(face_resized, gesture_intensity, out=face_roi)
+            if face_animated is not face_roi:
+                face_roi[:] = face_animated
+            timer.lap('face_warp')
             
             # Add professional clothing/body
-            self.add_professional_body(frame, x_offset, y_offset + h)
+            self.add_professional_body(frame, x_offset, y_offset + h, delta)
         
         # Add UI overlays
-        self.add_ui_overlays(frame, gesture_intensity)
+        self.add_ui_overlays(frame, gesture_intensity, delta)
+        timer.lap('overlays')
         
         return frame
     
-    def apply_gesture_to_face(self, face_img, intensity):
-        """Apply realistic gestures to face"""
+    def apply_gesture_to_face(self, face_img, intensity, out=None):
+        """Apply realistic gestures to face, warping into out when given"""
         t = time.time()
         intensity_factor = intensity / 100.0
         
+        h, w = face_img.shape[:2]
+        center = (w//2, h//2)
+        
+        # Head tilt and breathing share one warp
+        transform = AffineTransform()
+        
         # Slight head tilt
         if intensity > 20:
             angle = np.sin(t * 1.5) * (intensity_factor * 2)
-            center = (face_img.shape[1]//2, face_img.shape[0]//2)
-            M = cv2.getRotationMatrix2D(center, angle, 1.0)
-            face_img = cv2.warpAffine(face_img, M, (face_img.shape[1], face_img.shape[0]))
-        
-        # Speaking animation
-        if self.is_speaking and intensity > 30:
-            mouth_open = abs(np.sin(t * 8)) * intensity_factor
-            if mouth_open > 0.5:
-                # Draw open mouth
-                mouth_y = face_img.shape[0] - 80
-                cv2.ellipse(face_img, (face_img.shape[1]//2, mouth_y), 
-                          (int(30 + mouth_open * 20), int(15 + mouth_open * 10)), 
-                          0, 0, 180, (100, 50, 50), -1)
+            transform.rotate(center, angle)
         
         # Breathing effect
         if intensity > 10:
             scale = 1.0 + np.sin(t * 0.8) * 0.01 * intensity_factor
-            h, w = face_img.shape[:2]
-            M = cv2.getRotationMatrix2D((w//2, h//2), 0, scale)
-            face_img = cv2.warpAffine(face_img, M, (w, h))
+            transform.scale(center, scale)
+        
+        fl = face_layout(face_img)
+        face_img = transform.warp(face_img, self.warp_quality, dst=out)
+        
+        # Speaking animation - mouth follows the speech audio
+        if self.is_speaking:
+            mouth_open = self.mouth_open
+            if mouth_open > 0.15:
+                # Draw open mouth
+                mouth_y = face_img.shape[0] - fl.size(80)
+                cv2.ellipse(face_img, (face_img.shape[1]//2, mouth_y), 
+                          (fl.size(30 + mouth_open * 20), fl.size(8 + mouth_open * 17)), 
+                          0, 0, 180, (100, 50, 50), -1)
         
         # Blinking
         if int(t * 3) % 10 == 0 and (t % 1) < 0.15:
-            eye_y = face_img.shape[0] - 220
-            cv2.line(face_img, (face_img.shape[1]//2 - 50, eye_y), 
-                    (face_img.shape[1]//2 - 20, eye_y), (220, 190, 170), 3)
-            cv2.line(face_img, (face_img.shape[1]//2 + 20, eye_y), 
-                    (face_img.shape[1]//2 + 50, eye_y), (220, 190, 170), 3)
+            eye_y = face_img.shape[0] - fl.size(220)
+            cv2.line(face_img, (face_img.shape[1]//2 - fl.size(50), eye_y), 
+                    (face_img.shape[1]//2 - fl.size(20), eye_y), (220, 190, 170), fl.thickness(3))
+            cv2.line(face_img, (face_img.shape[1]//2 + fl.size(20), eye_y), 
+                    (face_img.shape[1]//2 + fl.size(50), eye_y), (220, 190, 170), fl.thickness(3))
         
         return face_img
     
-    def add_professional_body(self, frame, x_offset, y_start):
-        """Add professional clothing/body to avatar"""
+    def add_professional_body(self, frame, x_offset, y_start, delta=FULL_DRAW):
+        """Add professional clothing/body to avatar, unless the frame still shows it"""
+        layout = frame_layout(frame)
+        body_rect = (x_offset + layout.size(100), y_start, x_offset + layout.size(500), y_start + layout.size(400))
+        if not delta.dirty('body', body_rect, (x_offset, y_start), restore=False):
+            return
+        
         # Neck
         neck_color = (200, 170, 150)
-        cv2.rectangle(frame, (x_offset + 200, y_start), (x_offset + 400, y_start + 100), neck_color, -1)
+        cv2.rectangle(frame, (x_offset + layout.size(200), y_start), (x_offset + layout.size(400), y_start + layout.size(100)), neck_color, -1)
         
         # Professional clothing
         clothing_color = (30, 30, 50)  # Dark professional
-        cv2.rectangle(frame, (x_offset + 100, y_start + 100), (x_offset + 500, y_start + 400), clothing_color, -1)
+        cv2.rectangle(frame, (x_offset + layout.size(100), y_start + layout.size(100)), (x_offset + layout.size(500), y_start + layout.size(400)), clothing_color, -1)
         
         # Shoulders
-        cv2.ellipse(frame, (x_offset + 300, y_start + 100), (200, 80), 0, 0, 180, clothing_color, -1)
+        cv2.ellipse(frame, (x_offset + layout.size(300), y_start + layout.size(100)), layout.axes(200, 80), 0, 0, 180, clothing_color, -1)
     
-    def add_ui_overlays(self, frame, gesture_intensity):
-        """Add UI overlays to frame"""
-        # Top status bar
-        cv2.rectangle(frame, (0, 0), (1080, 80), (0, 0, 0), -1)
-        cv2.rectangle(frame, (0, 0), (1080, 80), (37, 244, 238), 2)
-        
-        # Status text
-        status_text = f"REALISTIC AVATAR | {self.avatar_type.upper()} | Gesture: {gesture_intensity}%"
-        cv2.putText(frame, status_text, (30, 50), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (37, 244, 238), 2)
-        
-        # Speaking indicator
-        if self.is_speaking:
-            cv2.circle(frame, (1020, 40), 20, (0, 255, 0), -1)
-            cv2.putText(frame, "SPEAKING", (900, 50), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-        else:
-            cv2.circle(frame, (1020, 40), 20, (100, 100, 100), -1)
+    def add_ui_overlays(self, frame, gesture_intensity, delta=FULL_DRAW):
+        """Add UI overlays to frame, skipping the ones the frame still shows"""
+        layout = frame_layout(frame)
+        
+        # Top status bar, redrawn when its text changes (the filled bar covers the old one)
+        if delta.dirty('status', layout.roi(0, 0, 1080, 82), (gesture_intensity, self.is_speaking), restore=False):
+            cv2.rectangle(frame, (0, 0), layout.pt(1080, 80), (0, 0, 0), -1)
+            cv2.rectangle(frame, (0, 0), layout.pt(1080, 80), (37, 244, 238), layout.thickness(2))
+            
+            # Status text
+            status_text = f"REALISTIC AVATAR | {self.avatar_type.upper()} | Gesture: {gesture_intensity}%"
+            cv2.putText(frame, status_text, layout.pt(30, 50), 
+                       cv2.FONT_HERSHEY_SIMPLEX, layout.font(0.8), (37, 244, 238), layout.thickness(2))
+            
+            # Speaking indicator
+            if self.is_speaking:
+                cv2.circle(frame, layout.pt(1020, 40), layout.size(20), (0, 255, 0), -1)
+                cv2.putText(frame, "SPEAKING", layout.pt(900, 50), 
+                           cv2.FONT_HERSHEY_SIMPLEX, layout.font(0.7), (0, 255, 0), layout.thickness(2))
+            else:
+                cv2.circle(frame, layout.pt(1020, 40), layout.size(20), (100, 100, 100), -1)
         
         # Bottom info
-        cv2.putText(frame, "TikTok Live Shopping - Real Human Avatar", (30, 1890), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        if delta.dirty('footer', layout.roi(0, 1865, 1080, 1905), None, restore=False):
+            cv2.putText(frame, "TikTok Live Shopping - Real Human Avatar", layout.pt(30, 1890), 
+                       cv2.FONT_HERSHEY_SIMPLEX, layout.font(0.7), (255, 255, 255), layout.thickness(2))
     
-    def speak(self, text, voice_type='female-1', speed=1.0, pitch=0):
+    def speak(self, text, voice_type='female-1', speed=1.0, pitch=0, priority=DEFAULT_PRIORITY):
         """Make avatar speak"""
-        self.is_speaking = True
-        
-        duration = len(text) / 10 * speed
+        utterance = self.speech.say(text, voice_type, speed, pitch, priority)
+        # Audio streams from the local TTS engine while the utterance plays
+        audio = tts_service.submit(utterance)
         
         print(f"🗣️ Realistic Avatar speaking: {text}")
         print(f"   Voice: {voice_type}, Speed: {speed}x, Pitch: {pitch}")
         
-        # Auto-stop speaking
-        import threading
-        def stop_speaking():
-            time.sleep(duration)
-            self.is_speaking = False
-        
-        threading.Thread(target=stop_speaking, daemon=True).start()
-        
         return {
             'success': True,
-            'duration': duration,
+            'id': utterance.id,
+            'duration': utterance.duration,
+            'starts_in': self.speech.starts_in(utterance.id),
+            'audio_url': f"/api/avatar/audio/{utterance.id}" if audio is not None else None,
             'text': text,
             'voice': voice_type
         }
     
-    def process_frame(self, gesture_intensity=50):
+    def process_frame(self, gesture_intensity=50, quality=None):
         """Process and return current frame"""
-        return self.create_portrait_frame(gesture_intensity)
+        return self.create_portrait_frame(gesture_intensity, quality)
 
 
 class StreamManager:
@@ -262,7 +307,8 @@ class StreamManager:
     
     def __init__(self):
         self.streams = {}
-        self.global_avatar = RealisticAvatar('female')
+        # Built on first use so the server can bind before loading assets
+        self.global_avatar = None
     
     def create_stream(self, socket_id, settings):
         """Create a new stream session"""
@@ -290,7 +336,9 @@ class StreamManager:
         return False
     
     def get_avatar(self):
-        """Get global avatar for preview"""
+        """Get global avatar for preview, building it on first use"""
+        if self.global_avatar is None:
+            self.global_avatar = RealisticAvatar('female')
         return self.global_avatar
     
     def change_avatar(self, avatar_type):
@@ -303,6 +351,101 @@ class StreamManager:
 stream_manager = StreamManager()
 
 
+def resolve_avatar(socket_id):
+    """Get avatar for a stream, or the global avatar for preview"""
+    if socket_id == 'avatar_stream':
+        return stream_manager.get_avatar()
+    stream = stream_manager.get_stream(socket_id)
+    if not stream:
+        return None
+    return stream['avatar']
+
+
+def parse_frame_params(source):
+    """Get animation inputs from query args or a Socket.IO payload"""
+    params = {}
+    if source.get('gesture') is not None:
+        params['gesture_intensity'] = int(source.get('gesture'))
+    if source.get('res'):
+        params['resolution'] = source.get('res')
+    return params
+
+
+def stream_quality(socket_id, params):
+    """Get resolution tier for a frame: explicit request, then stream settings"""
+    if params.get('resolution'):
+        return params['resolution']
+    stream = stream_manager.get_stream(socket_id)
+    if stream:
+        return stream['settings'].get('quality')
+    return None
+
+
+def create_worker_avatar(avatar_type):
+    """Build an avatar inside a render worker process"""
+    avatar = RealisticAvatar(avatar_type)
+    # Frames are copied into a shared slot before the next render, so one buffer will do
+    avatar.canvas = DeltaCanvas(buffers=1)
+    return avatar
+
+
+def render_worker_frame(avatar, params):
+    """Render one frame inside a render worker process"""
+    apply_render_hints(avatar, params)
+    avatar.is_speaking = params.get('is_speaking', False)
+    avatar.mouth_open = params.get('mouth_open', 0.0)
+    return avatar.process_frame(params['gesture_intensity'], quality=params.get('quality'))
+
+
+# Render worker processes, enabled with RENDER_WORKERS > 0
+render_pool = RenderPool(create_worker_avatar, render_worker_frame)
+
+
+def render_stream_frame(socket_id, params):
+    """Render one frame for a stream's render loop"""
+    avatar = resolve_avatar(socket_id)
+    if avatar is None:
+        render_pool.close(socket_id)
+        return None
+    # The frame governor can cap the stream's resolution tier
+    quality = step_down_quality(stream_quality(socket_id, params), params.get('resolution_step', 0))
+    # Speaking state and mouth come from the speech scheduler
+    avatar.is_speaking = avatar.speech.is_speaking()
+    avatar.mouth_open = avatar.speech.mouth()[0]
+    if render_pool.enabled:
+        frame = render_pool.render(socket_id, avatar.avatar_type,
+                                   dict(params, quality=quality, is_speaking=avatar.is_speaking,
+                                        mouth_open=avatar.mouth_open))
+    else:
+        apply_render_hints(avatar, params)
+        frame = avatar.process_frame(params['gesture_intensity'], quality=quality)
+    # Product card straight from the memory-mapped catalog pack
+    stream = stream_manager.get_stream(socket_id)
+    selection = stream.get('product') if stream else None
+    # The card lands in the avatar's reused buffer, which restores that area next time
+    avatar.canvas.invalidate(frame, catalogs.card_rect(frame, selection))
+    return catalogs.composite(frame, selection)
+
+
+# Render loops shared by HTTP polling and Socket.IO push
+frame_hub = FrameHub(render_stream_frame, socketio=socketio, jpeg_quality=90)
+
+
+# Queue depths and cache hit rates are read on each /api/metrics scrape
+metrics.add_collector(lambda: stream_gauges(stream_manager.streams, frame_hub, tts_service))
+
+
+def warm_up():
+    """Load the preview avatar and render a first frame once the server is up"""
+    with startup.stage('asset_load'):
+        stream_manager.get_avatar()
+    with startup.stage('first_frame'):
+        frame = render_stream_frame('avatar_stream', dict(DEFAULT_PARAMS))
+        encode_jpeg(frame, frame_hub.jpeg_quality)
+    startup.set_ready()
+    print(f"⏱️ Startup: {startup.summary()}")
+
+
 # API Routes
 
 @app.route('/api/health', methods=['GET'])
@@ -311,11 +454,23 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'active_streams': len(stream_manager.streams),
+        'startup': startup.report(),
+        'jpeg_encoder': encoder_report(),
+        'render_workers': render_pool.report(),
+        'tts': tts_service.report(),
+        'catalogs': catalogs.report(),
+        'avatar_models': model_registry.stats(),
         'version': '2.0.0',
         'avatar_type': 'realistic_human'
     })
 
 
+@app.route('/api/metrics', methods=['GET'])
+def render_metrics():
+    """Render stage histograms, per-stream frame stats and queue depths for Prometheus"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/api/stream/start', methods=['POST'])
 def start_stream():
     """Start a new stream session"""
@@ -346,6 +501,8 @@ def stop_stream():
     
     try:
         stream_manager.stop_stream(socket_id)
+        frame_hub.stop(socket_id)
+        render_pool.close(socket_id)
         
         return jsonify({
             'success': True,
@@ -358,6 +515,14 @@ def stop_stream():
         }), 500
 
 
+def find_stream_avatar(avatar_type):
+    """Get the avatar of the first active stream using an avatar type"""
+    for stream_data in stream_manager.streams.values():
+        if stream_data['avatar'].avatar_type == avatar_type:
+            return stream_data['avatar']
+    return None
+
+
 @app.route('/api/avatar/speak', methods=['POST'])
 def avatar_speak():
     """Make realistic avatar speak text"""
@@ -366,21 +531,18 @@ def avatar_speak():
     voice = data.get('voice', 'female-1')
     speed = float(data.get('speed', 1.0))
     pitch = int(data.get('pitch', 0))
+    priority = data.get('priority', DEFAULT_PRIORITY)
     avatar_type = data.get('avatar', 'female')
     
     try:
         # Find active stream with this avatar
-        avatar = None
-        for stream_data in stream_manager.streams.values():
-            if stream_data['avatar'].avatar_type == avatar_type:
-                avatar = stream_data['avatar']
-                break
+        avatar = find_stream_avatar(avatar_type)
         
         if not avatar:
             # Create temporary avatar
             avatar = RealisticAvatar(avatar_type)
         
-        result = avatar.speak(text, voice, speed, pitch)
+        result = avatar.speak(text, voice, speed, pitch, priority)
         
         return jsonify({
             'success': True,
@@ -393,6 +555,131 @@ def avatar_speak():
         }), 500
 
 
+@app.route('/api/avatar/speech', methods=['GET'])
+def speech_status():
+    """Get current utterance and speech queue"""
+    avatar = find_stream_avatar(request.args.get('avatar', 'female'))
+    if not avatar:
+        return jsonify({'success': False, 'error': 'Avatar not streaming'}), 404
+    return jsonify({'success': True, 'speech': avatar.speech.status()})
+
+
+@app.route('/api/avatar/speak/cancel', methods=['POST'])
+def cancel_speech():
+    """Cancel current speech, one utterance by id, or everything"""
+    data = request.json or {}
+    avatar = find_stream_avatar(data.get('avatar', 'female'))
+    if not avatar:
+        return jsonify({'success': False, 'error': 'Avatar not streaming'}), 404
+    utterance_id = data.get('id')
+    cancelled = avatar.speech.cancel(int(utterance_id) if utterance_id is not None else None,
+                                     clear=bool(data.get('all')))
+    return jsonify({'success': True, 'cancelled': cancelled, 'speech': avatar.speech.status()})
+
+
+
+@app.route('/api/avatar/audio/<int:utterance_id>', methods=['GET'])
+def speech_audio(utterance_id):
+    """Stream an utterance's audio as WAV while it is being synthesized"""
+    if get_tts_engine() is None:
+        return jsonify({'success': False, 'error': 'No TTS engine available'}), 503
+    audio = tts_service.get(utterance_id)
+    if audio is None:
+        return jsonify({'success': False, 'error': 'Audio not found'}), 404
+    
+    def generate():
+        # The sample rate is known once synthesis has produced its first chunk
+        chunks = audio.read()
+        first = next(chunks, None)
+        yield wav_header(audio.sample_rate)
+        if first is not None:
+            yield first.tobytes()
+        for chunk in chunks:
+            yield chunk.tobytes()
+    
+    return Response(generate(), mimetype='audio/wav')
+
+
+@app.route('/api/catalog/prerender', methods=['POST'])
+def prerender_catalog():
+    """Pre-render a product catalog into a pack in the background, then load it"""
+    if get_tts_engine() is None:
+        return jsonify({'success': False, 'error': 'No TTS engine available'}), 503
+    data = request.json or {}
+    products = data.get('products')
+    if products is None:
+        try:
+            with open(data.get('path', 'products_example.json'), 'r', encoding='utf-8') as f:
+                products = json.load(f)
+        except (OSError, ValueError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    name = data.get('name', 'catalog')
+    voice = data.get('voice', 'female-1')
+    speed = float(data.get('speed', 1.0))
+    pitch = int(data.get('pitch', 0))
+    
+    def build():
+        try:
+            catalogs.load(ensure_pack(products, name, voice, speed, pitch))
+        except Exception as e:
+            print(f"❌ Catalog pre-render failed: {e}")
+    
+    socketio.start_background_task(build)
+    return jsonify({
+        'success': True,
+        'catalog': name,
+        'products': len(products),
+        'path': pack_path(name)
+    })
+
+
+@app.route('/api/catalog/load', methods=['POST'])
+def load_catalog():
+    """Memory-map a pre-rendered catalog pack"""
+    data = request.json or {}
+    try:
+        pack = catalogs.load(data.get('path') or pack_path(data.get('name', 'catalog')))
+    except (OSError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    return jsonify({
+        'success': True,
+        'catalog': pack.name,
+        'products': [meta['name'] for meta in pack.products]
+    })
+
+
+@app.route('/api/product/show', methods=['POST'])
+def show_product():
+    """Show a product card on a stream and speak its script"""
+    data = request.json or {}
+    stream = stream_manager.get_stream(data.get('socketId'))
+    if not stream:
+        return jsonify({'success': False, 'error': 'Stream not found'}), 404
+    
+    product = data.get('product')
+    if product is None:
+        # Hide the card
+        stream['product'] = None
+        return jsonify({'success': True, 'product': None})
+    
+    selection = catalogs.select(data.get('catalog', 'catalog'), product)
+    if selection is None:
+        return jsonify({'success': False, 'error': 'Product not found'}), 404
+    stream['product'] = selection
+    
+    result = None
+    if data.get('speak', True):
+        # Same voice settings as the pack, so the script is a TTS cache hit
+        header = catalogs.get(selection[0]).header
+        result = stream['avatar'].speak(catalogs.script(selection), header['voice'],
+                                        header['speed'], header['pitch'])
+    return jsonify({
+        'success': True,
+        'product': selection[1],
+        'result': result
+    })
+
+
 @app.route('/api/avatar/change', methods=['POST'])
 def change_avatar():
     """Change avatar type to realistic human"""
@@ -416,26 +703,50 @@ def change_avatar():
 @app.route('/api/frame/<socket_id>', methods=['GET'])
 def get_frame(socket_id):
     """Get current realistic avatar frame"""
-    # For preview/non-stream, use global avatar
-    if socket_id == 'avatar_stream':
-        avatar = stream_manager.get_avatar()
-    else:
-        stream = stream_manager.get_stream(socket_id)
-        if not stream:
-            return jsonify({'error': 'Stream not found'}), 404
-        avatar = stream['avatar']
-    
-    gesture_intensity = int(request.args.get('gesture', 50))
+    # avatar_stream is the global preview avatar, anything else must be a live stream
+    if resolve_avatar(socket_id) is None:
+        return jsonify({'error': 'Stream not found'}), 404
     
-    frame = avatar.process_frame(gesture_intensity)
+    # Query args only steer the stream's render loop; the frame is shared by all viewers
+    producer = frame_hub.ensure(socket_id)
+    producer.update_params(**parse_frame_params(request.args))
     
-    if frame is None:
+    latest = producer.get_latest()
+    if latest is None:
         return jsonify({'error': 'Failed to generate frame'}), 500
     
-    # Encode frame to JPEG
-    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    # Viewers asking for the same frame and quality share one encode
+    quality = request.args.get('quality', type=int)
+    if quality:
+        jpeg, etag = producer.encode(latest, max(10, min(quality, 100)))
+    else:
+        jpeg, etag = latest.jpeg, latest.etag
+    
+    headers = {
+        'Cache-Control': 'no-cache',
+        'ETag': f'"{etag}"',
+        'X-Frame-Id': str(latest.frame_id)
+    }
+    if request.if_none_match.contains(etag):
+        return '', 304, headers
+    
+    headers['Content-Type'] = 'image/jpeg'
+    return jpeg, 200, headers
+
+
+@app.route('/api/stream/<socket_id>.mjpg', methods=['GET'])
+def stream_mjpeg(socket_id):
+    """Stream frames as MJPEG (multipart/x-mixed-replace) for OBS and browsers"""
+    if resolve_avatar(socket_id) is None:
+        return jsonify({'error': 'Stream not found'}), 404
+    
+    # Animation inputs are read once; later changes arrive via frame_params or /api/frame
+    producer = frame_hub.ensure(socket_id)
+    producer.update_params(**parse_frame_params(request.args))
+    fps = request.args.get('fps', type=float)
     
-    return buffer.tobytes(), 200, {'Content-Type': 'image/jpeg'}
+    return Response(frame_hub.mjpeg_frames(socket_id, fps), mimetype=MJPEG_MIMETYPE,
+                    headers={'Cache-Control': 'no-store'})
 
 
 @app.route('/api/event', methods=['POST'])
@@ -468,6 +779,42 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     print('Realistic Avatar client disconnected')
+    frame_hub.unsubscribe(request.sid)
+
+
+@socketio.on('subscribe_frames')
+def handle_subscribe_frames(data=None):
+    """Subscribe client to frames pushed by a stream's render loop"""
+    data = data or {}
+    stream_id = data.get('stream_id', 'avatar_stream')
+    if resolve_avatar(stream_id) is None:
+        return {'success': False, 'error': 'Stream not found'}
+    
+    join_room(frame_room(stream_id))
+    frame_hub.subscribe(request.sid, stream_id)
+    producer = frame_hub.ensure(stream_id)
+    producer.update_params(**parse_frame_params(data))
+    
+    return {'success': True, 'stream_id': stream_id, 'fps': producer.fps}
+
+
+@socketio.on('unsubscribe_frames')
+def handle_unsubscribe_frames(data=None):
+    """Stop pushing frames of a stream to client"""
+    data = data or {}
+    stream_id = data.get('stream_id', 'avatar_stream')
+    leave_room(frame_room(stream_id))
+    frame_hub.unsubscribe(request.sid, stream_id)
+    return {'success': True}
+
+
+@socketio.on('frame_params')
+def handle_frame_params(data=None):
+    """Update animation inputs of a stream's render loop"""
+    data = data or {}
+    producer = frame_hub.get(data.get('stream_id', 'avatar_stream'))
+    if producer is not None:
+        producer.update_params(**parse_frame_params(data))
 
 
 # Main
@@ -478,4 +825,18 @@ if __name__ == '__main__':
     print(f"🎭 Avatar Types: Female, Male (Realistic)")
     print(f"🔗 Server ready at http://localhost:{PORT}")
     
+    # Pick the fastest JPEG backend before serving frames
+    with startup.stage('jpeg_benchmark'):
+        encoder = select_encoder()
+    print(f"🖼️ JPEG encoder: {encoder.name}")
+    
+    with startup.stage('tts_engine'):
+        select_tts_engine()
+    
+    # Fork render workers before any request threads exist
+    render_pool.start()
+    
+    # Assets and the first frame load in the background so the port binds right away
+    socketio.start_background_task(warm_up)
+    
     socketio.run(app, host='0.0.0.0', port=PORT, debug=False, allow_unsafe_werkzeug=True)
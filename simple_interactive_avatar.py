@@ -2,32 +2,55 @@
 """
 Simple Interactive Avatar Server
 Avatar yang bisa berinteraksi dengan mimik mulut dan gerak-gerik real-time
-Tanpa dependensi rumit, hanya OpenCV dan numpy
+Tanpa dependensi rumit, hanya OpenCV dan numpy (landmark wajah yang sudah
+di-cache server lain dipakai bila ada, tanpa MediaPipe/dlib)
 """
 
-from flask import Flask, request, jsonify
+# Startup timing starts before the heavy imports below
+from avatar_startup import startup
+
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, join_room, leave_room
 import cv2
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 import os
 import json
 import time
-import requests
 from io import BytesIO
 import base64
 from dotenv import load_dotenv
-import threading
 import queue
 import math
 
+from avatar_assets import FacePyramid, face_size_for_height, face_assets
+from avatar_delta import DeltaCanvas, FULL_DRAW
+from avatar_landmarks import load_landmarks, default_landmarks, RegionAnimator
+from avatar_visemes import VisemeTimeline, VisemeAtlas, viseme_open
+from avatar_config import step_down_quality
+from avatar_layout import quality_layout, frame_layout, face_layout
+from avatar_models import AvatarModel, ModelRegistry
+from avatar_encoder import select_encoder, encoder_report
+from avatar_transform import AffineTransform, DEFAULT_QUALITY
+from avatar_speech import SpeechScheduler, DEFAULT_PRIORITY
+from avatar_tts import tts_service, select_tts_engine, get_tts_engine, wav_header
+from avatar_catalog import catalogs, ensure_pack, pack_path
+from avatar_metrics import metrics, stream_gauges
+from avatar_governor import apply_render_hints
+from avatar_streaming import FrameHub, frame_room, encode_jpeg, MJPEG_MIMETYPE, DEFAULT_PARAMS
+from avatar_workers import RenderPool
+
+startup.mark('imports')
+
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Real threads: render loops, render-pool pipes and TTS waits block, which
+# would stall every greenlet if eventlet (in requirements.txt) were picked
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 
 # Configuration
 PORT = int(os.getenv('PYTHON_PORT', 5000))
@@ -38,17 +61,28 @@ TEMP_DIR = 'temp'
 os.makedirs(AVATAR_DIR, exist_ok=True)
 os.makedirs(TEMP_DIR, exist_ok=True)
 
+# Synthesized speech is cached on disk under TEMP_DIR
+tts_service.cache.set_root(os.path.join(TEMP_DIR, 'tts'))
+
 # Store active sessions
 active_sessions = {}
 
+# Face assets per avatar type, shared by all streams
+model_registry = ModelRegistry()
+
 class SimpleInteractiveAvatar:
     """Simple Interactive Avatar dengan animasi real-time"""
     
     def __init__(self, avatar_type='female'):
         self.avatar_type = avatar_type
         self.current_frame = None
-        self.is_speaking = False
         self.face_image = None
+        self.face_pyramid = None
+        self.warp_quality = DEFAULT_QUALITY
+        # Gradient animation rate, lowered by the frame governor (None = every frame)
+        self.background_fps = None
+        # Reused frame buffers; only the face and changed overlays are redrawn
+        self.canvas = DeltaCanvas()
         self.animation_state = {
             'mouth_open': 0.0,
             'eye_blink': 0.0,
@@ -60,31 +94,55 @@ class SimpleInteractiveAvatar:
         }
         self.speech_queue = queue.Queue()
         self.current_text = ""
-        self.load_realistic_avatar()
-        
+        # Heavy assets are loaded once per avatar type and shared read-only
+        self.model = model_registry.get(avatar_type, self.load_model)
+        self.face_image = self.model.face_image
+        self.face_pyramid = self.model.face_pyramid
+        self.face_landmarks = self.model.get('landmarks')
+        # speak() queues utterances; the scheduler plays them one at a time
+        self.speech = SpeechScheduler(self.speech_queue)
+        # Viseme timeline of the frame param text
+        self.text_timeline = None
+        
+    def load_model(self):
+        """Load assets shared by every stream of this avatar type"""
+        photo = self.load_realistic_avatar()
+        # No detectors here: landmarks another server cached for this photo, or
+        # the drawn fallback face's own geometry; otherwise features are drawn
+        self.face_landmarks = load_landmarks(self.face_image, detect=False)
+        if self.face_landmarks is None and not photo:
+            self.face_landmarks = default_landmarks()
+        if self.face_landmarks is None:
+            return AvatarModel(self.avatar_type, self.face_image, self.face_pyramid)
+        animator = RegionAnimator(self.face_landmarks)
+        # Mouth shapes are rendered once per face size and blitted while speaking
+        return AvatarModel(self.avatar_type, self.face_image, self.face_pyramid,
+                           landmarks=self.face_landmarks, animator=animator,
+                           visemes=VisemeAtlas(self.face_pyramid, animator))
+    
     def load_realistic_avatar(self):
-        """Load realistic human avatar"""
-        try:
-            # Download realistic human photos
-            if self.avatar_type == 'female':
-                avatar_url = "https://i.pravatar.cc/400?img=5"
-            elif self.avatar_type == 'male':
-                avatar_url = "https://i.pravatar.cc/400?img=12"
-            else:
-                avatar_url = "https://i.pravatar.cc/400?img=1"
-            
-            response = requests.get(avatar_url, timeout=10)
-            if response.status_code == 200:
-                img_array = np.array(bytearray(response.content), dtype=np.uint8)
-                self.face_image = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-                self.face_image = cv2.resize(self.face_image, (400, 400))
-                print(f"✅ Loaded realistic {self.avatar_type} avatar")
-            else:
-                self.create_fallback_avatar()
-                
-        except Exception as e:
-            print(f"❌ Error loading avatar: {e}")
-            self.create_fallback_avatar()
+        """Load realistic human avatar from the asset cache, downloading it on first use
+
+        Returns False when the drawn fallback face is used instead.
+        """
+        # Realistic human photos from Pravatar
+        if self.avatar_type == 'female':
+            avatar_url = "https://i.pravatar.cc/400?img=5"
+        elif self.avatar_type == 'male':
+            avatar_url = "https://i.pravatar.cc/400?img=12"
+        else:
+            avatar_url = "https://i.pravatar.cc/400?img=1"
+        
+        # Decoded, pre-scaled face from disk; the network is only hit on a cold cache
+        asset = face_assets.load(self.avatar_type, avatar_url)
+        if asset is not None:
+            self.face_image, self.face_pyramid = asset
+            return True
+        
+        self.create_fallback_avatar()
+        # Pre-scale face once for every portrait size
+        self.face_pyramid = FacePyramid(self.face_image)
+        return False
     
     def create_fallback_avatar(self):
         """Create fallback realistic avatar"""
@@ -116,23 +174,32 @@ class SimpleInteractiveAvatar:
         self.face_image = img
         print("✅ Created fallback realistic avatar")
     
+    def current_mouth(self, is_speaking, text, t):
+        """Get (mouth_open, viseme id) for this frame, viseme None when not speaking"""
+        # Queued speech follows its audio; frame param text follows its timeline
+        if self.speech.now_speaking(t) is not None:
+            return self.speech.mouth(t)
+        if is_speaking and text:
+            # Frames repeat the same text, so its timeline is built once and looped
+            if self.text_timeline is None or self.text_timeline.text != text:
+                self.text_timeline = VisemeTimeline(text, len(text) / 10)
+            viseme = self.text_timeline.at(t, loop=True)
+            return viseme_open(viseme), viseme
+        return 0.0, None
+    
     def update_animation_state(self, gesture_intensity=50, is_speaking=False, text=""):
         """Update animation state berdasarkan input real-time"""
         t = time.time()
         
         # Speaking animation
-        if is_speaking and text:
-            self.current_text = text
-            
-            # Analisis text untuk mouth movement
-            vowels = sum(1 for char in text.lower() if char in 'aeiou')
-            consonants = sum(1 for char in text.lower() if char.isalpha() and char not in 'aeiou')
+        mouth_open, viseme = self.current_mouth(is_speaking, text, t)
+        self.animation_state['viseme'] = viseme
+        if viseme is not None:
+            if is_speaking and text:
+                self.current_text = text
             
-            # Mouth open berdasarkan vowels dan consonants
-            if vowels > 0:
-                self.animation_state['mouth_open'] = min(0.9, vowels / len(text) * 3)
-            else:
-                self.animation_state['mouth_open'] = 0.4
+            # Mouth from the speech audio or the viseme timeline
+            self.animation_state['mouth_open'] = mouth_open
             
             # Eyebrow movement saat speaking
             self.animation_state['eyebrow_raise'] = 0.4 + np.sin(t * 6) * 0.3
@@ -162,44 +229,65 @@ class SimpleInteractiveAvatar:
         else:
             self.animation_state['smile'] = 0.0
     
-    def apply_facial_animations(self, face_img):
-        """Apply facial animations ke face image"""
+    def apply_facial_animations(self, face_img, out=None):
+        """Apply facial animations ke face image, warping into out when given"""
         h, w = face_img.shape[:2]
         center = (w//2, h//2)
         
+        # Head tilt and breathing share one warp
+        transform = AffineTransform()
+        
         # Head tilt
         if self.animation_state['head_tilt'] != 0:
             angle = self.animation_state['head_tilt'] * 15
-            M = cv2.getRotationMatrix2D(center, angle, 1.0)
-            face_img = cv2.warpAffine(face_img, M, (w, h))
+            transform.rotate(center, angle)
         
         # Breathing effect
         if self.animation_state['breathing'] != 0:
             scale = 1.0 + self.animation_state['breathing']
-            M = cv2.getRotationMatrix2D(center, 0, scale)
-            face_img = cv2.warpAffine(face_img, M, (w, h))
+            transform.scale(center, scale)
+        
+        fl = face_layout(face_img)
+        face_img = transform.warp(face_img, self.warp_quality, dst=out)
+        
+        animator = self.model.get('animator')
+        if animator is None:
+            self.draw_facial_features(face_img, fl)
+            return face_img
+        
+        # Eyes, mouth and brows warp their cached landmark regions
+        viseme = self.animation_state.get('viseme')
+        animator.animate(face_img, self.animation_state, transform, mouth=viseme is None)
+        if viseme is not None:
+            self.model.get('visemes').blit(face_img, viseme, transform)
+        
+        return face_img
+    
+    def draw_facial_features(self, face_img, fl):
+        """Draw eyes, mouth, smile and brows over a face without landmarks"""
+        h, w = face_img.shape[:2]
         
         # Eye blinking
         if self.animation_state['eye_blink'] > 0:
-            eye_y = h - 220
+            eye_y = h - fl.size(220)
             # Draw closed eyes
-            cv2.line(face_img, (w//2 - 50, eye_y), (w//2 - 20, eye_y), (220, 190, 170), 4)
-            cv2.line(face_img, (w//2 + 20, eye_y), (w//2 + 50, eye_y), (220, 190, 170), 4)
+            cv2.line(face_img, (w//2 - fl.size(50), eye_y), (w//2 - fl.size(20), eye_y), (220, 190, 170), fl.thickness(4))
+            cv2.line(face_img, (w//2 + fl.size(20), eye_y), (w//2 + fl.size(50), eye_y), (220, 190, 170), fl.thickness(4))
         else:
             # Normal eyes with focus
-            eye_y = h - 220
+            eye_y = h - fl.size(220)
             if self.animation_state['eye_focus'] > 0:
                 # Focused eyes (slightly smaller pupils)
-                cv2.circle(face_img, (w//2 - 40, eye_y), 8, (100, 60, 30), -1)
-                cv2.circle(face_img, (w//2 + 40, eye_y), 8, (100, 60, 30), -1)
-                cv2.circle(face_img, (w//2 - 40, eye_y), 4, (0, 0, 0), -1)
-                cv2.circle(face_img, (w//2 + 40, eye_y), 4, (0, 0, 0), -1)
+                cv2.circle(face_img, (w//2 - fl.size(40), eye_y), fl.size(8), (100, 60, 30), -1)
+                cv2.circle(face_img, (w//2 + fl.size(40), eye_y), fl.size(8), (100, 60, 30), -1)
+                cv2.circle(face_img, (w//2 - fl.size(40), eye_y), fl.size(4), (0, 0, 0), -1)
+                cv2.circle(face_img, (w//2 + fl.size(40), eye_y), fl.size(4), (0, 0, 0), -1)
         
         # Mouth animation
         if self.animation_state['mouth_open'] > 0:
-            mouth_y = h - 80
-            mouth_width = int(30 + self.animation_state['mouth_open'] * 50)
-            mouth_height = int(15 + self.animation_state['mouth_open'] * 25)
+            mouth_y = h - fl.size(80)
+            mouth_width = fl.size(30 + self.animation_state['mouth_open'] * 50)
+            mouth_height = fl.size(15 + self.animation_state['mouth_open'] * 25)
             
             # Draw open mouth
             cv2.ellipse(face_img, (w//2, mouth_y), (mouth_width, mouth_height), 
@@ -209,7 +297,7 @@ class SimpleInteractiveAvatar:
             if self.animation_state['mouth_open'] > 0.5:
                 teeth_y = mouth_y - mouth_height//2
                 cv2.rectangle(face_img, (w//2 - mouth_width//2, teeth_y), 
-                            (w//2 + mouth_width//2, teeth_y + 8), (255, 255, 255), -1)
+                            (w//2 + mouth_width//2, teeth_y + fl.size(8)), (255, 255, 255), -1)
                 
                 # Tongue
                 if self.animation_state['mouth_open'] > 0.7:
@@ -219,136 +307,147 @@ class SimpleInteractiveAvatar:
         
         # Smile animation
         if self.animation_state['smile'] > 0:
-            smile_y = h - 90
-            smile_width = int(40 + self.animation_state['smile'] * 30)
-            cv2.ellipse(face_img, (w//2, smile_y), (smile_width, 12), 
-                       0, 0, 180, (200, 100, 100), 4)
+            smile_y = h - fl.size(90)
+            smile_width = fl.size(40 + self.animation_state['smile'] * 30)
+            cv2.ellipse(face_img, (w//2, smile_y), (smile_width, fl.size(12)), 
+                       0, 0, 180, (200, 100, 100), fl.thickness(4))
         
         # Eyebrow raise
         if self.animation_state['eyebrow_raise'] > 0:
-            eyebrow_y = h - 250 - int(self.animation_state['eyebrow_raise'] * 15)
-            cv2.ellipse(face_img, (w//2 - 60, eyebrow_y), (35, 10), 0, 0, 180, (40, 30, 20), -1)
-            cv2.ellipse(face_img, (w//2 + 60, eyebrow_y), (35, 10), 0, 0, 180, (40, 30, 20), -1)
-        
-        return face_img
+            eyebrow_y = h - fl.size(250) - int(self.animation_state['eyebrow_raise'] * fl.size(15))
+            cv2.ellipse(face_img, (w//2 - fl.size(60), eyebrow_y), fl.axes(35, 10), 0, 0, 180, (40, 30, 20), -1)
+            cv2.ellipse(face_img, (w//2 + fl.size(60), eyebrow_y), fl.axes(35, 10), 0, 0, 180, (40, 30, 20), -1)
     
-    def create_interactive_frame(self, gesture_intensity=50, is_speaking=False, text=""):
+    def create_interactive_frame(self, gesture_intensity=50, is_speaking=False, text="", quality=None):
         """Create interactive frame dengan animasi real-time"""
+        # Queued speech takes over the mouth and the text overlay
+        utterance = self.speech.now_speaking()
+        if utterance is not None:
+            is_speaking, text = True, utterance.text
+        
         # Update animation state
         self.update_animation_state(gesture_intensity, is_speaking, text)
         
         # Portrait dimensions (9:16)
-        frame = np.zeros((1920, 1080, 3), dtype=np.uint8)
-        
         # Animated background
         t = time.time()
-        for i in range(1920):
-            color_r = int(40 + abs(np.sin((i + t * 20) / 200)) * 60)
-            color_g = int(50 + abs(np.sin((i + t * 20 + 120) / 200)) * 70)
-            color_b = int(80 + abs(np.sin((i + t * 20 + 240) / 200)) * 80)
-            frame[i, :] = [color_b, color_g, color_r]
+        layout = quality_layout(quality)
+        timer = metrics.timer()
+        delta = self.canvas.begin(layout.width, layout.height, t, self.background_fps)
+        frame = delta.buffer
+        timer.lap('background')
         
         if self.face_image is not None:
-            # Resize face
-            face_resized = cv2.resize(self.face_image, (600, 600))
-            
-            # Apply facial animations
-            face_animated = self.apply_facial_animations(face_resized)
+            # Pre-scaled face
+            face_resized = self.face_pyramid.get(face_size_for_height(layout.height))
             
             # Position face
-            y_offset = 300
-            x_offset = 240
-            frame[y_offset:y_offset+600, x_offset:x_offset+600] = face_animated
+            h, w = face_resized.shape[:2]
+            y_offset = layout.y(300)
+            x_offset = (layout.width - w) // 2
+            face_roi = frame[y_offset:y_offset+h, x_offset:x_offset+w]
+            
+            # Apply facial animations straight into the face region
+            face_animated = self.apply_facial_animations(face_resized, out=face_roi)
+            if face_animated is not face_roi:
+                face_roi[:] = face_animated
+            timer.lap('face_warp')
             
             # Add professional body
-            self.add_professional_body(frame, x_offset, y_offset + 600)
+            self.add_professional_body(frame, x_offset, y_offset + h, delta)
         
         # Add UI overlays
-        self.add_ui_overlays(frame, gesture_intensity, is_speaking, text)
+        self.add_ui_overlays(frame, gesture_intensity, is_speaking, text, delta)
+        timer.lap('overlays')
         
         return frame
     
-    def add_professional_body(self, frame, x_offset, y_start):
-        """Add professional body"""
+    def add_professional_body(self, frame, x_offset, y_start, delta=FULL_DRAW):
+        """Add professional body, unless the frame still shows it"""
+        layout = frame_layout(frame)
+        body_rect = (x_offset + layout.size(100), y_start, x_offset + layout.size(500), y_start + layout.size(400))
+        if not delta.dirty('body', body_rect, (x_offset, y_start), restore=False):
+            return
+        
         # Neck
         neck_color = (200, 170, 150)
-        cv2.rectangle(frame, (x_offset + 200, y_start), (x_offset + 400, y_start + 100), neck_color, -1)
+        cv2.rectangle(frame, (x_offset + layout.size(200), y_start), (x_offset + layout.size(400), y_start + layout.size(100)), neck_color, -1)
         
         # Professional clothing
         clothing_color = (30, 30, 50)
-        cv2.rectangle(frame, (x_offset + 100, y_start + 100), (x_offset + 500, y_start + 400), clothing_color, -1)
-        cv2.ellipse(frame, (x_offset + 300, y_start + 100), (200, 80), 0, 0, 180, clothing_color, -1)
-    
-    def add_ui_overlays(self, frame, gesture_intensity, is_speaking, text):
-        """Add UI overlays"""
-        # Top status bar
-        cv2.rectangle(frame, (0, 0), (1080, 80), (0, 0, 0), -1)
-        cv2.rectangle(frame, (0, 0), (1080, 80), (37, 244, 238), 2)
-        
-        # Status text
-        status_text = f"INTERACTIVE AVATAR | {self.avatar_type.upper()} | Gesture: {gesture_intensity}%"
-        cv2.putText(frame, status_text, (30, 50), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (37, 244, 238), 2)
-        
-        # Speaking indicator
-        if is_speaking:
-            cv2.circle(frame, (1020, 40), 20, (0, 255, 0), -1)
-            cv2.putText(frame, "SPEAKING", (900, 50), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        cv2.rectangle(frame, (x_offset + layout.size(100), y_start + layout.size(100)), (x_offset + layout.size(500), y_start + layout.size(400)), clothing_color, -1)
+        cv2.ellipse(frame, (x_offset + layout.size(300), y_start + layout.size(100)), layout.axes(200, 80), 0, 0, 180, clothing_color, -1)
+    
+    def add_ui_overlays(self, frame, gesture_intensity, is_speaking, text, delta=FULL_DRAW):
+        """Add UI overlays, skipping the ones the frame still shows"""
+        layout = frame_layout(frame)
+        
+        # Top status bar, redrawn when its text changes (the filled bar covers the old one)
+        if delta.dirty('status', layout.roi(0, 0, 1080, 82), (gesture_intensity, is_speaking), restore=False):
+            cv2.rectangle(frame, (0, 0), layout.pt(1080, 80), (0, 0, 0), -1)
+            cv2.rectangle(frame, (0, 0), layout.pt(1080, 80), (37, 244, 238), layout.thickness(2))
             
-            # Show current text
-            if text:
-                display_text = text[:40] + "..." if len(text) > 40 else text
-                cv2.putText(frame, f"'{display_text}'", (30, 1850), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-        else:
-            cv2.circle(frame, (1020, 40), 20, (100, 100, 100), -1)
+            # Status text
+            status_text = f"INTERACTIVE AVATAR | {self.avatar_type.upper()} | Gesture: {gesture_intensity}%"
+            cv2.putText(frame, status_text, layout.pt(30, 50), 
+                       cv2.FONT_HERSHEY_SIMPLEX, layout.font(0.8), (37, 244, 238), layout.thickness(2))
+            
+            # Speaking indicator
+            if is_speaking:
+                cv2.circle(frame, layout.pt(1020, 40), layout.size(20), (0, 255, 0), -1)
+                cv2.putText(frame, "SPEAKING", layout.pt(900, 50), 
+                           cv2.FONT_HERSHEY_SIMPLEX, layout.font(0.7), (0, 255, 0), layout.thickness(2))
+            else:
+                cv2.circle(frame, layout.pt(1020, 40), layout.size(20), (100, 100, 100), -1)
+        
+        # Speech caption and animation indicators change often; their strip is
+        # redrawn over the background whenever any of them does
+        caption = None
+        if is_speaking and text:
+            display_text = text[:40] + "..." if len(text) > 40 else text
+            caption = f"'{display_text}'"
+        indicators = (
+            (f"Blink: {self.animation_state['eye_blink']:.1f}", 30),
+            (f"Mouth: {self.animation_state['mouth_open']:.1f}", 200),
+            (f"Smile: {self.animation_state['smile']:.1f}", 350),
+            (f"Focus: {self.animation_state['eye_focus']:.1f}", 500)
+        )
+        if not delta.dirty('captions', layout.roi(0, 1825, 1080, 1880), (caption, indicators)):
+            return
+        
+        # Show current text
+        if caption:
+            cv2.putText(frame, caption, layout.pt(30, 1850), 
+                       cv2.FONT_HERSHEY_SIMPLEX, layout.font(0.6), (255, 255, 255), layout.thickness(2))
         
         # Animation indicators
-        cv2.putText(frame, f"Blink: {self.animation_state['eye_blink']:.1f}", (30, 1870), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        cv2.putText(frame, f"Mouth: {self.animation_state['mouth_open']:.1f}", (200, 1870), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        cv2.putText(frame, f"Smile: {self.animation_state['smile']:.1f}", (350, 1870), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        cv2.putText(frame, f"Focus: {self.animation_state['eye_focus']:.1f}", (500, 1870), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-    
-    def speak(self, text, voice_type='female-1', speed=1.0, pitch=0):
+        for indicator, x in indicators:
+            cv2.putText(frame, indicator, layout.pt(x, 1870), 
+                       cv2.FONT_HERSHEY_SIMPLEX, layout.font(0.5), (255, 255, 255), layout.thickness(1))
+    
+    def speak(self, text, voice_type='female-1', speed=1.0, pitch=0, priority=DEFAULT_PRIORITY):
         """Make avatar speak dengan animasi real-time"""
-        self.is_speaking = True
-        
         # Add to speech queue
-        self.speech_queue.put({
-            'text': text,
-            'voice': voice_type,
-            'speed': speed,
-            'pitch': pitch,
-            'start_time': time.time()
-        })
-        
-        duration = len(text) / 10 * speed
+        utterance = self.speech.say(text, voice_type, speed, pitch, priority)
+        # Audio streams from the local TTS engine while the utterance plays
+        audio = tts_service.submit(utterance)
         
         print(f"🗣️ Interactive Avatar speaking: {text}")
         print(f"   Voice: {voice_type}, Speed: {speed}x, Pitch: {pitch}")
         
-        # Auto-stop speaking
-        def stop_speaking():
-            time.sleep(duration)
-            self.is_speaking = False
-        
-        threading.Thread(target=stop_speaking, daemon=True).start()
-        
         return {
             'success': True,
-            'duration': duration,
+            'id': utterance.id,
+            'duration': utterance.duration,
+            'starts_in': self.speech.starts_in(utterance.id),
+            'audio_url': f"/api/avatar/audio/{utterance.id}" if audio is not None else None,
             'text': text,
             'voice': voice_type
         }
     
-    def process_frame(self, gesture_intensity=50, is_speaking=False, text=""):
+    def process_frame(self, gesture_intensity=50, is_speaking=False, text="", quality=None):
         """Process frame dengan interaksi real-time"""
-        return self.create_interactive_frame(gesture_intensity, is_speaking, text)
+        return self.create_interactive_frame(gesture_intensity, is_speaking, text, quality)
 
 
 class StreamManager:
@@ -356,7 +455,8 @@ class StreamManager:
     
     def __init__(self):
         self.streams = {}
-        self.global_avatar = SimpleInteractiveAvatar('female')
+        # Built on first use so the server can bind before loading assets
+        self.global_avatar = None
     
     def create_stream(self, socket_id, settings):
         """Create new interactive stream"""
@@ -384,7 +484,9 @@ class StreamManager:
         return False
     
     def get_avatar(self):
-        """Get global avatar"""
+        """Get global avatar, building it on first use"""
+        if self.global_avatar is None:
+            self.global_avatar = SimpleInteractiveAvatar('female')
         return self.global_avatar
     
     def change_avatar(self, avatar_type):
@@ -397,6 +499,103 @@ class StreamManager:
 stream_manager = StreamManager()
 
 
+def resolve_avatar(socket_id):
+    """Get avatar for a stream, or the global avatar for preview"""
+    if socket_id == 'avatar_stream':
+        return stream_manager.get_avatar()
+    stream = stream_manager.get_stream(socket_id)
+    if not stream:
+        return None
+    return stream['avatar']
+
+
+def parse_frame_params(source):
+    """Get animation inputs from query args or a Socket.IO payload"""
+    params = {}
+    if source.get('gesture') is not None:
+        params['gesture_intensity'] = int(source.get('gesture'))
+    if source.get('res'):
+        params['resolution'] = source.get('res')
+    if source.get('speaking') is not None:
+        params['is_speaking'] = str(source.get('speaking')).lower() == 'true'
+    if source.get('text') is not None:
+        params['text'] = source.get('text')
+    return params
+
+
+def stream_quality(socket_id, params):
+    """Get resolution tier for a frame: explicit request, then stream settings"""
+    if params.get('resolution'):
+        return params['resolution']
+    stream = stream_manager.get_stream(socket_id)
+    if stream:
+        return stream['settings'].get('quality')
+    return None
+
+
+def create_worker_avatar(avatar_type):
+    """Build an avatar inside a render worker process"""
+    avatar = SimpleInteractiveAvatar(avatar_type)
+    # Frames are copied into a shared slot before the next render, so one buffer will do
+    avatar.canvas = DeltaCanvas(buffers=1)
+    return avatar
+
+
+def render_worker_frame(avatar, params):
+    """Render one frame inside a render worker process"""
+    apply_render_hints(avatar, params)
+    avatar.speech.follow(params.get('speech'))
+    return avatar.process_frame(params['gesture_intensity'], params['is_speaking'], params['text'],
+                                quality=params.get('quality'))
+
+
+# Render worker processes, enabled with RENDER_WORKERS > 0
+render_pool = RenderPool(create_worker_avatar, render_worker_frame)
+
+
+def render_stream_frame(socket_id, params):
+    """Render one frame for a stream's render loop"""
+    avatar = resolve_avatar(socket_id)
+    if avatar is None:
+        render_pool.close(socket_id)
+        return None
+    # The frame governor can cap the stream's resolution tier
+    quality = step_down_quality(stream_quality(socket_id, params), params.get('resolution_step', 0))
+    if render_pool.enabled:
+        # Workers mirror the utterance this process is playing
+        frame = render_pool.render(socket_id, avatar.avatar_type,
+                                   dict(params, quality=quality, speech=avatar.speech.snapshot()))
+    else:
+        apply_render_hints(avatar, params)
+        frame = avatar.process_frame(params['gesture_intensity'], params['is_speaking'], params['text'],
+                                     quality=quality)
+    # Product card straight from the memory-mapped catalog pack
+    stream = stream_manager.get_stream(socket_id)
+    selection = stream.get('product') if stream else None
+    # The card lands in the avatar's reused buffer, which restores that area next time
+    avatar.canvas.invalidate(frame, catalogs.card_rect(frame, selection))
+    return catalogs.composite(frame, selection)
+
+
+# Render loops shared by HTTP polling and Socket.IO push
+frame_hub = FrameHub(render_stream_frame, socketio=socketio, jpeg_quality=90)
+
+
+# Queue depths and cache hit rates are read on each /api/metrics scrape
+metrics.add_collector(lambda: stream_gauges(stream_manager.streams, frame_hub, tts_service))
+
+
+def warm_up():
+    """Load the preview avatar and render a first frame once the server is up"""
+    with startup.stage('asset_load'):
+        stream_manager.get_avatar()
+    with startup.stage('first_frame'):
+        frame = render_stream_frame('avatar_stream', dict(DEFAULT_PARAMS))
+        encode_jpeg(frame, frame_hub.jpeg_quality)
+    startup.set_ready()
+    print(f"⏱️ Startup: {startup.summary()}")
+
+
 # API Routes
 
 @app.route('/api/health', methods=['GET'])
@@ -405,12 +604,24 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'active_streams': len(stream_manager.streams),
+        'startup': startup.report(),
+        'jpeg_encoder': encoder_report(),
+        'render_workers': render_pool.report(),
+        'tts': tts_service.report(),
+        'catalogs': catalogs.report(),
+        'avatar_models': model_registry.stats(),
         'version': '3.0.0',
         'avatar_type': 'simple_interactive',
         'features': ['facial_animation', 'mouth_sync', 'eye_blink', 'head_movement', 'real_time_interaction', 'simple_deps']
     })
 
 
+@app.route('/api/metrics', methods=['GET'])
+def render_metrics():
+    """Render stage histograms, per-stream frame stats and queue depths for Prometheus"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/api/stream/start', methods=['POST'])
 def start_stream():
     """Start interactive stream"""
@@ -434,6 +645,14 @@ def start_stream():
         }), 500
 
 
+def find_stream_avatar(avatar_type):
+    """Get the avatar of the first active stream using an avatar type"""
+    for stream_data in stream_manager.streams.values():
+        if stream_data['avatar'].avatar_type == avatar_type:
+            return stream_data['avatar']
+    return None
+
+
 @app.route('/api/avatar/speak', methods=['POST'])
 def avatar_speak():
     """Make interactive avatar speak"""
@@ -442,20 +661,17 @@ def avatar_speak():
     voice = data.get('voice', 'female-1')
     speed = float(data.get('speed', 1.0))
     pitch = int(data.get('pitch', 0))
+    priority = data.get('priority', DEFAULT_PRIORITY)
     avatar_type = data.get('avatar', 'female')
     
     try:
-        # Find active stream
-        avatar = None
-        for stream_data in stream_manager.streams.values():
-            if stream_data['avatar'].avatar_type == avatar_type:
-                avatar = stream_data['avatar']
-                break
+        # Find active stream with this avatar
+        avatar = find_stream_avatar(avatar_type)
         
         if not avatar:
             avatar = SimpleInteractiveAvatar(avatar_type)
         
-        result = avatar.speak(text, voice, speed, pitch)
+        result = avatar.speak(text, voice, speed, pitch, priority)
         
         return jsonify({
             'success': True,
@@ -468,6 +684,131 @@ def avatar_speak():
         }), 500
 
 
+@app.route('/api/avatar/speech', methods=['GET'])
+def speech_status():
+    """Get current utterance and speech queue"""
+    avatar = find_stream_avatar(request.args.get('avatar', 'female'))
+    if not avatar:
+        return jsonify({'success': False, 'error': 'Avatar not streaming'}), 404
+    return jsonify({'success': True, 'speech': avatar.speech.status()})
+
+
+@app.route('/api/avatar/speak/cancel', methods=['POST'])
+def cancel_speech():
+    """Cancel current speech, one utterance by id, or everything"""
+    data = request.json or {}
+    avatar = find_stream_avatar(data.get('avatar', 'female'))
+    if not avatar:
+        return jsonify({'success': False, 'error': 'Avatar not streaming'}), 404
+    utterance_id = data.get('id')
+    cancelled = avatar.speech.cancel(int(utterance_id) if utterance_id is not None else None,
+                                     clear=bool(data.get('all')))
+    return jsonify({'success': True, 'cancelled': cancelled, 'speech': avatar.speech.status()})
+
+
+
+@app.route('/api/avatar/audio/<int:utterance_id>', methods=['GET'])
+def speech_audio(utterance_id):
+    """Stream an utterance's audio as WAV while it is being synthesized"""
+    if get_tts_engine() is None:
+        return jsonify({'success': False, 'error': 'No TTS engine available'}), 503
+    audio = tts_service.get(utterance_id)
+    if audio is None:
+        return jsonify({'success': False, 'error': 'Audio not found'}), 404
+    
+    def generate():
+        # The sample rate is known once synthesis has produced its first chunk
+        chunks = audio.read()
+        first = next(chunks, None)
+        yield wav_header(audio.sample_rate)
+        if first is not None:
+            yield first.tobytes()
+        for chunk in chunks:
+            yield chunk.tobytes()
+    
+    return Response(generate(), mimetype='audio/wav')
+
+
+@app.route('/api/catalog/prerender', methods=['POST'])
+def prerender_catalog():
+    """Pre-render a product catalog into a pack in the background, then load it"""
+    if get_tts_engine() is None:
+        return jsonify({'success': False, 'error': 'No TTS engine available'}), 503
+    data = request.json or {}
+    products = data.get('products')
+    if products is None:
+        try:
+            with open(data.get('path', 'products_example.json'), 'r', encoding='utf-8') as f:
+                products = json.load(f)
+        except (OSError, ValueError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    name = data.get('name', 'catalog')
+    voice = data.get('voice', 'female-1')
+    speed = float(data.get('speed', 1.0))
+    pitch = int(data.get('pitch', 0))
+    
+    def build():
+        try:
+            catalogs.load(ensure_pack(products, name, voice, speed, pitch))
+        except Exception as e:
+            print(f"❌ Catalog pre-render failed: {e}")
+    
+    socketio.start_background_task(build)
+    return jsonify({
+        'success': True,
+        'catalog': name,
+        'products': len(products),
+        'path': pack_path(name)
+    })
+
+
+@app.route('/api/catalog/load', methods=['POST'])
+def load_catalog():
+    """Memory-map a pre-rendered catalog pack"""
+    data = request.json or {}
+    try:
+        pack = catalogs.load(data.get('path') or pack_path(data.get('name', 'catalog')))
+    except (OSError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    return jsonify({
+        'success': True,
+        'catalog': pack.name,
+        'products': [meta['name'] for meta in pack.products]
+    })
+
+
+@app.route('/api/product/show', methods=['POST'])
+def show_product():
+    """Show a product card on a stream and speak its script"""
+    data = request.json or {}
+    stream = stream_manager.get_stream(data.get('socketId'))
+    if not stream:
+        return jsonify({'success': False, 'error': 'Stream not found'}), 404
+    
+    product = data.get('product')
+    if product is None:
+        # Hide the card
+        stream['product'] = None
+        return jsonify({'success': True, 'product': None})
+    
+    selection = catalogs.select(data.get('catalog', 'catalog'), product)
+    if selection is None:
+        return jsonify({'success': False, 'error': 'Product not found'}), 404
+    stream['product'] = selection
+    
+    result = None
+    if data.get('speak', True):
+        # Same voice settings as the pack, so the script is a TTS cache hit
+        header = catalogs.get(selection[0]).header
+        result = stream['avatar'].speak(catalogs.script(selection), header['voice'],
+                                        header['speed'], header['pitch'])
+    return jsonify({
+        'success': True,
+        'product': selection[1],
+        'result': result
+    })
+
+
 @app.route('/api/avatar/change', methods=['POST'])
 def change_avatar():
     """Change avatar type"""
@@ -491,28 +832,50 @@ def change_avatar():
 @app.route('/api/frame/<socket_id>', methods=['GET'])
 def get_frame(socket_id):
     """Get interactive avatar frame"""
-    # For preview/non-stream, use global avatar
-    if socket_id == 'avatar_stream':
-        avatar = stream_manager.get_avatar()
-    else:
-        stream = stream_manager.get_stream(socket_id)
-        if not stream:
-            return jsonify({'error': 'Stream not found'}), 404
-        avatar = stream['avatar']
-    
-    gesture_intensity = int(request.args.get('gesture', 50))
-    is_speaking = request.args.get('speaking', 'false').lower() == 'true'
-    text = request.args.get('text', '')
+    # avatar_stream is the global preview avatar, anything else must be a live stream
+    if resolve_avatar(socket_id) is None:
+        return jsonify({'error': 'Stream not found'}), 404
     
-    frame = avatar.process_frame(gesture_intensity, is_speaking, text)
+    # Query args only steer the stream's render loop; the frame is shared by all viewers
+    producer = frame_hub.ensure(socket_id)
+    producer.update_params(**parse_frame_params(request.args))
     
-    if frame is None:
+    latest = producer.get_latest()
+    if latest is None:
         return jsonify({'error': 'Failed to generate frame'}), 500
     
-    # Encode frame to JPEG
-    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    # Viewers asking for the same frame and quality share one encode
+    quality = request.args.get('quality', type=int)
+    if quality:
+        jpeg, etag = producer.encode(latest, max(10, min(quality, 100)))
+    else:
+        jpeg, etag = latest.jpeg, latest.etag
+    
+    headers = {
+        'Cache-Control': 'no-cache',
+        'ETag': f'"{etag}"',
+        'X-Frame-Id': str(latest.frame_id)
+    }
+    if request.if_none_match.contains(etag):
+        return '', 304, headers
     
-    return buffer.tobytes(), 200, {'Content-Type': 'image/jpeg'}
+    headers['Content-Type'] = 'image/jpeg'
+    return jpeg, 200, headers
+
+
+@app.route('/api/stream/<socket_id>.mjpg', methods=['GET'])
+def stream_mjpeg(socket_id):
+    """Stream frames as MJPEG (multipart/x-mixed-replace) for OBS and browsers"""
+    if resolve_avatar(socket_id) is None:
+        return jsonify({'error': 'Stream not found'}), 404
+    
+    # Animation inputs are read once; later changes arrive via frame_params or /api/frame
+    producer = frame_hub.ensure(socket_id)
+    producer.update_params(**parse_frame_params(request.args))
+    fps = request.args.get('fps', type=float)
+    
+    return Response(frame_hub.mjpeg_frames(socket_id, fps), mimetype=MJPEG_MIMETYPE,
+                    headers={'Cache-Control': 'no-store'})
 
 
 @app.route('/api/event', methods=['POST'])
@@ -543,6 +906,42 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     print('Simple Interactive Avatar client disconnected')
+    frame_hub.unsubscribe(request.sid)
+
+
+@socketio.on('subscribe_frames')
+def handle_subscribe_frames(data=None):
+    """Subscribe client to frames pushed by a stream's render loop"""
+    data = data or {}
+    stream_id = data.get('stream_id', 'avatar_stream')
+    if resolve_avatar(stream_id) is None:
+        return {'success': False, 'error': 'Stream not found'}
+    
+    join_room(frame_room(stream_id))
+    frame_hub.subscribe(request.sid, stream_id)
+    producer = frame_hub.ensure(stream_id)
+    producer.update_params(**parse_frame_params(data))
+    
+    return {'success': True, 'stream_id': stream_id, 'fps': producer.fps}
+
+
+@socketio.on('unsubscribe_frames')
+def handle_unsubscribe_frames(data=None):
+    """Stop pushing frames of a stream to client"""
+    data = data or {}
+    stream_id = data.get('stream_id', 'avatar_stream')
+    leave_room(frame_room(stream_id))
+    frame_hub.unsubscribe(request.sid, stream_id)
+    return {'success': True}
+
+
+@socketio.on('frame_params')
+def handle_frame_params(data=None):
+    """Update animation inputs of a stream's render loop"""
+    data = data or {}
+    producer = frame_hub.get(data.get('stream_id', 'avatar_stream'))
+    if producer is not None:
+        producer.update_params(**parse_frame_params(data))
 
 
 # Main
@@ -555,4 +954,18 @@ if __name__ == '__main__':
     print(f"🎭 Avatar Types: Female, Male (Interactive)")
     print(f"🔗 Server ready at http://localhost:{PORT}")
     
+    # Pick the fastest JPEG backend before serving frames
+    with startup.stage('jpeg_benchmark'):
+        encoder = select_encoder()
+    print(f"🖼️ JPEG encoder: {encoder.name}")
+    
+    with startup.stage('tts_engine'):
+        select_tts_engine()
+    
+    # Fork render workers before any request threads exist
+    render_pool.start()
+    
+    # Assets and the first frame load in the background so the port binds right away
+    socketio.start_background_task(warm_up)
+    
     socketio.run(app, host='0.0.0.0', port=PORT, debug=False, allow_unsafe_werkzeug=True)